@@ -1,17 +1,35 @@
+import io
 import os
-import shutil
+import zipfile
 from flask import Flask, request, render_template, jsonify, send_from_directory
 from werkzeug.utils import secure_filename
 import sys
 import platform
 import uuid
+import multiprocessing
 
 # Import our detection scripts
 from detection.animal_detection import run_animal_inference
 from detection.weapon_detection import run_weapon_inference
-from detection.ppe_detection import run_ppe_inference, load_ppe_model, find_ppe_model
-from utils.detection_utils import draw_bounding_boxes, combine_detection_results
-from detection.video_processing import process_video # Corrected import
+from detection.ppe_detection import run_ppe_inference, run_ppe_inference_batch, find_ppe_model, PPE_BATCH_SIZE
+from detection.model_registry import model_registry, preload_models, LOCAL_MODEL_NAMES, MODEL_LOADING
+from detection.local_backend import backend_latency, BACKENDS
+from detection.process_pool import get_ppe_pool, start_ppe_pool
+from utils.detection_utils import draw_bounding_boxes, combine_detection_results, compact_detections
+from utils.result_cache import detection_cache
+from utils.upload_utils import receive_upload, PERSIST_UPLOADS, UPLOAD_MAX_IN_MEMORY
+from utils.image_utils import save_image_source, SharedImage
+from detection.video_processing import MotionGate, MOTION_THRESHOLD, MOTION_MIN_AREA
+from detection.orchestrator import run_detectors
+from detection.postprocess import CLASS_ALIASES
+from detection.frame_sampling import FrameSampler, DetectionCarrier
+from detection.tracking import IoUTracker
+from detection.detection_export import parse_export_formats
+from detection.video_jobs import VideoJobManager, QueueFullError
+from detection.batch_jobs import BatchJobManager
+from detection.batch_processing import (process_batch, iter_zip_images, iter_directory_images, count_zip_images,
+                                        count_directory_images, check_image_count, resolve_local_directory,
+                                        write_manifest_csv, BATCH_MAX_IMAGES, BATCH_SYNC_MAX_IMAGES)
 
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
@@ -19,6 +37,68 @@ app.config['RESULT_FOLDER'] = 'static/results'
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['RESULT_FOLDER'], exist_ok=True)
 
+# Uploads are processed from memory; set PERSIST_UPLOADS to also keep a copy in UPLOAD_FOLDER
+app.config['PERSIST_UPLOADS'] = PERSIST_UPLOADS
+app.config['UPLOAD_MAX_IN_MEMORY'] = UPLOAD_MAX_IN_MEMORY
+
+# Background workers for /detect/video-multi
+video_jobs = VideoJobManager()
+
+# Background workers for large /detect/batch requests
+batch_jobs = BatchJobManager()
+
+# Load and warm up the local models at startup unless MODEL_LOADING=lazy. With PPE worker
+# processes the PPE model is loaded by the workers instead; the spawned workers re-import
+# this module, so they skip this step.
+if multiprocessing.parent_process() is None:
+    preload_models(exclude=('ppe',) if get_ppe_pool() else ())
+    if MODEL_LOADING == 'eager':
+        start_ppe_pool()
+
+def form_flag(name, default=False):
+    """Read a boolean form field ('1', 'true', 'yes' or 'on' are true)."""
+    value = request.form.get(name)
+    if value is None:
+        return default
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+def receive_image_upload(file):
+    """
+    Read an uploaded image from the request stream under a unique filename.
+    The returned upload's image (decoded at most once, from bytes or a spooled file for very
+    large uploads) is shared by all detectors; call discard() on it when the request is done.
+    """
+    # Generate unique filename to avoid overwriting
+    unique_filename = f"{uuid.uuid4().hex}_{secure_filename(file.filename)}"
+    upload = receive_upload(file, unique_filename, max_in_memory=app.config['UPLOAD_MAX_IN_MEMORY'])
+    if app.config['PERSIST_UPLOADS']:
+        upload.persist(app.config['UPLOAD_FOLDER'])
+    return upload
+
+def detection_output(upload, result, prefix, use_custom_colors=False):
+    """
+    The part of an image endpoint's response that shows its detections.
+
+    By default the detections are drawn on a copy of the upload in RESULT_FOLDER, returned
+    as {"detection_result": URL}. With the form field render=false nothing is drawn or
+    written and {"detections": ...} holds the boxes in the compact schema of
+    compact_detections, for clients that draw them themselves.
+    """
+    if not form_flag('render', default=True):
+        # The detector's reported size, else the upload's; 0 if the upload cannot be decoded
+        size = result.get('image') or {}
+        width = size.get('width') or upload.image.width or 0
+        height = size.get('height') or upload.image.height or 0
+        return {"detections": compact_detections(result, width, height, use_custom_colors=use_custom_colors)}
+
+    result_path = os.path.join(app.config['RESULT_FOLDER'], f'{prefix}_{upload.filename}')
+    if "error" in result:
+        # Just copy the original image if there was an error
+        save_image_source(upload.image, result_path)
+    else:
+        result_path = draw_bounding_boxes(upload.image, result, result_path, use_custom_colors=use_custom_colors)
+    return {"detection_result": f"/static/results/{os.path.basename(result_path)}"}
+
 @app.route('/')
 def index():
     # Home page
@@ -44,7 +124,13 @@ def debug_info():
         "cv2_available": "cv2" in sys.modules,
         "numpy_available": "numpy" in sys.modules,
         "ppe_model_path": find_ppe_model(),
-        "ppe_model_loaded": load_ppe_model(),
+        "ppe_model_loaded": model_registry.is_loaded('ppe'),
+        "models": model_registry.stats(LOCAL_MODEL_NAMES),
+        "backend_latency": backend_latency.stats(),
+        "ppe_worker_pool": get_ppe_pool().stats() if get_ppe_pool() else None,
+        "detection_cache": detection_cache.stats(),
+        "video_jobs": video_jobs.stats(),
+        "batch_jobs": batch_jobs.stats(),
         "project_dir": os.path.abspath(os.path.dirname(__file__)),
         "files_in_project": os.listdir(os.path.abspath(os.path.dirname(__file__)))
     }
@@ -60,32 +146,38 @@ def detect_animal():
     if file.filename == '':
         return jsonify({"error": "No image selected"}), 400
 
-    # Generate unique filename to avoid overwriting
-    unique_filename = f"{uuid.uuid4().hex}_{secure_filename(file.filename)}"
-    uploaded_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-    file.save(uploaded_path)
+    # Optional backend override: 'remote', 'local' or 'auto'
+    backend = request.form.get('backend') or None
+    if backend is not None and backend not in BACKENDS:
+        return jsonify({"error": f"Invalid backend '{backend}', expected one of: {', '.join(BACKENDS)}"}), 400
+
+    # Read the upload into memory; it is only written to the upload folder if PERSIST_UPLOADS is set
+    upload = receive_image_upload(file)
 
     try:
         # Run animal detection
-        result = run_animal_inference(uploaded_path, confidence=0.3, overlap=0.6)
-        result_path = os.path.join(app.config['RESULT_FOLDER'], f'animal_{unique_filename}')
-        draw_bounding_boxes(uploaded_path, result, result_path)
+        result = run_animal_inference(upload.image, confidence=0.3, overlap=0.6, backend=backend,
+                                      tiled=form_flag('tiled'))
 
         # Count humans and animals
         humans_count = len([p for p in result['predictions'] if p['class'] == 'human'])
         animals_count = len([p for p in result['predictions'] if p['class'] != 'human'])
         
         return jsonify({
-            "detection_result": f"/static/results/animal_{unique_filename}",
+            **detection_output(upload, result, 'animal'),
             "summary": {
                 "humans_detected": humans_count,
-                "animals_detected": animals_count
+                "animals_detected": animals_count,
+                "upload": result.get('upload'),
+                "backend": result.get('backend')
             }
         })
     except Exception as e:
         import traceback
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
+    finally:
+        upload.discard()
 
 # New endpoint for PPE detection only
 @app.route('/detect/ppe', methods=['POST'])
@@ -97,22 +189,12 @@ def detect_ppe():
     if file.filename == '':
         return jsonify({"error": "No image selected"}), 400
 
-    # Generate unique filename to avoid overwriting
-    unique_filename = f"{uuid.uuid4().hex}_{secure_filename(file.filename)}"
-    uploaded_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-    file.save(uploaded_path)
+    # Read the upload into memory; it is only written to the upload folder if PERSIST_UPLOADS is set
+    upload = receive_image_upload(file)
 
     try:
         # Run PPE detection
-        result = run_ppe_inference(uploaded_path, confidence=0.3, overlap=0.6)
-        result_path = os.path.join(app.config['RESULT_FOLDER'], f'ppe_{unique_filename}')
-        
-        # Check if there was an error in PPE detection
-        if "error" in result:
-            # Just copy the original image if there was an error
-            shutil.copy(uploaded_path, result_path)
-        else:
-            draw_bounding_boxes(uploaded_path, result, result_path)
+        result = run_ppe_inference(upload.image, confidence=0.3, overlap=0.6, tiled=form_flag('tiled'))
 
         # Count PPE items by type (if available)
         ppe_count = len(result.get('predictions', []))
@@ -122,7 +204,7 @@ def detect_ppe():
             ppe_items[item_type] = ppe_items.get(item_type, 0) + 1
         
         return jsonify({
-            "detection_result": f"/static/results/ppe_{unique_filename}",
+            **detection_output(upload, result, 'ppe'),
             "summary": {
                 "ppe_detected": ppe_count,
                 "ppe_items": ppe_items
@@ -132,6 +214,57 @@ def detect_ppe():
         import traceback
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
+    finally:
+        upload.discard()
+
+# Endpoint for PPE detection on several images at once
+@app.route('/detect/ppe/batch', methods=['POST'])
+def detect_ppe_batch():
+    files = [f for f in request.files.getlist('images') if f.filename != '']
+    if not files:
+        return jsonify({"error": "No images uploaded"}), 400
+
+    # Read the uploads into memory; they are only written to the upload folder if PERSIST_UPLOADS is set
+    uploads = [(file.filename, receive_image_upload(file)) for file in files]
+
+    try:
+        # Run PPE detection on all images in fixed-size model batches
+        batch_size = request.form.get('batch_size', PPE_BATCH_SIZE, type=int)
+        results = run_ppe_inference_batch([upload.image for _, upload in uploads], confidence=0.3, overlap=0.6,
+                                          batch_size=batch_size)
+
+        images = []
+        for (original_name, upload), result in zip(uploads, results):
+            unique_filename = upload.filename
+            result_path = os.path.join(app.config['RESULT_FOLDER'], f'ppe_{unique_filename}')
+            if "error" in result:
+                save_image_source(upload.image, result_path)
+            else:
+                result_path = draw_bounding_boxes(upload.image, result, result_path)
+
+            ppe_items = {}
+            for pred in result.get('predictions', []):
+                item_type = pred.get('class', 'unknown')
+                ppe_items[item_type] = ppe_items.get(item_type, 0) + 1
+
+            images.append({
+                "filename": original_name,
+                "detection_result": f"/static/results/{os.path.basename(result_path)}",
+                "summary": {
+                    "ppe_detected": len(result.get('predictions', [])),
+                    "ppe_items": ppe_items
+                },
+                "error": result.get('error')
+            })
+
+        return jsonify({"images": images})
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+    finally:
+        for _, upload in uploads:
+            upload.discard()
 
 # New endpoint for weapon detection only
 @app.route('/detect/weapon', methods=['POST'])
@@ -143,16 +276,18 @@ def detect_weapon():
     if file.filename == '':
         return jsonify({"error": "No image selected"}), 400
 
-    # Generate unique filename to avoid overwriting
-    unique_filename = f"{uuid.uuid4().hex}_{secure_filename(file.filename)}"
-    uploaded_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-    file.save(uploaded_path)
+    # Optional backend override: 'remote', 'local' or 'auto'
+    backend = request.form.get('backend') or None
+    if backend is not None and backend not in BACKENDS:
+        return jsonify({"error": f"Invalid backend '{backend}', expected one of: {', '.join(BACKENDS)}"}), 400
+
+    # Read the upload into memory; it is only written to the upload folder if PERSIST_UPLOADS is set
+    upload = receive_image_upload(file)
 
     try:
         # Run weapon detection
-        result = run_weapon_inference(uploaded_path, confidence=0.25, overlap=0.7)
-        result_path = os.path.join(app.config['RESULT_FOLDER'], f'weapon_{unique_filename}')
-        draw_bounding_boxes(uploaded_path, result, result_path)
+        result = run_weapon_inference(upload.image, confidence=0.25, overlap=0.7, backend=backend,
+                                      tiled=form_flag('tiled'))
 
         # Count weapons by type (if available)
         weapons_count = len(result.get('predictions', []))
@@ -162,16 +297,20 @@ def detect_weapon():
             weapon_types[weapon_type] = weapon_types.get(weapon_type, 0) + 1
         
         return jsonify({
-            "detection_result": f"/static/results/weapon_{unique_filename}",
+            **detection_output(upload, result, 'weapon'),
             "summary": {
                 "weapons_detected": weapons_count,
-                "weapon_types": weapon_types
+                "weapon_types": weapon_types,
+                "upload": result.get('upload'),
+                "backend": result.get('backend')
             }
         })
     except Exception as e:
         import traceback
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
+    finally:
+        upload.discard()
 
 # New endpoint for multi-model detection
 @app.route('/detect/multi', methods=['POST'])
@@ -183,62 +322,170 @@ def detect_multi():
     if file.filename == '':
         return jsonify({"error": "No image selected"}), 400
 
-    # Generate unique filename to avoid overwriting
-    unique_filename = f"{uuid.uuid4().hex}_{secure_filename(file.filename)}"
-    uploaded_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-    file.save(uploaded_path)
+    # Read the upload into memory; it is only written to the upload folder if PERSIST_UPLOADS is set
+    upload = receive_image_upload(file)
 
     try:
-        # Run all detection models
-        animal_result = run_animal_inference(uploaded_path, confidence=0.3, overlap=0.6)
-        weapon_result = run_weapon_inference(uploaded_path, confidence=0.25, overlap=0.6)
-        ppe_result = run_ppe_inference(uploaded_path, confidence=0.3, overlap=0.6)
-        ppe_result['predictions'] = [pred for pred in ppe_result.get('predictions', []) if pred.get('class') != 'person']
-        
-        # Combine all results into one image
-        combined_result = {
-            "predictions": []
-        }
+        # Run all detection models concurrently; a failing detector leaves the others' results usable
+        # With tiled=true the local models run on overlapping tiles to find small objects
+        tiled = form_flag('tiled')
+        detection = run_detectors(upload.image, {
+            'animal': (0.3, 0.6),
+            'weapon': (0.25, 0.6),
+            'ppe': (0.3, 0.6)
+        }, options={name: {'tiled': tiled} for name in ('animal', 'weapon', 'ppe')})
+        animal_result = detection['results']['animal']
+        weapon_result = detection['results']['weapon']
+        ppe_result = detection['results']['ppe']
         
-        # Add animal/human detections (with class-specific colors)
-        for pred in animal_result.get('predictions', []):
-            pred['color'] = 'green' if pred.get('class') != 'human' else 'blue'
-            combined_result['predictions'].append(pred)
-            
-        # Add weapon detections (with different color)
-        for pred in weapon_result.get('predictions', []):
-            pred['color'] = 'red'
-            combined_result['predictions'].append(pred)
-            
-        # Add PPE detections (with different color)
-        if "error" not in ppe_result:
-            for pred in ppe_result.get('predictions', []):
-                pred['color'] = 'orange'
-                combined_result['predictions'].append(pred)
+        # Combine all results into one image; a PPE 'person' box on an animal-model 'human'
+        # (or any other box found by two models) is kept only once
+        combined_result = combine_detection_results(animal_result, ppe_result, weapon_result)
         
-        # Draw combined results
-        result_path = os.path.join(app.config['RESULT_FOLDER'], f'multi_{unique_filename}')
-        draw_bounding_boxes(uploaded_path, combined_result, result_path, use_custom_colors=True)
-        
-        # Prepare summary counts
-        humans_count = len([p for p in animal_result.get('predictions', []) if p.get('class') == 'human'])
+        # Prepare summary counts; humans are counted on the combined result, so a PPE 'person'
+        # that no animal-model 'human' overlaps counts like the box drawn for it
+        humans_count = len([p for p in combined_result['predictions']
+                            if CLASS_ALIASES.get(p.get('class'), p.get('class')) == 'human'])
         animals_count = len([p for p in animal_result.get('predictions', []) if p.get('class') != 'human'])
         weapons_count = len(weapon_result.get('predictions', []))
-        ppe_count = len(ppe_result.get('predictions', [])) if "error" not in ppe_result else 0
+        ppe_count = len([p for p in ppe_result.get('predictions', []) if p.get('class') != 'person']) if "error" not in ppe_result else 0
         
         return jsonify({
-            "detection_result": f"/static/results/multi_{unique_filename}",
+            **detection_output(upload, combined_result, 'multi', use_custom_colors=True),
             "summary": {
                 "humans_detected": humans_count,
                 "animals_detected": animals_count,
                 "weapons_detected": weapons_count,
-                "ppe_detected": ppe_count
+                "ppe_detected": ppe_count,
+                "detector_times_ms": detection['timings'],
+                "failed_detectors": detection['errors'],
+                "uploads": {name: detection['results'][name].get('upload') for name in ('animal', 'weapon')}
             }
         })
     except Exception as e:
         import traceback
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
+    finally:
+        upload.discard()
+
+# Multi-model detection on many images: a zip archive, a list of images or a server-side directory
+@app.route('/detect/batch', methods=['POST'])
+def detect_batch():
+    archive = request.files.get('archive')
+    files = [f for f in request.files.getlist('images') if f.filename != '']
+    directory = request.form.get('directory')
+    if not (archive and archive.filename) and not files and not directory:
+        return jsonify({"error": "No archive, images or directory given"}), 400
+
+    annotate = form_flag('annotate')
+    manifest_format = request.form.get('format', 'json').lower()
+    if manifest_format not in ('json', 'csv'):
+        return jsonify({"error": f"Invalid format '{manifest_format}', expected json or csv"}), 400
+    options = {"annotate": annotate, "batch_size": request.form.get('batch_size', None, type=int),
+               "max_images": BATCH_MAX_IMAGES}
+
+    uploads = []
+    images = None
+    try:
+        # The number of images is checked before any of them is processed. Batches above
+        # BATCH_SYNC_MAX_IMAGES (or with async=true) run as a background job
+        if archive and archive.filename:
+            # Archives are spooled to disk and read one member at a time
+            upload = receive_upload(archive, f"{uuid.uuid4().hex}_{secure_filename(archive.filename)}", max_in_memory=0)
+            uploads.append(upload)
+            count = count_zip_images(upload.path)
+            check_image_count(count, BATCH_MAX_IMAGES)
+            background = form_flag('async') or count > BATCH_SYNC_MAX_IMAGES
+            open_images = lambda: iter_zip_images(upload.path)
+        elif files:
+            count = len(files)
+            check_image_count(count, BATCH_MAX_IMAGES)
+            background = form_flag('async') or count > BATCH_SYNC_MAX_IMAGES
+            if background:
+                # The job runs after the request, so every image is spooled to disk first
+                spooled = spool_batch_images(files, uploads)
+                open_images = lambda: iter(spooled)
+            else:
+                open_images = lambda: receive_batch_images(files, uploads)
+        else:
+            local_directory = resolve_local_directory(directory)
+            count = count_directory_images(local_directory)
+            check_image_count(count, BATCH_MAX_IMAGES)
+            background = form_flag('async') or count > BATCH_SYNC_MAX_IMAGES
+            open_images = lambda: iter_directory_images(local_directory)
+
+        if background:
+            job = batch_jobs.submit(open_images, count, app.config['RESULT_FOLDER'],
+                                    cleanup=[upload.discard for upload in uploads], **options)
+            # The job discards the spooled uploads when it finishes
+            uploads = []
+            return jsonify({
+                "job_id": job.id,
+                "status": job.status,
+                "images_total": count,
+                "status_url": f"/batch-jobs/{job.id}",
+                "result_url": f"/batch-jobs/{job.id}/result?format={manifest_format}"
+            }), 202
+
+        images = open_images()
+        manifest = process_batch(images, output_folder=app.config['RESULT_FOLDER'], **options)
+        return manifest_response(manifest, manifest_format)
+    except QueueFullError as e:
+        response = jsonify({"error": str(e)})
+        response.headers['Retry-After'] = '30'
+        return response, 503
+    except (ValueError, zipfile.BadZipFile) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+    finally:
+        if images is not None:
+            images.close()
+        for upload in uploads:
+            upload.discard()
+
+def manifest_response(manifest, manifest_format):
+    """A batch manifest as the response of /detect/batch, with web paths for annotated images."""
+    for entry in manifest["images"]:
+        if "annotated" in entry:
+            entry["annotated"] = f"/static/results/{os.path.basename(entry['annotated'])}"
+
+    if manifest_format == 'csv':
+        buffer = io.StringIO()
+        write_manifest_csv(manifest, buffer)
+        return app.response_class(buffer.getvalue(), mimetype='text/csv',
+                                  headers={"Content-Disposition": "attachment; filename=manifest.csv"})
+    return jsonify(manifest)
+
+def spool_batch_images(files, uploads):
+    """
+    Spool every image of a multipart batch to disk for a background job, which reads them
+    after the request has ended. The uploads are appended to uploads for discarding.
+    """
+    images = []
+    for file in files:
+        upload = receive_upload(file, f"{uuid.uuid4().hex}_{secure_filename(file.filename)}", max_in_memory=0)
+        uploads.append(upload)
+        path = upload.persist(app.config['UPLOAD_FOLDER']) if app.config['PERSIST_UPLOADS'] else upload.path
+        images.append(SharedImage(path=path, name=file.filename))
+    return images
+
+def receive_batch_images(files, uploads):
+    """
+    Receive the images of a multipart batch one at a time, as process_batch consumes them,
+    so only the chunk being processed is held in memory. Spooled uploads are appended to
+    uploads for the caller to discard.
+    """
+    for file in files:
+        upload = receive_image_upload(file)
+        if upload.temporary:
+            uploads.append(upload)
+        # Report the client's file names in the manifest rather than the unique upload names
+        upload.image.name = file.filename
+        yield upload.image
 
 # New endpoint for multi-model video detection
 @app.route('/detect/video-multi', methods=['POST'])
@@ -250,41 +497,129 @@ def detect_video_multi():
     if file.filename == '':
         return jsonify({"error": "No video selected"}), 400
 
+    # Frame sampling options: which frames are inferred and how the others get their boxes
+    sampling = request.form.get('sampling', 'all')
+    sample_every = request.form.get('sample_every', 1, type=int)
+    target_fps = request.form.get('target_fps', None, type=float)
+    carry = request.form.get('carry', 'hold')
+    # Motion gating: skip inference on frames where nothing changed
+    motion_gate = form_flag('motion_gate')
+    motion_threshold = request.form.get('motion_threshold', MOTION_THRESHOLD, type=int)
+    motion_min_area = request.form.get('motion_min_area', MOTION_MIN_AREA, type=float)
+    # Per-frame detection export ('jsonl', 'npz') and whether the annotated video is rendered
+    render = form_flag('render', default=True)
+    try:
+        sampler = FrameSampler(sampling, every_n=sample_every, target_fps=target_fps)
+        DetectionCarrier(carry, tracker=IoUTracker())
+        MotionGate(sampler, motion_threshold, motion_min_area)
+        export = parse_export_formats(','.join(request.form.getlist('export')))
+        if not render and not export:
+            raise ValueError("render=false requires an export format (jsonl, npz)")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     # Generate unique filename to avoid overwriting
     unique_suffix = uuid.uuid4().hex
     original_filename = secure_filename(file.filename)
     uploaded_filename = f"{unique_suffix}_{original_filename}"
-    uploaded_path = os.path.join(app.config['UPLOAD_FOLDER'], uploaded_filename)
+    uploaded_path = None
     
     try:
-        file.save(uploaded_path)
-
-        # The output_folder for process_video should be app.config['RESULT_FOLDER']
-        # The process_video function will create its own uniquely named output file inside this folder.
-        processed_video_path = process_video(uploaded_path, app.config['RESULT_FOLDER'])
-
-        if processed_video_path is None:
-            # This might happen if process_video encounters an error like failing to open the video
-            return jsonify({"error": "Video processing failed. Check server logs."}), 500
-
-        # Construct the web-accessible path for the client
-        processed_video_filename = os.path.basename(processed_video_path)
-        
-        return jsonify({
-            "detection_result_video": f"/static/results/{processed_video_filename}",
-            "summary": {
-                "message": "Video processing complete. Detections are embedded in the video."
-            }
-        })
+        # OpenCV can only read videos from a file, so the upload is always spooled to disk.
+        # The spooled copy is deleted when the job finishes unless uploads are persisted.
+        upload = receive_upload(file, uploaded_filename, max_in_memory=0)
+        if app.config['PERSIST_UPLOADS']:
+            uploaded_path = upload.persist(app.config['UPLOAD_FOLDER'])
+        else:
+            uploaded_path = upload.path
+
+        # Processing happens in the background; the client polls the status endpoint.
+        # process_video creates its own uniquely named output file inside RESULT_FOLDER.
+        job = video_jobs.submit(
+            uploaded_path, app.config['RESULT_FOLDER'], cleanup_input=not app.config['PERSIST_UPLOADS'],
+            sampling=sampling, sample_every=sample_every, target_fps=target_fps, carry=carry,
+            motion_gate=motion_gate, motion_threshold=motion_threshold, motion_min_area=motion_min_area,
+            export=export, render=render
+        )
+    except QueueFullError as e:
+        if uploaded_path and os.path.exists(uploaded_path):
+            os.remove(uploaded_path)
+        response = jsonify({"error": str(e)})
+        response.headers['Retry-After'] = '30'
+        return response, 503
     except Exception as e:
         import traceback
         traceback.print_exc()
-        # Clean up uploaded file if processing fails
-        if os.path.exists(uploaded_path):
+        # Clean up uploaded file if the job could not be queued
+        if uploaded_path and os.path.exists(uploaded_path):
             os.remove(uploaded_path)
-        # Note: process_video is responsible for its own output cleanup on error if needed.
         return jsonify({"error": f"Error processing video: {str(e)}"}), 500
 
+    return jsonify({
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.id}",
+        "result_url": f"/jobs/{job.id}/result"
+    }), 202
+
+# Status of a background video job: progress, throughput and ETA
+@app.route('/jobs/<job_id>')
+def video_job_status(job_id):
+    job = video_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+
+    info = job.to_dict()
+    if job.status == 'done':
+        stats = info.pop("stats")
+        exports = stats.pop("exports", {})
+        # Construct the web-accessible paths for the client
+        if job.options.get('render', True):
+            processed_video_filename = os.path.basename(job.result_path)
+            info["detection_result_video"] = f"/static/results/{processed_video_filename}"
+            message = "Video processing complete. Detections are embedded in the video."
+        else:
+            message = "Video processing complete. Detections were exported without rendering the video."
+        if exports:
+            info["detection_exports"] = {name: f"/static/results/{os.path.basename(path)}"
+                                         for name, path in exports.items()}
+        info["summary"] = {
+            "message": message,
+            **stats
+        }
+    return jsonify(info)
+
+# Download the processed video of a finished job
+@app.route('/jobs/<job_id>/result')
+def video_job_result(job_id):
+    job = video_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    if job.status != 'done':
+        return jsonify({"error": f"Job is {job.status}", "status": job.status}), 409
+    return send_from_directory(os.path.abspath(job.output_folder), os.path.basename(job.result_path))
+
+# Status of a background /detect/batch job: progress, throughput and ETA
+@app.route('/batch-jobs/<job_id>')
+def batch_job_status(job_id):
+    job = batch_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job.to_dict())
+
+# Manifest of a finished batch job, as JSON or as CSV with ?format=csv
+@app.route('/batch-jobs/<job_id>/result')
+def batch_job_result(job_id):
+    job = batch_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    if job.status != 'done':
+        return jsonify({"error": f"Job is {job.status}", "status": job.status}), 409
+    manifest_format = request.args.get('format', 'json').lower()
+    if manifest_format not in ('json', 'csv'):
+        return jsonify({"error": f"Invalid format '{manifest_format}', expected json or csv"}), 400
+    return manifest_response(job.manifest, manifest_format)
+
 # Legacy endpoint for backward compatibility
 @app.route('/analyze', methods=['POST'])
 def analyze():
@@ -0,0 +1,250 @@
+"""
+Headless runner: process image and video files or directory trees without the web app.
+
+Usage:
+    python -m detection INPUT [INPUT ...] --output DIR [--workers 4] [--models animal,ppe,weapon]
+                        [--checkpoint FILE] [--no-resume] [--no-annotate]
+                        [--sampling all|nth|fps|keyframes] [--sample-every N] [--carry hold|interpolate|track]
+                        [--export jsonl,npz] [--no-render]
+
+Every finished file is appended to a JSON Lines checkpoint (DIR/checkpoint.jsonl by default)
+with its content hash and a hash of the options that affect the outputs. A rerun with the
+same options after an interruption skips every file whose content was already processed,
+even if it was renamed or copied; a rerun with other options processes every file again.
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from detection.orchestrator import run_detectors
+from detection.video_processing import process_video
+from detection.batch_processing import BATCH_SETTINGS, IMAGE_EXTENSIONS
+from detection.frame_sampling import SAMPLING_MODES, CARRY_MODES
+from utils.detection_utils import combine_detection_results, draw_bounding_boxes
+from utils.image_utils import SharedImage, content_hash
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# File extensions processed as videos
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm', '.m4v')
+
+def iter_input_files(paths):
+    """
+    Yield (path, relative path) for every image and video in a list of files and directories.
+    The relative path is used to mirror the input tree in the output folder. With several
+    inputs it starts with the input's position and name (e.g. 2_card_b/DCIM/img1.jpg), so
+    files with the same name under different inputs do not overwrite each other's outputs.
+    """
+    for index, path in enumerate(paths, start=1):
+        prefix = f"{index}_{os.path.basename(os.path.normpath(path))}" if len(paths) > 1 else ""
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for filename in sorted(files):
+                    if filename.lower().endswith(IMAGE_EXTENSIONS + VIDEO_EXTENSIONS):
+                        full_path = os.path.join(root, filename)
+                        yield full_path, os.path.join(prefix, os.path.relpath(full_path, path))
+        elif os.path.isfile(path):
+            yield path, prefix or os.path.basename(path)
+        else:
+            logger.warning(f"Skipping {path}: no such file or directory")
+
+def options_hash(options):
+    """Short hash of the JSON-serializable options a file was processed with."""
+    return hashlib.sha1(json.dumps(options, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+class Checkpoint:
+    """
+    Append-only JSON Lines record of processed files, keyed by content hash. Thread-safe.
+
+    Each record carries the hash of the run's options; only files done with the same
+    options count as done.
+    """
+
+    def __init__(self, path, resume=True, options=None):
+        self.path = path
+        self.options = options_hash(options or {})
+        self._done = set()
+        self._claimed = set()
+        self._lock = threading.Lock()
+        if resume and os.path.exists(path):
+            other_options = 0
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A line cut off by an interruption; that file is simply processed again
+                        continue
+                    if record.get("status") != "done":
+                        continue
+                    if record.get("options") == self.options:
+                        self._done.add(record["hash"])
+                    else:
+                        other_options += 1
+            logger.info(f"Resuming from {path}: {len(self._done)} files already processed")
+            if other_options:
+                logger.warning(f"{other_options} files in {path} were processed with other options "
+                               f"and are processed again")
+        self._file = open(path, 'a' if resume else 'w', encoding='utf-8')
+
+    def claim(self, file_hash):
+        """Return True if the content still needs processing and reserve it for the caller."""
+        with self._lock:
+            if file_hash in self._done or file_hash in self._claimed:
+                return False
+            self._claimed.add(file_hash)
+            return True
+
+    def record(self, entry):
+        entry = dict(entry, options=self.options)
+        with self._lock:
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+            if entry.get("status") == "done":
+                self._done.add(entry["hash"])
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+def process_image_file(path, output_path, settings, annotate=True):
+    """
+    Run the selected detectors on one image file.
+
+    Returns:
+        Dict with detection and per-class counts, failed detectors and the annotated image path
+    """
+    image = SharedImage(path=path)
+    if image.pixels is None:
+        raise ValueError(f"Could not read image {path}")
+    detection = run_detectors(image, settings)
+    combined = combine_detection_results(*(detection['results'].get(name, {"predictions": []})
+                                           for name in ('animal', 'ppe', 'weapon')))
+    class_counts = {}
+    for pred in combined['predictions']:
+        class_counts[pred.get('class', 'unknown')] = class_counts.get(pred.get('class', 'unknown'), 0) + 1
+    result = {
+        "detections": len(combined['predictions']),
+        "class_counts": class_counts,
+        "failed_detectors": detection['errors']
+    }
+    if annotate:
+        output_path = draw_bounding_boxes(image, combined, output_path, use_custom_colors=True)
+        result["annotated"] = output_path
+    return result
+
+def process_video_file(path, output_folder, **options):
+    """
+    Run process_video on one video file.
+
+    Returns:
+        Dict with the process_video stats and the path of its output
+    """
+    stats = {}
+    output_path = process_video(path, output_folder, stats=stats, **options)
+    if output_path is None:
+        raise ValueError(f"Could not open video {path}")
+    return dict(stats, output=output_path)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m detection",
+                                     description="Run the detectors on image and video files or directory trees.")
+    parser.add_argument('inputs', nargs='+', help="Image files, video files or directories")
+    parser.add_argument('--output', required=True, help="Output folder for annotated images, videos and the checkpoint")
+    parser.add_argument('--workers', type=int, default=4, help="Files processed concurrently")
+    parser.add_argument('--models', default=','.join(BATCH_SETTINGS), help="Detectors to run on images and videos")
+    parser.add_argument('--checkpoint', help="Checkpoint file (default: OUTPUT/checkpoint.jsonl)")
+    parser.add_argument('--no-resume', action='store_true', help="Ignore an existing checkpoint and start over")
+    parser.add_argument('--no-annotate', action='store_true', help="Do not write annotated images")
+    parser.add_argument('--sampling', default='all', choices=SAMPLING_MODES, help="Video frame sampling")
+    parser.add_argument('--sample-every', type=int, default=1, help="Inference interval for --sampling nth")
+    parser.add_argument('--target-fps', type=float, default=None, help="Inference frame rate for --sampling fps")
+    parser.add_argument('--carry', default='hold', choices=CARRY_MODES, help="Boxes for frames not inferred")
+    parser.add_argument('--export', default='', help="Per-frame video detection export: jsonl, npz or both")
+    parser.add_argument('--no-render', action='store_true', help="Do not encode annotated videos (needs --export)")
+    args = parser.parse_args(argv)
+
+    models = [name.strip() for name in args.models.split(',') if name.strip()]
+    unknown = [name for name in models if name not in BATCH_SETTINGS]
+    if unknown or not models:
+        parser.error(f"Unknown models: {', '.join(unknown)}; expected some of {', '.join(BATCH_SETTINGS)}")
+    if args.no_render and not args.export:
+        parser.error("--no-render requires --export")
+    settings = {name: BATCH_SETTINGS[name] for name in models}
+    video_options = {
+        "sampling": args.sampling, "sample_every": args.sample_every, "target_fps": args.target_fps,
+        "carry": args.carry, "export": args.export, "render": not args.no_render, "models": models
+    }
+
+    os.makedirs(args.output, exist_ok=True)
+    # Everything that changes what is written for a file; a rerun with other options redoes it
+    run_options = {"models": models, "annotate": not args.no_annotate, "video": video_options}
+    checkpoint = Checkpoint(args.checkpoint or os.path.join(args.output, 'checkpoint.jsonl'),
+                            resume=not args.no_resume, options=run_options)
+    totals = {"images": 0, "videos": 0, "frames": 0, "skipped": 0, "failed": 0}
+    totals_lock = threading.Lock()
+
+    def count(key, amount=1):
+        with totals_lock:
+            totals[key] += amount
+
+    def handle(path, relative):
+        file_hash = content_hash(path)
+        if not checkpoint.claim(file_hash):
+            count("skipped")
+            return
+        is_video = path.lower().endswith(VIDEO_EXTENSIONS)
+        entry = {"path": path, "hash": file_hash, "kind": "video" if is_video else "image"}
+        try:
+            if is_video:
+                output_folder = os.path.join(args.output, os.path.dirname(relative))
+                os.makedirs(output_folder, exist_ok=True)
+                entry["result"] = process_video_file(path, output_folder, **video_options)
+                count("videos")
+                count("frames", entry["result"].get("frames_total", 0))
+            else:
+                output_path = os.path.join(args.output, relative)
+                os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                entry["result"] = process_image_file(path, output_path, settings, annotate=not args.no_annotate)
+                count("images")
+            entry["status"] = "done"
+        except Exception as e:
+            logger.error(f"Failed to process {path}: {e}")
+            entry.update(status="failed", error=str(e))
+            count("failed")
+        checkpoint.record(entry)
+
+    start = time.perf_counter()
+    executor = ThreadPoolExecutor(max_workers=max(1, args.workers), thread_name_prefix="cli")
+    try:
+        # Outputs written inside an input tree are not inputs themselves
+        output_root = os.path.realpath(args.output) + os.sep
+        futures = [executor.submit(handle, path, relative) for path, relative in iter_input_files(args.inputs)
+                   if not os.path.realpath(path).startswith(output_root)]
+        for future in as_completed(futures):
+            future.result()
+    except KeyboardInterrupt:
+        logger.warning("Interrupted; finished files are in the checkpoint, rerun the command to resume")
+        executor.shutdown(wait=True, cancel_futures=True)
+        checkpoint.close()
+        return 130
+    executor.shutdown()
+    checkpoint.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Processed {totals['images']} images and {totals['videos']} videos ({totals['frames']} frames), "
+          f"skipped {totals['skipped']} already processed, {totals['failed']} failed, in {elapsed:.1f} s")
+    if elapsed > 0:
+        print(f"Throughput: {totals['images'] / elapsed:.2f} images/s, {totals['frames'] / elapsed:.1f} video frames/s")
+    return 1 if totals['failed'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,9 +1,11 @@
 import os
-import requests
 import logging
-import mimetypes
-from pathlib import Path
 from dotenv import load_dotenv
+from detection.roboflow_client import post_shared_image, upload_max_side, ROBOFLOW_UPLOAD_QUALITY
+from detection.local_backend import run_local_inference, run_with_backend, backend_for
+from detection.model_registry import model_registry
+from utils.result_cache import cached_detector
+from utils.image_utils import as_shared_image, describe_image
 
 # Load environment variables
 load_dotenv()
@@ -14,6 +16,14 @@ ANIMAL_MODEL_ID = os.getenv("MODEL_ID", "animal-detection-kq9h0")
 ANIMAL_MODEL_VERSION = os.getenv("MODEL_VERSION", "4")
 ANIMAL_API_URL = os.getenv("ROBOFLOW_API_URL", "https://detect.roboflow.com")
 
+# Longest side of the image sent to the hosted model (0 uploads the original); boxes are
+# scaled back to the original resolution
+ANIMAL_UPLOAD_MAX_SIDE = upload_max_side("ANIMAL")
+
+# 'remote' (Roboflow API), 'local' (animal.pt from the model registry) or 'auto' (remote with
+# failover to local)
+ANIMAL_BACKEND = backend_for("ANIMAL")
+
 # Setup logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
@@ -29,42 +39,48 @@ ANIMAL_CLASS_MAP = {
     'horse': 'horse'
 }
 
-def get_mime_type(file_path):
+def get_animal_model_tag():
+    """Model identifier used in detection cache keys: the remote model, upload settings and local weights."""
+    local = model_registry.get('animal', load=False)
+    return (f"{ANIMAL_API_URL}/{ANIMAL_MODEL_ID}/{ANIMAL_MODEL_VERSION}@{ANIMAL_UPLOAD_MAX_SIDE}q{ROBOFLOW_UPLOAD_QUALITY}"
+            f"|{ANIMAL_BACKEND}|{local.tag if local else 'no-local'}")
+
+@cached_detector('animal', get_animal_model_tag)
+def run_animal_inference(image, confidence, overlap, backend=None, tiled=False):
     """
-    Determine the MIME type of a file based on its extension.
+    Run animal detection on the remote Roboflow API or the local model.
     
     Args:
-        file_path: Path to the file
-        
+        image: SharedImage, path to the image file, encoded image bytes or an in-memory
+            BGR numpy array (e.g. a video frame)
+        confidence: Confidence threshold (0-1)
+        overlap: Overlap threshold (0-1)
+        backend: 'remote', 'local' or 'auto' (defaults to ANIMAL_BACKEND)
+        tiled: If True, the local model runs on overlapping tiles of the image (the remote
+            API always gets the whole image)
+    
     Returns:
-        MIME type string (e.g., 'image/jpeg', 'image/png')
+        Detection results in the Roboflow API format, with "backend" set to the backend used
     """
-    mime_type, _ = mimetypes.guess_type(file_path)
-    if mime_type and mime_type.startswith('image/'):
-        return mime_type
-    
-    # Default to jpeg if we can't determine the type
-    ext = Path(file_path).suffix.lower()
-    if ext in ['.jpg', '.jpeg']:
-        return 'image/jpeg'
-    elif ext == '.png':
-        return 'image/png'
-    elif ext == '.webp':
-        return 'image/webp'
-    elif ext == '.gif':
-        return 'image/gif'
-    else:
-        # Default fallback
-        return 'image/jpeg'
+    return run_with_backend(
+        'animal',
+        (backend or ANIMAL_BACKEND).lower(),
+        lambda timeout, fail_fast: run_animal_inference_remote(image, confidence, overlap, timeout=timeout,
+                                                           fail_fast=fail_fast),
+        lambda: run_local_inference('animal', image, confidence, overlap, ANIMAL_CLASS_MAP, tiled=tiled)
+    )
 
-def run_animal_inference(image_path, confidence, overlap):
+def run_animal_inference_remote(image, confidence, overlap, timeout=None, fail_fast=False):
     """
     Run inference for animal detection using the Roboflow API.
     
     Args:
-        image_path: Path to the image file
+        image: SharedImage, path to the image file, encoded image bytes or an in-memory
+            BGR numpy array (e.g. a video frame)
         confidence: Confidence threshold (0-1)
         overlap: Overlap threshold (0-1)
+        timeout: Request timeout in seconds (defaults to ROBOFLOW_TIMEOUT)
+        fail_fast: Do not retry connection errors and timeouts (used before failing over)
     
     Returns:
         JSON response from the API with detection results
@@ -77,16 +93,11 @@ def run_animal_inference(image_path, confidence, overlap):
     }
 
     try:
-        logger.info(f"Sending animal detection request to {endpoint}")
-        # Get the appropriate MIME type for the image
-        mime_type = get_mime_type(image_path)
-        logger.info(f"Detected MIME type: {mime_type} for file: {image_path}")
-        
-        with open(image_path, "rb") as f:
-            files = {"file": (os.path.basename(image_path), f, mime_type)}
-            response = requests.post(endpoint, params=params, files=files, timeout=60)
-        response.raise_for_status()
-        result = response.json()
+        logger.info(f"Sending animal detection request to {endpoint} for {describe_image(image)}")
+        # Encoded bytes are taken from the shared image: an upload is sent as it arrived (or
+        # downscaled once to ANIMAL_UPLOAD_MAX_SIDE), an in-memory frame is JPEG-encoded once
+        result = post_shared_image(endpoint, params, as_shared_image(image), max_side=ANIMAL_UPLOAD_MAX_SIDE,
+                                   timeout=timeout, fail_fast=fail_fast)
         
         # Map class IDs to proper names using the defined mapping
         for pred in result.get('predictions', []):
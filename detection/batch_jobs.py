@@ -0,0 +1,113 @@
+import os
+import time
+import uuid
+import logging
+from detection.batch_processing import process_batch
+from detection.video_jobs import VideoJobManager, VIDEO_JOB_RETENTION
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Number of image batches processed at the same time in the background
+BATCH_JOB_WORKERS = int(os.getenv("BATCH_JOB_WORKERS", "1"))
+
+# Maximum number of batches waiting for a worker; further submissions are rejected
+BATCH_JOB_QUEUE_LIMIT = int(os.getenv("BATCH_JOB_QUEUE_LIMIT", "4"))
+
+class BatchJob:
+    """State and progress of one background /detect/batch job."""
+
+    def __init__(self, open_images, images_total, output_folder, options, cleanup):
+        self.id = uuid.uuid4().hex
+        self.open_images = open_images
+        self.output_folder = output_folder
+        self.options = options
+        self.cleanup = list(cleanup)
+        self.status = 'queued'
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.images_done = 0
+        self.images_total = images_total
+        self.manifest = None
+        self.error = None
+
+    def update_progress(self, images_done):
+        """Progress callback passed to process_batch."""
+        self.images_done = images_done
+
+    def to_dict(self):
+        """JSON-serializable status, including throughput and ETA while running."""
+        now = self.finished_at or time.time()
+        elapsed = now - self.started_at if self.started_at else 0.0
+        rate = self.images_done / elapsed if elapsed > 0 else 0.0
+        remaining = max(self.images_total - self.images_done, 0)
+        info = {
+            "job_id": self.id,
+            "status": self.status,
+            "images_done": self.images_done,
+            "images_total": self.images_total,
+            "progress": round(min(self.images_done / self.images_total, 1.0), 4) if self.images_total else 0.0,
+            "images_per_second": round(rate, 2),
+            "elapsed_seconds": round(elapsed, 1),
+            "eta_seconds": round(remaining / rate, 1) if self.status == 'running' and rate > 0 else None
+        }
+        if self.status == 'done':
+            info["totals"] = self.manifest["totals"]
+        if self.error:
+            info["error"] = self.error
+        return info
+
+class BatchJobManager(VideoJobManager):
+    """
+    Runs process_batch in a bounded pool of background threads, for batches too large to
+    answer within one request. Queue limits and retention work as in VideoJobManager.
+    """
+    kind = "batch"
+
+    def __init__(self, max_workers=BATCH_JOB_WORKERS, queue_limit=BATCH_JOB_QUEUE_LIMIT,
+                 retention=VIDEO_JOB_RETENTION):
+        super().__init__(max_workers, queue_limit, retention)
+
+    def submit(self, open_images, images_total, output_folder, cleanup=(), **options):
+        """
+        Queue a batch of images for processing.
+
+        Args:
+            open_images: Callable returning the iterable of SharedImages to process; it is
+                called by the worker, so archives and directories are only read then
+            images_total: Number of images in the batch, for progress reporting
+            output_folder: Folder for annotated images
+            cleanup: Callables run once the job finishes (e.g. discarding spooled uploads)
+            **options: Keyword arguments passed on to process_batch
+
+        Returns:
+            The queued BatchJob
+        """
+        job = self._enqueue(BatchJob(open_images, images_total, output_folder, options, cleanup))
+        logger.info(f"Queued batch job {job.id} for {images_total} images")
+        return job
+
+    def _run(self, job):
+        job.status = 'running'
+        job.started_at = time.time()
+        images = None
+        try:
+            images = job.open_images()
+            job.manifest = process_batch(images, output_folder=job.output_folder,
+                                         progress_callback=job.update_progress, **job.options)
+            job.status = 'done'
+        except Exception as e:
+            logger.error(f"Batch job {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = 'failed'
+        finally:
+            job.finished_at = time.time()
+            if hasattr(images, 'close'):
+                images.close()
+            for cleanup in job.cleanup:
+                try:
+                    cleanup()
+                except Exception as e:
+                    logger.warning(f"Cleanup after batch job {job.id} failed: {e}")
@@ -0,0 +1,289 @@
+"""
+Bulk detection over many still images, e.g. the contents of a camera-trap SD card.
+
+Usage:
+    python -m detection.batch_processing INPUT [INPUT ...] [--output manifest.json|manifest.csv]
+                                         [--annotate DIR] [--chunk-size 32] [--batch-size 8]
+
+INPUT is a directory (searched recursively), a .zip archive or an image file.
+"""
+import io
+import os
+import csv
+import sys
+import json
+import time
+import zipfile
+import logging
+import argparse
+from itertools import islice
+from dotenv import load_dotenv
+from werkzeug.utils import secure_filename
+from detection.orchestrator import run_detectors_batch
+from utils.detection_utils import combine_detection_results, draw_bounding_boxes
+from utils.image_utils import SharedImage
+
+# Load environment variables
+load_dotenv()
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Images decoded and sent through the detectors at once; bounds memory for large batches
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "32"))
+
+# Maximum number of images accepted by one /detect/batch request
+BATCH_MAX_IMAGES = int(os.getenv("BATCH_MAX_IMAGES", "10000"))
+
+# Batches with more images than this are run as a background job (202 with a status URL)
+# instead of within the /detect/batch request
+BATCH_SYNC_MAX_IMAGES = int(os.getenv("BATCH_SYNC_MAX_IMAGES", "100"))
+
+# Largest uncompressed size, in bytes, of an archive member read as an image; larger members
+# are skipped so a small archive cannot expand into gigabytes in memory (zip bomb)
+BATCH_MAX_MEMBER_SIZE = int(os.getenv("BATCH_MAX_MEMBER_SIZE", str(64 * 1024 * 1024)))
+
+# Directory under which /detect/batch may read a server-side directory (disabled if unset)
+BATCH_LOCAL_ROOT = os.getenv("BATCH_LOCAL_ROOT") or None
+
+# File extensions treated as images in directories and archives
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp', '.tif', '.tiff')
+
+# (confidence, overlap) per detector, as used by /detect/multi
+BATCH_SETTINGS = {
+    'animal': (0.3, 0.6),
+    'weapon': (0.25, 0.6),
+    'ppe': (0.3, 0.6)
+}
+
+def _is_image_name(name):
+    return name.lower().endswith(IMAGE_EXTENSIONS)
+
+def iter_directory_images(directory):
+    """Yield a SharedImage for every image file below directory, in sorted order."""
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for filename in sorted(files):
+            if _is_image_name(filename):
+                path = os.path.join(root, filename)
+                yield SharedImage(path=path, name=os.path.relpath(path, directory))
+
+def count_directory_images(directory):
+    """Number of image files below directory."""
+    return sum(1 for _, _, files in os.walk(directory) for filename in files if _is_image_name(filename))
+
+def _is_zip_image(info):
+    name = info.filename
+    return not info.is_dir() and not name.startswith('__MACOSX/') and _is_image_name(name)
+
+def _is_oversized(info, max_size):
+    # file_size is the size declared in the archive; zipfile stops decompressing a member
+    # there, so checking it bounds what zf.read() can return
+    return max_size is not None and info.file_size > max_size
+
+def count_zip_images(archive, max_member_size=BATCH_MAX_MEMBER_SIZE):
+    """Number of images in a zip archive, read from its directory without extracting anything."""
+    if isinstance(archive, (bytes, bytearray)):
+        archive = io.BytesIO(archive)
+    with zipfile.ZipFile(archive) as zf:
+        return sum(1 for info in zf.infolist() if _is_zip_image(info) and not _is_oversized(info, max_member_size))
+
+def check_image_count(count, max_images=BATCH_MAX_IMAGES):
+    """
+    Raises:
+        ValueError: If count is above max_images
+    """
+    if max_images is not None and count > max_images:
+        raise ValueError(f"Too many images ({count}), at most {max_images} are accepted")
+
+def iter_zip_images(archive, max_member_size=BATCH_MAX_MEMBER_SIZE):
+    """
+    Yield a SharedImage for every image in a zip archive. Members are read one at a time,
+    so only the images currently being processed are held in memory.
+
+    Args:
+        archive: Path of the archive, a binary file object or the archive's bytes
+        max_member_size: Members whose uncompressed size is above this many bytes are
+            skipped (defaults to BATCH_MAX_MEMBER_SIZE; None reads every member)
+    """
+    if isinstance(archive, (bytes, bytearray)):
+        archive = io.BytesIO(archive)
+    with zipfile.ZipFile(archive) as zf:
+        for info in zf.infolist():
+            if not _is_zip_image(info):
+                continue
+            if _is_oversized(info, max_member_size):
+                logger.warning(f"Skipping {info.filename}: {info.file_size} bytes uncompressed, "
+                               f"more than {max_member_size}")
+                continue
+            yield SharedImage(data=zf.read(info), name=info.filename)
+
+def iter_input_images(paths):
+    """Yield a SharedImage for every image in a list of directories, zip archives and image files."""
+    for path in paths:
+        if os.path.isdir(path):
+            yield from iter_directory_images(path)
+        elif zipfile.is_zipfile(path):
+            yield from iter_zip_images(path)
+        elif _is_image_name(path):
+            yield SharedImage(path=path, name=os.path.basename(path))
+        else:
+            logger.warning(f"Skipping {path}: not a directory, zip archive or image")
+
+def resolve_local_directory(directory, root=BATCH_LOCAL_ROOT):
+    """
+    Resolve a server-side directory requested by a client, which must lie inside root.
+
+    Raises:
+        ValueError: If no root is configured, or the directory is outside it or missing
+    """
+    if not root:
+        raise ValueError("Reading server-side directories is disabled (set BATCH_LOCAL_ROOT)")
+    root = os.path.realpath(root)
+    resolved = os.path.realpath(os.path.join(root, directory))
+    if os.path.commonpath([root, resolved]) != root:
+        raise ValueError(f"Directory '{directory}' is outside the allowed root")
+    if not os.path.isdir(resolved):
+        raise ValueError(f"Directory '{directory}' does not exist")
+    return resolved
+
+def _count_classes(predictions):
+    counts = {}
+    for pred in predictions:
+        name = pred.get('class', 'unknown')
+        counts[name] = counts.get(name, 0) + 1
+    return counts
+
+def process_batch(images, output_folder=None, annotate=False, settings=None, chunk_size=BATCH_CHUNK_SIZE,
+                  batch_size=None, max_images=None, progress_callback=None):
+    """
+    Run multi-model detection on a stream of images and aggregate the results.
+
+    Images are taken chunk_size at a time: the PPE model (and local models) see each chunk
+    in batched calls while the remote calls of the chunk run concurrently in the detector
+    pool. Results of different models are combined and deduplicated per image.
+
+    Args:
+        images: Iterable of SharedImage (e.g. from iter_input_images)
+        output_folder: Folder for annotated images (required if annotate is True)
+        annotate: Also write a copy of each image with its detections drawn
+        settings: Dict mapping detector name to (confidence, overlap) (defaults to BATCH_SETTINGS)
+        chunk_size: Images processed together
+        batch_size: Images per batched model call (defaults to PPE_BATCH_SIZE)
+        max_images: Optional limit; a ValueError is raised once the input turns out to have
+            more images (check_image_count rejects a known count before any work is done)
+        progress_callback: Optional callable(images_done) called after each chunk
+
+    Returns:
+        Manifest dict with "images" (one entry per image: filename, size, detection count,
+        per-class counts, failed detectors and annotated image path) and "totals"
+    """
+    if annotate and not output_folder:
+        raise ValueError("An output folder is required for annotated images")
+    settings = settings or BATCH_SETTINGS
+    chunk_size = max(1, chunk_size)
+    start = time.perf_counter()
+    entries = []
+    class_counts = {}
+    failed = 0
+    images = iter(images)
+
+    while True:
+        chunk = list(islice(images, chunk_size))
+        if not chunk:
+            break
+        if max_images is not None and len(entries) + len(chunk) > max_images:
+            raise ValueError(f"Too many images, at most {max_images} are accepted")
+
+        readable = [image for image in chunk if image.pixels is not None]
+        detections = iter(run_detectors_batch(readable, settings, batch_size=batch_size) if readable else [])
+        for image in chunk:
+            entry = {"filename": image.name}
+            if image.pixels is None:
+                entry["error"] = "Could not read image"
+                failed += 1
+                entries.append(entry)
+                continue
+            detection = next(detections)
+            combined = combine_detection_results(*(detection['results'].get(name, {"predictions": []})
+                                                   for name in ('animal', 'ppe', 'weapon')))
+            counts = _count_classes(combined['predictions'])
+            for name, count in counts.items():
+                class_counts[name] = class_counts.get(name, 0) + count
+            entry.update({
+                "width": image.width,
+                "height": image.height,
+                "detections": len(combined['predictions']),
+                "class_counts": counts,
+                "failed_detectors": detection['errors']
+            })
+            if annotate:
+                target = os.path.join(output_folder, f"batch_{len(entries)}_{secure_filename(os.path.basename(image.name))}")
+                target = draw_bounding_boxes(image, combined, target, use_custom_colors=True)
+                entry["annotated"] = target
+            entries.append(entry)
+        logger.info(f"Processed {len(entries)} images")
+        if progress_callback is not None:
+            progress_callback(len(entries))
+
+    elapsed = time.perf_counter() - start
+    return {
+        "images": entries,
+        "totals": {
+            "images": len(entries),
+            "failed": failed,
+            "detections": sum(class_counts.values()),
+            "class_counts": class_counts,
+            "seconds": round(elapsed, 2),
+            "images_per_second": round(len(entries) / elapsed, 2) if elapsed > 0 else 0.0
+        }
+    }
+
+def write_manifest_csv(manifest, f):
+    """
+    Write a manifest as CSV to a text file object: one row per image with a count column
+    for every class seen in the batch.
+    """
+    classes = sorted(manifest["totals"]["class_counts"])
+    writer = csv.writer(f)
+    writer.writerow(["filename", "width", "height", "detections", *classes, "failed_detectors", "annotated", "error"])
+    for entry in manifest["images"]:
+        counts = entry.get("class_counts", {})
+        writer.writerow([
+            entry["filename"], entry.get("width", ""), entry.get("height", ""), entry.get("detections", 0),
+            *(counts.get(name, 0) for name in classes),
+            ";".join(sorted(entry.get("failed_detectors", {}))), entry.get("annotated", ""), entry.get("error", "")
+        ])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run multi-model detection on a directory, zip archive or images.")
+    parser.add_argument('inputs', nargs='+', help="Directories, .zip archives or image files")
+    parser.add_argument('--output', help="Manifest file; .csv writes CSV, anything else JSON (default: stdout JSON)")
+    parser.add_argument('--annotate', metavar='DIR', help="Write annotated images to DIR")
+    parser.add_argument('--chunk-size', type=int, default=BATCH_CHUNK_SIZE, help="Images processed together")
+    parser.add_argument('--batch-size', type=int, default=None, help="Images per batched model call")
+    args = parser.parse_args(argv)
+
+    if args.annotate:
+        os.makedirs(args.annotate, exist_ok=True)
+    manifest = process_batch(iter_input_images(args.inputs), output_folder=args.annotate,
+                             annotate=bool(args.annotate), chunk_size=args.chunk_size, batch_size=args.batch_size)
+
+    if args.output and args.output.lower().endswith('.csv'):
+        with open(args.output, 'w', newline='', encoding='utf-8') as f:
+            write_manifest_csv(manifest, f)
+    elif args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+    else:
+        json.dump(manifest, sys.stdout, indent=2)
+        print()
+
+    totals = manifest["totals"]
+    logger.info(f"{totals['images']} images ({totals['failed']} unreadable), {totals['detections']} detections "
+                f"in {totals['seconds']} s ({totals['images_per_second']} images/s)")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,188 @@
+import os
+import json
+import shutil
+import logging
+import zipfile
+import tempfile
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Sidecar formats process_video can write next to (or instead of) the rendered video
+EXPORT_FORMATS = ('jsonl', 'npz')
+
+# Compress the columns of .npz exports (smaller files, slower to write)
+EXPORT_NPZ_COMPRESS = os.getenv("EXPORT_NPZ_COMPRESS", "true").lower() in ('1', 'true', 'yes', 'on')
+
+# Columns of the .npz export: one row per detection
+_NPZ_COLUMNS = {
+    "frame": (np.int32, ()),
+    "timestamp": (np.float64, ()),
+    "class_id": (np.int32, ()),
+    "confidence": (np.float32, ()),
+    "box": (np.float32, (4,)),
+    "track_id": (np.int32, ())
+}
+
+def parse_export_formats(value):
+    """
+    Parse export formats given as a comma-separated string or a list of names.
+
+    Raises:
+        ValueError: If a format is unknown
+    """
+    if not value:
+        return ()
+    if isinstance(value, str):
+        value = value.split(',')
+    formats = []
+    for name in value:
+        name = name.strip().lower()
+        if not name:
+            continue
+        if name not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format '{name}', expected one of {', '.join(EXPORT_FORMATS)}")
+        if name not in formats:
+            formats.append(name)
+    return tuple(formats)
+
+class DetectionExporter:
+    """
+    Stream per-frame detections of a video to sidecar files as frames are processed.
+
+    'jsonl' writes one JSON line per frame with its index, timestamp and predictions.
+    'npz' writes a NumPy archive with one row per detection: frame, timestamp, class_id,
+    confidence, box (x1, y1, x2, y2 in pixels) and track_id (-1 without a track), plus
+    class_names (indexed by class_id), fps and frames_total. Its columns are appended to
+    raw temporary files while the video runs and streamed into the archive on close(),
+    so memory use does not grow with the length of the video.
+
+    write() must be called once per frame, in frame order.
+    """
+
+    def __init__(self, base_path, formats=EXPORT_FORMATS, fps=30.0, compress=EXPORT_NPZ_COMPRESS):
+        """
+        Args:
+            base_path: Output path without extension; '.jsonl' / '.npz' is appended
+            formats: Formats to write, a subset of EXPORT_FORMATS
+            fps: Frame rate of the video, used for timestamps
+            compress: Deflate the .npz columns
+        """
+        self.formats = parse_export_formats(formats)
+        self.fps = fps if fps and fps > 0 else 30.0
+        self.compress = compress
+        self.paths = {name: f"{base_path}.{name}" for name in self.formats}
+        self.frames = 0
+        self.rows = 0
+        self._class_ids = {}
+        self._jsonl = open(self.paths['jsonl'], 'w', encoding='utf-8') if 'jsonl' in self.formats else None
+        self._columns = None
+        if 'npz' in self.formats:
+            self._column_dir = tempfile.mkdtemp(prefix="export_")
+            self._columns = {name: open(os.path.join(self._column_dir, name), 'wb') for name in _NPZ_COLUMNS}
+
+    def _class_id(self, name):
+        if name not in self._class_ids:
+            self._class_ids[name] = len(self._class_ids)
+        return self._class_ids[name]
+
+    def write(self, result):
+        """
+        Record the detections of the next frame.
+
+        Args:
+            result: Detection result in Roboflow API format (None or empty for no detections)
+        """
+        index = self.frames
+        timestamp = index / self.fps
+        predictions = [p for p in (result or {}).get('predictions', []) if 'width' in p and 'height' in p]
+        self.frames += 1
+        self.rows += len(predictions)
+
+        if self._jsonl is not None:
+            self._jsonl.write(json.dumps({
+                "frame": index,
+                "timestamp": round(timestamp, 6),
+                "predictions": predictions
+            }, default=float) + "\n")
+
+        if self._columns is not None and predictions:
+            x = np.array([p['x'] for p in predictions], dtype=np.float32)
+            y = np.array([p['y'] for p in predictions], dtype=np.float32)
+            half_w = np.array([p['width'] for p in predictions], dtype=np.float32) / 2
+            half_h = np.array([p['height'] for p in predictions], dtype=np.float32) / 2
+            columns = {
+                "frame": np.full(len(predictions), index, dtype=np.int32),
+                "timestamp": np.full(len(predictions), timestamp, dtype=np.float64),
+                "class_id": np.array([self._class_id(p.get('class')) for p in predictions], dtype=np.int32),
+                "confidence": np.array([p.get('confidence', 0.0) for p in predictions], dtype=np.float32),
+                "box": np.stack([x - half_w, y - half_h, x + half_w, y + half_h], axis=1),
+                "track_id": np.array([p.get('track_id', -1) for p in predictions], dtype=np.int32)
+            }
+            for name, values in columns.items():
+                self._columns[name].write(np.ascontiguousarray(values).tobytes())
+
+    def _write_npz(self):
+        """Stream the raw column files into the .npz archive as .npy members."""
+        compression = zipfile.ZIP_DEFLATED if self.compress else zipfile.ZIP_STORED
+        with zipfile.ZipFile(self.paths['npz'], 'w', compression=compression, allowZip64=True) as archive:
+            for name, (dtype, tail) in _NPZ_COLUMNS.items():
+                self._columns[name].close()
+                header = {
+                    'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)),
+                    'fortran_order': False,
+                    'shape': (self.rows,) + tail
+                }
+                with archive.open(f"{name}.npy", 'w', force_zip64=True) as member, \
+                        open(os.path.join(self._column_dir, name), 'rb') as column:
+                    np.lib.format.write_array_header_1_0(member, header)
+                    shutil.copyfileobj(column, member, 1 << 20)
+
+            class_names = np.array([str(name) for name in self._class_ids], dtype=np.str_)
+            for name, value in (("class_names", class_names), ("fps", np.float64(self.fps)),
+                                ("frames_total", np.int64(self.frames))):
+                with archive.open(f"{name}.npy", 'w') as member:
+                    np.lib.format.write_array(member, np.asarray(value), allow_pickle=False)
+
+    def close(self):
+        """
+        Finish the sidecar files.
+
+        Returns:
+            Dict mapping each format to the path of its file
+        """
+        try:
+            if self._jsonl is not None:
+                self._jsonl.close()
+                self._jsonl = None
+            if self._columns is not None:
+                self._write_npz()
+        finally:
+            self._discard_columns()
+        logger.info(f"Exported {self.rows} detections over {self.frames} frames to {', '.join(self.paths.values())}")
+        return dict(self.paths)
+
+    def _discard_columns(self):
+        """Close and delete the temporary column files."""
+        if self._columns is None:
+            return
+        for column in self._columns.values():
+            column.close()
+        shutil.rmtree(self._column_dir, ignore_errors=True)
+        self._columns = None
+
+    def abort(self):
+        """Stop exporting and delete the partial sidecar files."""
+        if self._jsonl is not None:
+            self._jsonl.close()
+            self._jsonl = None
+        self._discard_columns()
+        for path in self.paths.values():
+            if os.path.exists(path):
+                os.remove(path)
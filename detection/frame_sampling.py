@@ -0,0 +1,233 @@
+import cv2
+import logging
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Supported frame sampling modes for video inference
+SAMPLING_MODES = ('all', 'nth', 'fps', 'keyframes')
+
+# Supported ways of filling in detections on frames that were not inferred
+CARRY_MODES = ('hold', 'interpolate', 'track')
+
+# Downscaled size used to compare frames in keyframe mode
+KEYFRAME_THUMB_SIZE = (64, 36)
+
+# Frames 'interpolate' mode buffers while waiting for the next inferred frame
+INTERPOLATE_MAX_BUFFER = 120
+
+class FrameSampler:
+    """
+    Decide which video frames are sent to the detectors.
+    
+    Modes:
+        all: every frame is inferred
+        nth: every Nth frame is inferred
+        fps: frames are inferred at (approximately) a target inference frame rate
+        keyframes: only scene changes are inferred, detected by comparing grayscale
+            histograms of downscaled frames against the last inferred frame. A frame is
+            also inferred after max_gap frames without one, so detections never go stale.
+    
+    should_infer() is stateful and must be called once per frame, in frame order.
+    """
+
+    def __init__(self, mode='all', every_n=1, target_fps=None, video_fps=30.0,
+                 keyframe_threshold=0.3, max_gap=None):
+        """
+        Args:
+            mode: One of SAMPLING_MODES
+            every_n: Inference interval in frames for 'nth' mode
+            target_fps: Inference frame rate for 'fps' mode
+            video_fps: Frame rate of the source video
+            keyframe_threshold: Histogram dissimilarity (0-1) above which a frame counts as
+                a scene change in 'keyframes' mode
+            max_gap: Maximum number of frames between two inferred frames in 'keyframes'
+                mode (defaults to two seconds of video)
+        """
+        if mode not in SAMPLING_MODES:
+            raise ValueError(f"Unknown sampling mode '{mode}', expected one of {', '.join(SAMPLING_MODES)}")
+        if mode == 'nth' and (every_n is None or every_n < 1):
+            raise ValueError("every_n must be a positive integer")
+        if mode == 'fps' and (target_fps is None or target_fps <= 0):
+            raise ValueError("target_fps must be positive")
+
+        self.mode = mode
+        self.every_n = int(every_n or 1)
+        self.video_fps = video_fps if video_fps and video_fps > 0 else 30.0
+        self.frame_step = self.video_fps / target_fps if mode == 'fps' else 1.0
+        self.keyframe_threshold = keyframe_threshold
+        self.max_gap = int(max_gap or max(1, round(2 * self.video_fps)))
+        self.frames_seen = 0
+        self.frames_inferred = 0
+        self._next_frame_at = 0.0
+        self._last_inferred_index = None
+        self._last_keyframe_hist = None
+
+    def _is_keyframe(self, index, frame):
+        """Compare the frame's grayscale histogram with the last keyframe's."""
+        small = cv2.resize(frame, KEYFRAME_THUMB_SIZE, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        hist = cv2.calcHist([gray], [0], None, [32], [0, 256])
+        cv2.normalize(hist, hist)
+
+        is_keyframe = (
+            self._last_keyframe_hist is None
+            or index - self._last_inferred_index >= self.max_gap
+            or 1.0 - cv2.compareHist(self._last_keyframe_hist, hist, cv2.HISTCMP_CORREL) > self.keyframe_threshold
+        )
+        if is_keyframe:
+            self._last_keyframe_hist = hist
+        return is_keyframe
+
+    def should_infer(self, index, frame):
+        """
+        Args:
+            index: Zero-based frame index
+            frame: Decoded BGR frame
+        
+        Returns:
+            True if the frame should be sent to the detectors
+        """
+        self.frames_seen += 1
+        if self.mode == 'all':
+            infer = True
+        elif self.mode == 'nth':
+            infer = index % self.every_n == 0
+        elif self.mode == 'fps':
+            infer = index >= self._next_frame_at
+            while self._next_frame_at <= index:
+                self._next_frame_at += self.frame_step
+        else:
+            infer = self._is_keyframe(index, frame)
+
+        if infer:
+            self.frames_inferred += 1
+            self._last_inferred_index = index
+        return infer
+
+def _box_iou(a, b):
+    """IoU between two Roboflow-format (center x/y, width, height) predictions."""
+    ax1, ay1 = a['x'] - a['width'] / 2, a['y'] - a['height'] / 2
+    ax2, ay2 = a['x'] + a['width'] / 2, a['y'] + a['height'] / 2
+    bx1, by1 = b['x'] - b['width'] / 2, b['y'] - b['height'] / 2
+    bx2, by2 = b['x'] + b['width'] / 2, b['y'] + b['height'] / 2
+    inter = max(0.0, min(ax2, bx2) - max(ax1, bx1)) * max(0.0, min(ay2, by2) - max(ay1, by1))
+    union = a['width'] * a['height'] + b['width'] * b['height'] - inter
+    return inter / union if union > 0 else 0.0
+
+def interpolate_predictions(start_result, end_result, t):
+    """
+    Linearly interpolate boxes between two inferred frames.
+    
+    Each box of the start frame is matched greedily to the best-overlapping box of the same
+    class on the end frame. Matched boxes are interpolated; unmatched start boxes are held.
+    
+    Args:
+        start_result: Detection result of the earlier inferred frame
+        end_result: Detection result of the later inferred frame
+        t: Position between the two frames (0 = start, 1 = end)
+    
+    Returns:
+        Detection result in Roboflow API format
+    """
+    end_preds = list(end_result.get('predictions', []))
+    used = set()
+    predictions = []
+    for pred in start_result.get('predictions', []):
+        best_index, best_iou = None, 0.0
+        for i, candidate in enumerate(end_preds):
+            if i in used or candidate.get('class') != pred.get('class'):
+                continue
+            iou = _box_iou(pred, candidate)
+            if iou > best_iou:
+                best_index, best_iou = i, iou
+        if best_index is None:
+            predictions.append(pred)
+            continue
+        used.add(best_index)
+        target = end_preds[best_index]
+        interpolated = dict(pred)
+        for key in ('x', 'y', 'width', 'height', 'confidence'):
+            interpolated[key] = pred[key] + (target[key] - pred[key]) * t
+        predictions.append(interpolated)
+    return {"predictions": predictions}
+
+class DetectionCarrier:
+    """
+    Fill in detections for frames that were not inferred.
+    
+    Frames are pushed in order. In 'hold' mode every frame is released immediately with the
+    last inferred detections. In 'interpolate' mode frames are buffered until the next
+    inferred frame arrives so boxes can be interpolated between the two; once max_buffer
+    frames are waiting they are released with the last detections held, as are the rest of
+    the frames up to the next inferred one, so memory stays bounded. In 'track' mode
+    frames get the boxes predicted by the tracker's motion model.
+    
+    With a tracker (required for 'track' mode) every frame steps it, and inferred detections
+    get a track_id.
+    """
+
+    def __init__(self, mode='hold', tracker=None, max_buffer=INTERPOLATE_MAX_BUFFER):
+        """
+        Args:
+            mode: One of CARRY_MODES
+            tracker: Optional IoUTracker
+            max_buffer: Maximum number of frames buffered in 'interpolate' mode
+        """
+        if mode not in CARRY_MODES:
+            raise ValueError(f"Unknown carry mode '{mode}', expected one of {', '.join(CARRY_MODES)}")
+        if mode == 'track' and tracker is None:
+            raise ValueError("carry mode 'track' needs a tracker")
+        self.mode = mode
+        self.tracker = tracker
+        self._last_result = {"predictions": []}
+        self.max_buffer = max(1, max_buffer)
+        self._buffer = []
+        self._holding = False
+
+    def push(self, frame, result):
+        """
+        Args:
+            frame: Decoded frame
+            result: Detection result if the frame was inferred, otherwise None
+        
+        Returns:
+            List of (frame, detection_result) pairs that are ready to be drawn, in order
+        """
+        if self.tracker is not None:
+            tracked = self.tracker.step(result)
+            if result is not None:
+                result = tracked
+            elif self.mode == 'track':
+                return [(frame, tracked)]
+        if self.mode in ('hold', 'track'):
+            if result is not None:
+                self._last_result = result
+            return [(frame, self._last_result)]
+
+        if result is None:
+            if self._holding:
+                return [(frame, self._last_result)]
+            self._buffer.append(frame)
+            if len(self._buffer) < self.max_buffer:
+                return []
+            # Gap too long to wait for: hold the last detections until the next inferred frame
+            self._holding = True
+            return self.flush()
+
+        self._holding = False
+        ready = []
+        gap = len(self._buffer) + 1
+        for i, buffered in enumerate(self._buffer, start=1):
+            ready.append((buffered, interpolate_predictions(self._last_result, result, i / gap)))
+        self._buffer = []
+        self._last_result = result
+        ready.append((frame, result))
+        return ready
+
+    def flush(self):
+        """Release frames still buffered at the end of the video, holding the last detections."""
+        ready = [(frame, self._last_result) for frame in self._buffer]
+        self._buffer = []
+        return ready
@@ -0,0 +1,147 @@
+import os
+import time
+import logging
+import threading
+import requests
+from dotenv import load_dotenv
+from detection.model_registry import model_registry
+from detection.tiling import predict_tiled_columns
+from detection.yolo_utils import yolo_result_to_predictions, iter_predictions
+from utils.image_utils import as_shared_image, describe_image
+
+# Load environment variables
+load_dotenv()
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Where the animal and weapon detectors run: 'remote' (Roboflow API), 'local' (ultralytics
+# weights from the model registry) or 'auto' (remote, failing over to local when the API
+# times out or cannot be reached). <NAME>_BACKEND (e.g. ANIMAL_BACKEND) overrides it per detector.
+BACKENDS = ('remote', 'local', 'auto')
+DETECTOR_BACKEND = os.getenv("DETECTOR_BACKEND", "remote").lower()
+
+# Timeout in seconds of the remote call in 'auto' mode; timeouts and connection errors are not
+# retried there, so failover happens after one attempt
+BACKEND_FAILOVER_TIMEOUT = float(os.getenv("BACKEND_FAILOVER_TIMEOUT", "10"))
+
+def backend_for(prefix):
+    """Configured backend for a detector, e.g. ANIMAL_BACKEND, else DETECTOR_BACKEND."""
+    return os.getenv(f"{prefix}_BACKEND", DETECTOR_BACKEND).lower()
+
+class BackendLatency:
+    """Thread-safe call counts and latencies per detector and backend."""
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, detector, backend, seconds, ok=True):
+        with self._lock:
+            entry = self._stats.setdefault((detector, backend), {
+                "calls": 0, "failures": 0, "total_s": 0.0, "max_s": 0.0, "last_s": 0.0
+            })
+            entry["calls"] += 1
+            entry["failures"] += 0 if ok else 1
+            entry["total_s"] += seconds
+            entry["max_s"] = max(entry["max_s"], seconds)
+            entry["last_s"] = seconds
+
+    def stats(self):
+        """Latency summary as {detector: {backend: {...}}} with times in milliseconds."""
+        with self._lock:
+            info = {}
+            for (detector, backend), entry in sorted(self._stats.items()):
+                info.setdefault(detector, {})[backend] = {
+                    "calls": entry["calls"],
+                    "failures": entry["failures"],
+                    "avg_ms": round(1000 * entry["total_s"] / entry["calls"], 1),
+                    "max_ms": round(1000 * entry["max_s"], 1),
+                    "last_ms": round(1000 * entry["last_s"], 1)
+                }
+            return info
+
+backend_latency = BackendLatency()
+
+def run_local_inference(name, image, confidence, overlap, class_map=None, tiled=False):
+    """
+    Run a local ultralytics model from the model registry and return its detections in
+    the Roboflow API format.
+
+    Args:
+        name: Registry model name (e.g. 'animal', 'weapon')
+        image: SharedImage, path to the image file, encoded image bytes or a BGR numpy array
+        confidence: Confidence threshold (0-1)
+        overlap: Overlap threshold (0-1)
+        class_map: Optional dict applied to the model's class names
+        tiled: If True, run the model on overlapping tiles and merge them
+
+    Returns:
+        Dict with predictions, image size, model and version, like the Roboflow API response
+    """
+    entry = model_registry.get(name)
+    if entry is None:
+        raise RuntimeError(f"Local {name} model is not available (set {name.upper()}_MODEL_PATH or MODEL_PATHS)")
+    pixels = as_shared_image(image).pixels
+    if pixels is None:
+        raise ValueError(f"Could not read image {describe_image(image)}")
+
+    if tiled:
+        columns = predict_tiled_columns(entry.model, pixels, confidence, overlap, class_map,
+                                        lock=model_registry.predict_lock(name))
+        predictions = list(iter_predictions(columns))
+    else:
+        with model_registry.predict_lock(name):
+            results = entry.model.predict(source=pixels, conf=confidence, iou=overlap, verbose=False)
+        predictions = yolo_result_to_predictions(results[0], class_map)
+    return {
+        "predictions": predictions,
+        "image": {"width": pixels.shape[1], "height": pixels.shape[0]},
+        "model": f"{name}-local",
+        "version": entry.tag
+    }
+
+def _timed(detector, backend, func, *args):
+    start = time.perf_counter()
+    try:
+        result = func(*args)
+    except Exception:
+        backend_latency.record(detector, backend, time.perf_counter() - start, ok=False)
+        raise
+    backend_latency.record(detector, backend, time.perf_counter() - start)
+    result["backend"] = backend
+    return result
+
+def run_with_backend(detector, backend, remote_fn, local_fn):
+    """
+    Run a detector on the selected backend, recording the latency of every backend call.
+
+    Args:
+        detector: Detector name; also the registry name of its local model
+        backend: 'remote', 'local' or 'auto'
+        remote_fn: Callable(timeout, fail_fast) calling the remote API (timeout None uses
+            the default; fail_fast skips retries of connection errors and timeouts)
+        local_fn: Callable() running the local model
+
+    Returns:
+        The detection result, with "backend" set to the backend that produced it. A result
+        of the local model after a failed remote call also has "failover": True and is not
+        cached, so the remote API is used again as soon as it recovers.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown {detector} backend '{backend}', expected one of {', '.join(BACKENDS)}")
+    if backend == 'local':
+        return _timed(detector, 'local', local_fn)
+    if backend == 'remote':
+        return _timed(detector, 'remote', remote_fn, None, False)
+
+    try:
+        return _timed(detector, 'remote', remote_fn, BACKEND_FAILOVER_TIMEOUT, True)
+    except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+        if model_registry.resolve_path(detector) is None:
+            raise
+        logger.warning(f"Remote {detector} detection unavailable ({e}), failing over to the local model")
+        result = _timed(detector, 'local', local_fn)
+        result["failover"] = True
+        return result
@@ -0,0 +1,254 @@
+import os
+import time
+import logging
+import threading
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Directories searched for "<name>.pt" when a model has no explicit path; only these exact
+# locations are checked, the project tree is never walked
+MODEL_SEARCH_DIRS = [
+    os.path.join(PROJECT_DIR, "models"),
+    PROJECT_DIR,
+    os.path.join(PROJECT_DIR, "weights"),
+    os.path.join(PROJECT_DIR, "static", "models"),
+]
+
+# Explicit weights per model as "name=path" pairs, e.g. "ppe=/srv/ppe.pt,animal=/srv/animal.pt";
+# <NAME>_MODEL_PATH (e.g. PPE_MODEL_PATH) takes precedence for a single model
+MODEL_PATHS = os.getenv("MODEL_PATHS", "")
+
+# 'eager' loads every model whose weights exist at startup, 'lazy' on first use
+MODEL_LOADING = os.getenv("MODEL_LOADING", "eager").lower()
+
+# How local models run: 'torch' (ultralytics/PyTorch) or 'onnx' (a cached ONNX export run with
+# onnxruntime, faster on CPU-only hosts); <NAME>_RUNTIME (e.g. PPE_RUNTIME) overrides it per model
+MODEL_RUNTIME = os.getenv("MODEL_RUNTIME", "torch").lower()
+
+# Run one inference on a blank image after loading so the first request is not slow
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "true").lower() in ('1', 'true', 'yes', 'on')
+MODEL_WARMUP_SIZE = int(os.getenv("MODEL_WARMUP_SIZE", "640"))
+
+def parse_model_paths(spec):
+    """Parse a "name=path,name=path" string into a dict."""
+    paths = {}
+    for item in spec.split(','):
+        if '=' in item:
+            name, path = item.split('=', 1)
+            if name.strip() and path.strip():
+                paths[name.strip()] = path.strip()
+    return paths
+
+def _rss_bytes():
+    """Resident memory of this process in bytes, or None if it cannot be determined."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def _parameter_bytes(model):
+    """Size of a YOLO model's weights in bytes, or None if it is not a torch model."""
+    try:
+        return int(sum(p.numel() * p.element_size() for p in model.model.parameters()))
+    except Exception:
+        return None
+
+def model_tag(path, runtime='torch'):
+    """Identifies weights (path, modification time and runtime) in detection cache keys."""
+    return f"{path}:{int(os.path.getmtime(path))}" + (f":{runtime}" if runtime != 'torch' else "")
+
+class LoadedModel:
+    """A model held by the registry, with its load statistics."""
+
+    def __init__(self, name, path, model, load_seconds, warmup_seconds, memory_bytes, parameter_bytes, runtime='torch'):
+        self.name = name
+        self.path = path
+        self.model = model
+        self.runtime = runtime
+        self.tag = model_tag(path, runtime)
+        self.load_seconds = load_seconds
+        self.warmup_seconds = warmup_seconds
+        self.memory_bytes = memory_bytes
+        self.parameter_bytes = parameter_bytes
+        self.loaded_at = time.time()
+        self.class_names = dict(getattr(model, 'names', None) or {})
+
+    def to_dict(self):
+        return {
+            "path": self.path,
+            "runtime": self.runtime,
+            "load_seconds": round(self.load_seconds, 3),
+            "warmup_seconds": round(self.warmup_seconds, 3) if self.warmup_seconds is not None else None,
+            "memory_mb": round(self.memory_bytes / 2**20, 1) if self.memory_bytes is not None else None,
+            "parameters_mb": round(self.parameter_bytes / 2**20, 1) if self.parameter_bytes is not None else None,
+            "classes": len(self.class_names)
+        }
+
+class ModelRegistry:
+    """
+    Named local YOLO models, loaded once per process from a configured path map.
+
+    Models are loaded on first use or all at once by preload(). Each model has its own
+    predict lock, because the ultralytics predictor keeps per-call state and concurrent
+    predict() calls on one model must be serialized.
+    """
+
+    def __init__(self, paths=None, search_dirs=None, warmup=MODEL_WARMUP, warmup_size=MODEL_WARMUP_SIZE):
+        """
+        Args:
+            paths: Dict of model name -> weights path (defaults to MODEL_PATHS)
+            search_dirs: Directories searched for "<name>.pt" for models without a path
+            warmup: Whether to run a warm-up inference after loading
+            warmup_size: Side length of the blank warm-up image
+        """
+        self.paths = dict(parse_model_paths(MODEL_PATHS) if paths is None else paths)
+        self.search_dirs = list(MODEL_SEARCH_DIRS if search_dirs is None else search_dirs)
+        self.warmup = warmup
+        self.warmup_size = warmup_size
+        self._models = {}
+        self._errors = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def candidate_paths(self, name):
+        """Paths checked, in order, for the weights of a model."""
+        explicit = os.getenv(f"{name.upper()}_MODEL_PATH") or self.paths.get(name)
+        if explicit:
+            return [explicit]
+        return [os.path.join(directory, f"{name}.pt") for directory in self.search_dirs]
+
+    def resolve_path(self, name):
+        """Return the weights path of a model, or None if no candidate exists."""
+        for path in self.candidate_paths(name):
+            if os.path.exists(path):
+                return path
+        return None
+
+    def runtime(self, name):
+        """Runtime of a model: 'torch' or 'onnx'."""
+        return os.getenv(f"{name.upper()}_RUNTIME", MODEL_RUNTIME).lower()
+
+    def predict_lock(self, name):
+        """Lock serializing predict() calls on a model."""
+        with self._lock:
+            return self._locks.setdefault(name, threading.Lock())
+
+    def is_loaded(self, name):
+        return name in self._models
+
+    def get(self, name, load=True):
+        """
+        Return the LoadedModel for name, loading it first if needed.
+
+        Args:
+            name: Model name (e.g. 'ppe', 'animal', 'weapon')
+            load: If False, only return an already loaded model
+
+        Returns:
+            The LoadedModel, or None if it is not loaded and could not be loaded
+        """
+        entry = self._models.get(name)
+        if entry is not None or not load:
+            return entry
+        # Loading holds the model's predict lock so concurrent first requests load it once
+        with self.predict_lock(name):
+            if name not in self._models:
+                self._load(name)
+            return self._models.get(name)
+
+    def _load(self, name):
+        path = self.resolve_path(name)
+        if not path:
+            self._errors[name] = f"No weights found (checked {', '.join(self.candidate_paths(name))})"
+            logger.error(f"Model '{name}': {self._errors[name]}")
+            return
+        runtime = self.runtime(name)
+        try:
+            if runtime == 'onnx':
+                import onnxruntime  # noqa: F401 (imported by the ONNX model; checked here for a clear error)
+                from detection.onnx_export import load_onnx_model as load_model
+            else:
+                from ultralytics import YOLO as load_model
+        except ImportError as e:
+            module = e.name or ('onnxruntime' if runtime == 'onnx' else 'ultralytics')
+            self._errors[name] = f"{module} is not installed"
+            logger.error(f"Failed to import {module}. Please install with: pip install {module}")
+            return
+        try:
+            rss_before = _rss_bytes()
+            start = time.perf_counter()
+            logger.info(f"Loading model '{name}' from {path} ({runtime})")
+            model = load_model(path)
+            load_seconds = time.perf_counter() - start
+
+            warmup_seconds = None
+            if self.warmup:
+                start = time.perf_counter()
+                model.predict(source=np.zeros((self.warmup_size, self.warmup_size, 3), dtype=np.uint8), verbose=False)
+                warmup_seconds = time.perf_counter() - start
+
+            rss_after = _rss_bytes()
+            memory_bytes = rss_after - rss_before if rss_before is not None and rss_after is not None else None
+            entry = LoadedModel(name, path, model, load_seconds, warmup_seconds, memory_bytes,
+                                _parameter_bytes(model), runtime)
+            self._models[name] = entry
+            self._errors.pop(name, None)
+            logger.info(f"Model '{name}' loaded in {load_seconds:.2f}s"
+                        + (f", warm-up {warmup_seconds:.2f}s" if warmup_seconds is not None else ""))
+        except Exception as e:
+            self._errors[name] = str(e)
+            logger.error(f"Failed to load model '{name}' from {path}: {e}")
+
+    def unload(self, name):
+        """Drop a loaded model so the next get() reloads it (e.g. after replacing its weights)."""
+        with self.predict_lock(name):
+            self._models.pop(name, None)
+
+    def preload(self, names):
+        """Load every model in names whose weights exist."""
+        for name in names:
+            if self.resolve_path(name):
+                self.get(name)
+
+    def stats(self, names=()):
+        """Load state of every known model (and of names), without loading anything."""
+        names = sorted(set(names) | set(self.paths) | set(self._models) | set(self._errors) | set(self._locks))
+        info = {}
+        for name in names:
+            entry = self._models.get(name)
+            if entry is not None:
+                info[name] = {"loaded": True, **entry.to_dict()}
+            else:
+                info[name] = {"loaded": False, "path": self.resolve_path(name), "error": self._errors.get(name)}
+        return info
+
+model_registry = ModelRegistry()
+
+# Local models known to the application
+LOCAL_MODEL_NAMES = ('ppe', 'animal', 'weapon')
+
+def preload_models(exclude=()):
+    """
+    Load the local models at startup when MODEL_LOADING is 'eager'.
+
+    Args:
+        exclude: Names of models that are not loaded in this process (e.g. ones run by
+            worker processes)
+    """
+    if MODEL_LOADING == 'eager':
+        model_registry.preload(name for name in LOCAL_MODEL_NAMES if name not in exclude)
@@ -0,0 +1,228 @@
+"""
+Export YOLOv8 weights to ONNX and run them with onnxruntime on CPU.
+
+Usage:
+    python -m detection.onnx_export [--weights models/ppe.pt] [--imgsz 640] [--force]
+                                    [--verify] [--images a.jpg b.jpg] [--runs 20]
+"""
+import os
+import ast
+import sys
+import time
+import hashlib
+import logging
+import argparse
+import numpy as np
+from dotenv import load_dotenv
+from detection.postprocess import letterbox, to_input_tensor, decode_yolov8_output
+
+# Load environment variables
+load_dotenv()
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# onnxruntime intra-op threads per session (0 lets onnxruntime decide)
+ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))
+
+# Input size of exported models
+ONNX_IMGSZ = int(os.getenv("ONNX_IMGSZ", "640"))
+
+def weights_hash(weights_path):
+    """Short SHA-256 of a weights file, identifying its ONNX export."""
+    digest = hashlib.sha256()
+    with open(weights_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+def onnx_path_for(weights_path, imgsz=ONNX_IMGSZ):
+    """Cached export location next to the weights, e.g. models/ppe.<hash>.640.onnx."""
+    stem = os.path.splitext(weights_path)[0]
+    return f"{stem}.{weights_hash(weights_path)}.{imgsz}.onnx"
+
+def export_onnx(weights_path, imgsz=ONNX_IMGSZ, force=False):
+    """
+    Export YOLOv8 weights to ONNX once; later calls reuse the cached export as long as the
+    weights are unchanged.
+
+    Args:
+        weights_path: Path to the .pt weights
+        imgsz: Model input size
+        force: Re-export even if a cached export exists
+
+    Returns:
+        Path of the ONNX file
+    """
+    target = onnx_path_for(weights_path, imgsz)
+    if os.path.exists(target) and not force:
+        return target
+    from ultralytics import YOLO
+    logger.info(f"Exporting {weights_path} to ONNX (imgsz {imgsz})")
+    exported = YOLO(weights_path).export(format='onnx', imgsz=imgsz, simplify=True)
+    os.replace(exported, target)
+    logger.info(f"Saved ONNX export to {target}")
+    return target
+
+class OnnxBoxes:
+    """The part of ultralytics' Boxes used by yolo_utils, backed by numpy arrays."""
+
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+
+    def __len__(self):
+        return len(self.conf)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self
+
+class OnnxResult:
+    """Detections for one image, shaped like an ultralytics Results object."""
+
+    def __init__(self, names, boxes, orig_shape):
+        self.names = names
+        self.boxes = boxes
+        self.orig_shape = orig_shape
+
+class OnnxYoloModel:
+    """
+    A YOLOv8 detection model exported to ONNX, run with onnxruntime.
+
+    predict() takes the same arguments as ultralytics' YOLO.predict() and returns results
+    that convert_yolo_result and yolo_utils accept, so it can stand in for the PyTorch model.
+    """
+
+    def __init__(self, onnx_path, intra_op_threads=ONNX_INTRA_OP_THREADS):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(onnx_path, sess_options=options, providers=['CPUExecutionProvider'])
+        self.path = onnx_path
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.fixed_batch = isinstance(model_input.shape[0], int)
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(metadata['names']) if 'names' in metadata else {}
+        imgsz = ast.literal_eval(metadata['imgsz']) if 'imgsz' in metadata else model_input.shape[2:]
+        self.imgsz = tuple(int(v) for v in imgsz)
+
+    def predict(self, source, conf=0.25, iou=0.7, verbose=False, max_det=300, **kwargs):
+        """
+        Run detection on a BGR array or a list of them.
+
+        Returns:
+            List with one OnnxResult per image
+        """
+        images = source if isinstance(source, (list, tuple)) else [source]
+        prepared = [letterbox(image, self.imgsz) for image in images]
+        if self.fixed_batch:
+            outputs = [self.session.run(None, {self.input_name: to_input_tensor([padded])})[0][0]
+                       for padded, _, _ in prepared]
+        else:
+            outputs = self.session.run(None, {self.input_name: to_input_tensor([padded for padded, _, _ in prepared])})[0]
+
+        results = []
+        for image, (_, ratio, pad), output in zip(images, prepared, outputs):
+            xyxy, scores, class_ids = decode_yolov8_output(output, conf, iou, ratio, pad, image.shape, max_det)
+            results.append(OnnxResult(self.names, OnnxBoxes(xyxy, scores, class_ids), image.shape[:2]))
+        return results
+
+def load_onnx_model(weights_path, imgsz=ONNX_IMGSZ, intra_op_threads=ONNX_INTRA_OP_THREADS):
+    """Load the ONNX export of weights_path, exporting it first if there is no cached export."""
+    if weights_path.endswith('.onnx'):
+        return OnnxYoloModel(weights_path, intra_op_threads)
+    return OnnxYoloModel(export_onnx(weights_path, imgsz), intra_op_threads)
+
+def _match_detections(reference, candidate, iou_threshold=0.5):
+    """Count reference boxes matched by a same-class candidate box with IoU >= iou_threshold."""
+    matched = 0
+    used = set()
+    for box, cls in zip(reference.boxes.xyxy, reference.boxes.cls):
+        for j, (other, other_cls) in enumerate(zip(candidate.boxes.xyxy, candidate.boxes.cls)):
+            if j in used or int(other_cls) != int(cls):
+                continue
+            x1, y1 = np.maximum(box[:2], other[:2])
+            x2, y2 = np.minimum(box[2:], other[2:])
+            inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+            union = np.prod(box[2:] - box[:2]) + np.prod(other[2:] - other[:2]) - inter
+            if union > 0 and inter / union >= iou_threshold:
+                matched += 1
+                used.add(j)
+                break
+    return matched
+
+def verify(weights_path, onnx_model, images, runs=20, confidence=0.3, overlap=0.6):
+    """
+    Compare the ONNX model with the PyTorch model: detections matched per image and the
+    mean latency of each over runs calls.
+
+    Returns:
+        Dict with parity and latency figures
+    """
+    from ultralytics import YOLO
+    torch_model = YOLO(weights_path)
+    report = {"images": [], "latency_ms": {}}
+    for index, image in enumerate(images):
+        reference = torch_model.predict(source=image, conf=confidence, iou=overlap, verbose=False)[0].cpu().numpy()
+        candidate = onnx_model.predict(source=image, conf=confidence, iou=overlap)[0]
+        report["images"].append({
+            "image": index,
+            "torch_detections": len(reference.boxes),
+            "onnx_detections": len(candidate.boxes),
+            "matched": _match_detections(reference, candidate)
+        })
+
+    for name, model in (("torch", torch_model), ("onnx", onnx_model)):
+        model.predict(source=images[0], conf=confidence, iou=overlap, verbose=False)
+        start = time.perf_counter()
+        for i in range(runs):
+            model.predict(source=images[i % len(images)], conf=confidence, iou=overlap, verbose=False)
+        report["latency_ms"][name] = round(1000 * (time.perf_counter() - start) / runs, 1)
+    return report
+
+def main(argv=None):
+    from detection.model_registry import model_registry
+    from utils.image_utils import load_image
+
+    parser = argparse.ArgumentParser(description="Export YOLOv8 weights to ONNX for CPU inference.")
+    parser.add_argument('--weights', help="Weights to export (defaults to the registry's ppe model)")
+    parser.add_argument('--imgsz', type=int, default=ONNX_IMGSZ, help="Model input size")
+    parser.add_argument('--force', action='store_true', help="Re-export even if a cached export exists")
+    parser.add_argument('--threads', type=int, default=ONNX_INTRA_OP_THREADS, help="onnxruntime intra-op threads")
+    parser.add_argument('--verify', action='store_true', help="Compare detections and latency with the PyTorch model")
+    parser.add_argument('--images', nargs='*', default=[], help="Images used by --verify (random images if omitted)")
+    parser.add_argument('--runs', type=int, default=20, help="Timed runs per model for --verify")
+    args = parser.parse_args(argv)
+
+    weights = args.weights or model_registry.resolve_path('ppe')
+    if not weights or not os.path.exists(weights):
+        parser.error("PPE weights not found; pass --weights")
+
+    onnx_path = export_onnx(weights, args.imgsz, force=args.force)
+    print(f"ONNX model: {onnx_path}")
+    if args.verify:
+        images = [load_image(path) for path in args.images]
+        if any(image is None for image in images):
+            parser.error("Could not read all --images")
+        if not images:
+            rng = np.random.default_rng(0)
+            images = [rng.integers(0, 255, (480, 640, 3), dtype=np.uint8) for _ in range(4)]
+        report = verify(weights, OnnxYoloModel(onnx_path, args.threads), images, runs=args.runs)
+        for entry in report["images"]:
+            print(f"image {entry['image']}: torch {entry['torch_detections']}, onnx {entry['onnx_detections']}, "
+                  f"matched {entry['matched']}")
+        print(f"mean latency: torch {report['latency_ms']['torch']} ms, onnx {report['latency_ms']['onnx']} ms")
+        mismatched = [entry for entry in report["images"]
+                      if entry["matched"] != entry["torch_detections"] or entry["onnx_detections"] != entry["torch_detections"]]
+        return 1 if mismatched else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
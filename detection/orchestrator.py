@@ -0,0 +1,210 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from detection.animal_detection import run_animal_inference
+from detection.ppe_detection import run_ppe_inference, run_ppe_inference_batch
+from detection.weapon_detection import run_weapon_inference
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Size of the shared detector thread pool (two HTTP calls + one local YOLO pass per image)
+DETECTOR_WORKERS = int(os.getenv("DETECTOR_WORKERS", "6"))
+
+# Size of the separate pool used by batched runs (videos, /detect/batch, the CLI), so their
+# queued per-frame calls never delay interactive requests
+BACKGROUND_DETECTOR_WORKERS = int(os.getenv("BACKGROUND_DETECTOR_WORKERS", "6"))
+
+# Default per-detector timeout in seconds
+DETECTOR_TIMEOUT = float(os.getenv("DETECTOR_TIMEOUT", "90"))
+
+# Detectors known to the orchestrator, by name
+DETECTORS = {
+    'animal': run_animal_inference,
+    'weapon': run_weapon_inference,
+    'ppe': run_ppe_inference
+}
+
+# Detectors that can process a list of images in one call
+BATCH_DETECTORS = {
+    'ppe': run_ppe_inference_batch
+}
+
+_executor = None
+_background_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    """Return the shared, bounded thread pool used to fan out detector calls."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=DETECTOR_WORKERS, thread_name_prefix="detector")
+        return _executor
+
+def get_background_executor():
+    """Return the bounded thread pool used by batched runs (run_detectors_batch)."""
+    global _background_executor
+    with _executor_lock:
+        if _background_executor is None:
+            _background_executor = ThreadPoolExecutor(max_workers=BACKGROUND_DETECTOR_WORKERS,
+                                                      thread_name_prefix="background-detector")
+        return _background_executor
+
+class _TimedCall:
+    """
+    A detector call submitted to the pool. Returns (result, wall time in seconds, exception
+    or None) and records when it was submitted and when a worker started it, so a deadline
+    can count either from submission or from the start of the call.
+    """
+
+    def __init__(self, func, *args, **kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.submitted = time.perf_counter()
+        self.start = None
+        self.started = threading.Event()
+
+    def __call__(self):
+        self.start = time.perf_counter()
+        self.started.set()
+        try:
+            return self.func(*self.args, **self.kwargs), time.perf_counter() - self.start, None
+        except Exception as e:
+            return None, time.perf_counter() - self.start, e
+
+def _submit(executor, func, *args, **kwargs):
+    """Submit a detector call. Returns (future, _TimedCall)."""
+    call = _TimedCall(func, *args, **kwargs)
+    return executor.submit(call), call
+
+def _collect(name, submitted, timeout, from_start=False):
+    """
+    Wait for a detector call until its deadline.
+    
+    Args:
+        name: Detector name, for messages
+        submitted: (future, _TimedCall) from _submit
+        timeout: Seconds until the deadline
+        from_start: Count the timeout from when a worker started the call instead of from
+            its submission. Only for pools whose queue is bounded by the caller's own work
+            (run_detectors_batch), where later calls wait behind earlier ones by design.
+    
+    Returns:
+        Tuple of (result or None, wall time in milliseconds, error message or None)
+    """
+    future, call = submitted
+    if from_start:
+        # Calls queued behind others (e.g. the per-frame HTTP calls of a batch) only start
+        # their clock when a worker picks them up
+        call.started.wait()
+        since = call.start
+    else:
+        since = call.submitted
+    try:
+        result, elapsed, exc = future.result(timeout=max(0.0, since + timeout - time.perf_counter()))
+    except FutureTimeoutError:
+        # A call still queued is dropped; a running worker thread cannot be interrupted, so
+        # its result is simply discarded
+        future.cancel()
+        elapsed_ms = round((time.perf_counter() - since) * 1000, 1)
+        logger.error(f"{name} detection timed out after {elapsed_ms} ms")
+        return None, elapsed_ms, f"{name} detection timed out"
+    if exc is not None:
+        logger.error(f"{name} detection failed: {exc}")
+        return None, round(elapsed * 1000, 1), str(exc)
+    return result, round(elapsed * 1000, 1), None
+
+def _record(entry, name, result, elapsed_ms, error):
+    """Store one detector outcome in a run_detectors style result entry."""
+    entry["timings"][name] = elapsed_ms
+    if result is None:
+        result = {"predictions": [], "error": error}
+    elif "error" in result:
+        error = result["error"]
+    if error is not None:
+        entry["errors"][name] = error
+    entry["results"][name] = result
+
+def run_detectors(image, settings, timeouts=None, options=None):
+    """
+    Run several detectors concurrently on the same image.
+    
+    Args:
+        image: Path to the image file, encoded image bytes or a BGR numpy array, passed to
+            every detector
+        settings: Dict mapping detector name ('animal', 'weapon', 'ppe') to a
+            (confidence, overlap) tuple
+        timeouts: Optional dict mapping detector name to a timeout in seconds, counted
+            from submission so time spent queued in a busy pool is included
+            (defaults to DETECTOR_TIMEOUT)
+        options: Optional dict mapping detector name to extra keyword arguments for it
+            (e.g. {'ppe': {'tiled': True}})
+    
+    Returns:
+        Dict with:
+            "results": detector name -> result in Roboflow API format. A detector that
+                failed or timed out gets an empty prediction list so callers can still
+                use the partial results of the others.
+            "errors": detector name -> error message, for failed detectors only
+            "timings": detector name -> wall time in milliseconds
+    """
+    timeouts = timeouts or {}
+    options = options or {}
+    executor = get_executor()
+
+    futures = {}
+    for name, (confidence, overlap) in settings.items():
+        futures[name] = _submit(executor, DETECTORS[name], image, confidence, overlap, **options.get(name, {}))
+
+    entry = {"results": {}, "errors": {}, "timings": {}}
+    for name, submitted in futures.items():
+        result, elapsed_ms, error = _collect(name, submitted, timeouts.get(name, DETECTOR_TIMEOUT))
+        _record(entry, name, result, elapsed_ms, error)
+    return entry
+
+def run_detectors_batch(images, settings, batch_size=None, timeouts=None):
+    """
+    Run several detectors on a list of images.
+    
+    Detectors with a batch implementation (PPE) get all images in one call, which is split
+    into model batches of batch_size. The per-image calls of the other (HTTP) detectors are
+    all submitted to the background pool at once, so they overlap with the batched pass
+    without queueing ahead of interactive run_detectors calls; each call's timeout counts
+    from when it starts running, not from when it was queued.
+    
+    Args:
+        images: List of image paths, encoded image bytes and/or BGR numpy arrays
+        settings: Dict mapping detector name to a (confidence, overlap) tuple
+        batch_size: Images per model call for batched detectors (defaults to PPE_BATCH_SIZE)
+        timeouts: Optional dict mapping detector name to a timeout in seconds
+    
+    Returns:
+        List with one run_detectors style dict per image. The timing of a batched detector
+        is the wall time of the whole batch call.
+    """
+    timeouts = timeouts or {}
+    executor = get_background_executor()
+
+    futures = {}
+    for name, (confidence, overlap) in settings.items():
+        if name in BATCH_DETECTORS:
+            futures[name] = _submit(executor, BATCH_DETECTORS[name], images, confidence, overlap, batch_size)
+        else:
+            futures[name] = [_submit(executor, DETECTORS[name], image, confidence, overlap) for image in images]
+
+    entries = [{"results": {}, "errors": {}, "timings": {}} for _ in images]
+    for name, submitted in futures.items():
+        timeout = timeouts.get(name, DETECTOR_TIMEOUT)
+        if name in BATCH_DETECTORS:
+            results, elapsed_ms, error = _collect(name, submitted, timeout, from_start=True)
+            for i, entry in enumerate(entries):
+                _record(entry, name, results[i] if results is not None else None, elapsed_ms, error)
+        else:
+            for entry, image_submitted in zip(entries, submitted):
+                _record(entry, name, *_collect(name, image_submitted, timeout, from_start=True))
+    return entries
@@ -0,0 +1,209 @@
+import logging
+import cv2
+import numpy as np
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Classes that different models use for the same thing, mapped to one shared name
+CLASS_ALIASES = {
+    'person': 'human'
+}
+
+def letterbox(image, new_shape=640, color=(114, 114, 114)):
+    """
+    Resize an image to fit new_shape keeping its aspect ratio and pad the rest, the way
+    ultralytics prepares inputs for a fixed-size model.
+
+    Args:
+        image: BGR numpy array
+        new_shape: Target size as an int or (height, width)
+        color: Padding colour
+
+    Returns:
+        Tuple of (padded image, scale ratio, (pad_x, pad_y))
+    """
+    if isinstance(new_shape, int):
+        new_shape = (new_shape, new_shape)
+    height, width = image.shape[:2]
+    ratio = min(new_shape[0] / height, new_shape[1] / width)
+    resized_w, resized_h = int(round(width * ratio)), int(round(height * ratio))
+    pad_x = (new_shape[1] - resized_w) / 2
+    pad_y = (new_shape[0] - resized_h) / 2
+
+    if (width, height) != (resized_w, resized_h):
+        image = cv2.resize(image, (resized_w, resized_h), interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(pad_y - 0.1)), int(round(pad_y + 0.1))
+    left, right = int(round(pad_x - 0.1)), int(round(pad_x + 0.1))
+    image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+    return image, ratio, (pad_x, pad_y)
+
+def to_input_tensor(images):
+    """
+    Stack letterboxed BGR images into a float32 NCHW RGB tensor scaled to 0-1.
+    """
+    batch = np.stack(images)[..., ::-1].transpose(0, 3, 1, 2)
+    return np.ascontiguousarray(batch, dtype=np.float32) / 255.0
+
+def nms(boxes, scores, iou_threshold, metric='iou'):
+    """
+    Greedy non-maximum suppression.
+
+    Args:
+        boxes: (N, 4) array of xyxy boxes
+        scores: (N,) array of scores
+        iou_threshold: Boxes overlapping a kept box by more than this are dropped
+        metric: 'iou' (intersection over union) or 'ios' (intersection over the smaller
+            box, which also catches a box cut off at a tile edge inside a complete one)
+
+    Returns:
+        Indices of the kept boxes, highest score first
+    """
+    boxes = np.asarray(boxes, dtype=np.float32)
+    order = np.argsort(-np.asarray(scores), kind='stable')
+    areas = (boxes[:, 2] - boxes[:, 0]).clip(0) * (boxes[:, 3] - boxes[:, 1]).clip(0)
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        x1 = np.maximum(boxes[i, 0], boxes[rest, 0])
+        y1 = np.maximum(boxes[i, 1], boxes[rest, 1])
+        x2 = np.minimum(boxes[i, 2], boxes[rest, 2])
+        y2 = np.minimum(boxes[i, 3], boxes[rest, 3])
+        inter = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+        if metric == 'ios':
+            iou = inter / np.maximum(np.minimum(areas[i], areas[rest]), 1e-9)
+        else:
+            iou = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+def iou_matrix(boxes_a, boxes_b):
+    """
+    Pairwise IoU of two sets of xyxy boxes as one broadcast NumPy operation.
+
+    Returns:
+        (N, M) array of IoU values
+    """
+    boxes_a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    inter = (bottom_right - top_left).clip(0).prod(axis=2)
+    area_a = (boxes_a[:, 2:] - boxes_a[:, :2]).clip(0).prod(axis=1)
+    area_b = (boxes_b[:, 2:] - boxes_b[:, :2]).clip(0).prod(axis=1)
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+def batched_nms(boxes, scores, class_ids, iou_threshold, metric='iou'):
+    """
+    Class-aware NMS: boxes only suppress boxes of the same class. All classes are handled
+    in one pass by offsetting each class's boxes by more than the extent of all boxes, so
+    boxes of different classes never overlap whatever the image size.
+
+    Returns:
+        Indices of the kept boxes, highest score first
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    if not len(boxes):
+        return np.empty(0, dtype=np.int64)
+    extent = float(boxes.max() - boxes.min()) + 1.0
+    offsets = np.asarray(class_ids, dtype=np.float32).reshape(-1, 1) * extent
+    return nms(boxes + offsets, scores, iou_threshold, metric)
+
+def center_to_xyxy(x, y, width, height):
+    """Convert Roboflow center-based geometry arrays into an (N, 4) xyxy array."""
+    x, y = np.asarray(x, dtype=np.float32), np.asarray(y, dtype=np.float32)
+    half_w, half_h = np.asarray(width, dtype=np.float32) / 2, np.asarray(height, dtype=np.float32) / 2
+    return np.stack([x - half_w, y - half_h, x + half_w, y + half_h], axis=1).reshape(-1, 4)
+
+def fuse_predictions(predictions, sources, iou_threshold=0.5, method='nms', class_aliases=None):
+    """
+    Remove cross-model duplicates from Roboflow-format predictions.
+
+    Two predictions are duplicates when they come from different sources (models), have
+    the same class after class_aliases is applied (e.g. PPE 'person' and animal 'human')
+    and overlap by more than iou_threshold. Of each group of duplicates the most confident
+    prediction is kept; with method 'fuse' its box becomes the confidence-weighted average
+    of the group. Boxes from the same model never suppress each other.
+
+    Args:
+        predictions: List of prediction dicts (x, y, width, height, confidence, class)
+        sources: Source name of each prediction
+        iou_threshold: IoU above which boxes are duplicates
+        method: 'nms' (keep the best box) or 'fuse' (average the group's boxes)
+        class_aliases: Dict mapping class names to a shared name (defaults to CLASS_ALIASES)
+
+    Returns:
+        The kept predictions, in their original order. Fused boxes are new dicts; the
+        caller's predictions are not modified.
+    """
+    predictions = list(predictions)
+    if len(predictions) < 2:
+        return predictions
+    class_aliases = CLASS_ALIASES if class_aliases is None else class_aliases
+
+    xyxy = center_to_xyxy(*([p.get(key, 0) for p in predictions] for key in ('x', 'y', 'width', 'height')))
+    scores = np.array([p.get('confidence', 0) for p in predictions], dtype=np.float32)
+    _, classes = np.unique([str(class_aliases.get(p.get('class'), p.get('class'))) for p in predictions],
+                           return_inverse=True)
+    _, source_ids = np.unique(np.asarray(sources, dtype=object).astype(str), return_inverse=True)
+
+    duplicate = ((iou_matrix(xyxy, xyxy) > iou_threshold)
+                 & (classes[:, None] == classes[None, :])
+                 & (source_ids[:, None] != source_ids[None, :]))
+
+    removed = np.zeros(len(predictions), dtype=bool)
+    kept = []
+    for i in np.argsort(-scores, kind='stable'):
+        if removed[i]:
+            continue
+        group = duplicate[i] & ~removed
+        removed |= group
+        removed[i] = True
+        kept.append(i)
+        if method == 'fuse' and group.any():
+            members = np.flatnonzero(group | (np.arange(len(predictions)) == i))
+            weights = scores[members][:, None]
+            x1, y1, x2, y2 = (xyxy[members] * weights).sum(axis=0) / max(float(weights.sum()), 1e-9)
+            predictions[i] = dict(predictions[i], x=float((x1 + x2) / 2), y=float((y1 + y2) / 2),
+                                  width=float(x2 - x1), height=float(y2 - y1))
+    return [predictions[i] for i in sorted(kept)]
+
+def decode_yolov8_output(output, confidence, iou_threshold, ratio, pad, image_shape, max_det=300):
+    """
+    Turn one raw YOLOv8 detection output into boxes in original image coordinates.
+
+    Args:
+        output: (4 + num_classes, N) array of center-xywh boxes followed by class scores
+        confidence: Minimum class score
+        iou_threshold: IoU threshold of the class-aware NMS
+        ratio: Letterbox scale ratio
+        pad: Letterbox (pad_x, pad_y)
+        image_shape: Shape of the original image
+        max_det: Maximum number of detections kept
+
+    Returns:
+        Tuple of (xyxy, confidence, class_id) arrays
+    """
+    predictions = np.asarray(output, dtype=np.float32).T
+    class_scores = predictions[:, 4:]
+    class_ids = class_scores.argmax(axis=1)
+    scores = class_scores[np.arange(len(class_ids)), class_ids]
+    mask = scores > confidence
+    if not mask.any():
+        return np.empty((0, 4), dtype=np.float32), np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+    boxes, scores, class_ids = predictions[mask, :4], scores[mask], class_ids[mask]
+
+    xyxy = np.empty_like(boxes)
+    xyxy[:, :2] = boxes[:, :2] - boxes[:, 2:] / 2
+    xyxy[:, 2:] = boxes[:, :2] + boxes[:, 2:] / 2
+
+    keep = batched_nms(xyxy, scores, class_ids, iou_threshold)[:max_det]
+    xyxy, scores, class_ids = xyxy[keep], scores[keep], class_ids[keep]
+
+    # Undo the letterbox
+    xyxy[:, [0, 2]] = ((xyxy[:, [0, 2]] - pad[0]) / ratio).clip(0, image_shape[1])
+    xyxy[:, [1, 3]] = ((xyxy[:, [1, 3]] - pad[1]) / ratio).clip(0, image_shape[0])
+    return xyxy, scores, class_ids
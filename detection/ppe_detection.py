@@ -1,9 +1,15 @@
 import os
+import time
 import logging
-import cv2
+import argparse
 import numpy as np
 import sys
-from pathlib import Path
+from utils.image_utils import describe_image, as_shared_image, load_image
+from utils.result_cache import cached_detector, cached_batch_detector
+from detection.model_registry import model_registry
+from detection.process_pool import get_ppe_pool
+from detection.tiling import predict_tiled_columns
+from detection.yolo_utils import yolo_result_to_columns, boxes_to_columns, iter_predictions
 
 # Setup logging with more details
 logging.basicConfig(
@@ -12,15 +18,6 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Path to the PPE model - search in multiple locations
-SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-PPE_MODEL_PATHS = [
-    os.path.join(SCRIPT_DIR, "models", "ppe.pt"),          # In a models subdirectory
-    os.path.join(SCRIPT_DIR, "ppe.pt"),                    # In the root directory
-    os.path.join(SCRIPT_DIR, "weights", "ppe.pt"),         # In a weights subdirectory
-    os.path.join(SCRIPT_DIR, "static", "models", "ppe.pt") # In a static/models subdirectory
-]
-
 # PPE class mapping
 PPE_CLASS_MAP = {
     'boots': 'boots',
@@ -30,116 +27,112 @@ PPE_CLASS_MAP = {
     'vest': 'vest'
 }
 
-# Load the model once when module is imported
+# Default number of images per model call in run_ppe_inference_batch
+PPE_BATCH_SIZE = int(os.getenv("PPE_BATCH_SIZE", "8"))
+
+# The loaded model, kept in sync with the model registry by load_ppe_model()
 ppe_model = None
 model_loaded_properly = False
 
+# Identifies the loaded weights (path and modification time) in detection cache keys
+ppe_model_tag = None
+
+# The ultralytics predictor keeps per-call state, so concurrent predict() calls on the
+# shared model (e.g. from the video pipeline workers) must be serialized
+ppe_predict_lock = model_registry.predict_lock('ppe')
+
 def find_ppe_model():
-    """Search for the PPE model in various directories"""
-    for model_path in PPE_MODEL_PATHS:
-        if os.path.exists(model_path):
-            logger.info(f"Found PPE model at: {model_path}")
-            return model_path
-    
-    # If we didn't find it in predefined locations, do a broader search
-    logger.warning("PPE model not found in expected locations, searching directory tree...")
-    for root, dirs, files in os.walk(SCRIPT_DIR):
-        if "ppe.pt" in files:
-            model_path = os.path.join(root, "ppe.pt")
-            logger.info(f"Found PPE model at: {model_path}")
-            return model_path
-    
-    return None
+    """Return the path of the PPE weights from the configured locations, or None."""
+    model_path = model_registry.resolve_path('ppe')
+    if model_path:
+        logger.info(f"Found PPE model at: {model_path}")
+    return model_path
 
 def load_ppe_model():
-    """Load the PPE YOLOv8 model"""
-    global ppe_model, model_loaded_properly
+    """Load the PPE YOLOv8 model through the model registry (once per process)"""
+    global ppe_model, model_loaded_properly, ppe_model_tag
     
     if model_loaded_properly and ppe_model is not None:
         return True
     
-    # Find the model file
-    model_path = find_ppe_model()
-    if not model_path:
-        logger.error("PPE model file 'ppe.pt' not found in any location.")
-        return False
-    
-    try:
-        # Try to import ultralytics for YOLOv8
-        from ultralytics import YOLO
-        logger.info(f"Loading YOLOv8 model from {model_path}")
-        ppe_model = YOLO(model_path)
-        logger.info(f"PPE model loaded successfully using YOLOv8")
-        model_loaded_properly = True
-        return True
-    except ImportError:
-        logger.error("Failed to import ultralytics. Please install with: pip install ultralytics")
-        return False
-    except Exception as e:
-        logger.error(f"Failed to load YOLOv8 model: {str(e)}")
+    entry = model_registry.get('ppe')
+    if entry is None:
+        logger.error("PPE model file 'ppe.pt' could not be loaded from any configured location.")
         return False
+    ppe_model = entry.model
+    ppe_model_tag = entry.tag
+    model_loaded_properly = True
+    logger.info(f"PPE model loaded successfully using YOLOv8")
+    return True
 
-# Try to load the model at module initialization
-load_ppe_model()
+def get_ppe_model_tag():
+    """Model identifier used in detection cache keys."""
+    pool = get_ppe_pool()
+    if pool is not None:
+        return pool.tag or "not-loaded"
+    return ppe_model_tag or "not-loaded"
 
-def read_image_safely(image_path):
+def convert_yolo_result(result, columnar=False):
     """
-    Read an image file safely, handling different formats including JPEG.
+    Convert a single YOLOv8 result into Roboflow API format predictions.
     
     Args:
-        image_path: Path to the image file
+        result: ultralytics Results object for one image
+        columnar: If True, return the compact columnar form (arrays of x, y, width, height,
+            confidence, class_id plus a class_names lookup) instead of a list of dicts
     
     Returns:
-        Tuple of (image_array, width, height) or (None, None, None) if failed
+        List of prediction dicts (x, y, width, height, confidence, class), or the columnar
+        dict when columnar is True
     """
-    # First try standard OpenCV approach
-    image = cv2.imread(image_path)
-    if image is not None:
-        return image, image.shape[1], image.shape[0]
-    
-    # If that fails, try alternative approaches
     try:
-        # Check if PIL is available
-        try:
-            from PIL import Image
-            img = Image.open(image_path)
-            img_array = np.array(img)
-            # Convert RGB to BGR (OpenCV format)
-            if len(img_array.shape) == 3 and img_array.shape[2] == 3:
-                img_array = img_array[:, :, ::-1]
-            return img_array, img.width, img.height
-        except ImportError:
-            logger.warning("PIL not available for fallback image reading")
-        
-        # Try reading with OpenCV's imdecode
-        with open(image_path, 'rb') as f:
-            img_array = np.asarray(bytearray(f.read()), dtype=np.uint8)
-            img = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
-            if img is not None:
-                return img, img.shape[1], img.shape[0]
-    
+        columns = yolo_result_to_columns(result, PPE_CLASS_MAP)
     except Exception as e:
-        logger.error(f"All image reading methods failed: {str(e)}")
-    
-    return None, None, None
+        logger.error(f"Error processing prediction results: {str(e)}")
+        columns = boxes_to_columns(np.empty((0, 4)), np.empty(0), np.empty(0), [])
+    logger.debug(f"Processed {len(columns['class_id'])} PPE detections")
+    if columnar:
+        return columns
+    return list(iter_predictions(columns))
 
-def run_ppe_inference(image_path, confidence, overlap):
+@cached_detector('ppe', get_ppe_model_tag)
+def run_ppe_inference(image, confidence, overlap, columnar=False, tiled=False):
     """
     Run inference for PPE detection using the YOLOv8 model.
     
     Args:
-        image_path: Path to the image file
+        image: SharedImage, path to the image file, encoded image bytes or an in-memory
+            BGR numpy array (e.g. a video frame)
         confidence: Confidence threshold (0-1)
         overlap: Overlap threshold (0-1)
+        columnar: If True, the detections are returned under "columns" in the compact
+            columnar form of convert_yolo_result instead of under "predictions"
+        tiled: If True, run the model on overlapping tiles (TILE_SIZE, TILE_OVERLAP) in one
+            batch and merge them, which finds small objects in high-resolution images
     
     Returns:
         JSON response with detection results in the same format as Roboflow API
     """
     try:
-        # Get image dimensions using the safe reading function
-        image, width, height = read_image_safely(image_path)
+        # Get image dimensions; the shared image is decoded at most once per request
+        image_source = image
+        image = as_shared_image(image_source).pixels
         if image is None:
-            raise ValueError(f"Could not read image at {image_path}")
+            raise ValueError(f"Could not read image {describe_image(image_source)}")
+        height, width = image.shape[:2]
+
+        # With PPE_WORKER_PROCESSES the model runs in the worker processes, not here; without
+        # weights the workers could not start, so the not-loaded result below is returned
+        pool = get_ppe_pool()
+        if pool is not None and not tiled and model_registry.resolve_path('ppe'):
+            logger.info(f"Running PPE inference on {describe_image(image)} in the worker pool")
+            columns = pool.predict([image], confidence, overlap)[0]
+            return {
+                "columns" if columnar else "predictions": columns if columnar else list(iter_predictions(columns)),
+                "image": {"width": width, "height": height},
+                "model": "ppe-detection-model-yolov8",
+                "version": "1.0"
+            }
         
         # Check if model is loaded and attempt to reload if not
         if not model_loaded_properly or ppe_model is None:
@@ -155,15 +148,27 @@ def run_ppe_inference(image_path, confidence, overlap):
                 }
 
         # Run inference with YOLOv8
-        logger.info(f"Running PPE inference on {image_path}")
+        logger.info(f"Running PPE inference on {describe_image(image)}")
         try:
-            # YOLOv8 uses a different method signature than YOLOv5
-            results = ppe_model.predict(
-                source=image_path,
-                conf=confidence,
-                iou=overlap,
-                verbose=False
-            )
+            if tiled:
+                columns = predict_tiled_columns(ppe_model, image, confidence, overlap, PPE_CLASS_MAP,
+                                                lock=ppe_predict_lock)
+                predictions = columns if columnar else list(iter_predictions(columns))
+                return {
+                    "columns" if columnar else "predictions": predictions,
+                    "image": {"width": width, "height": height},
+                    "model": "ppe-detection-model-yolov8",
+                    "version": "1.0"
+                }
+            # YOLOv8 uses a different method signature than YOLOv5.
+            # The already decoded array is passed so the image is not read twice.
+            with ppe_predict_lock:
+                results = ppe_model.predict(
+                    source=image,
+                    conf=confidence,
+                    iou=overlap,
+                    verbose=False
+                )
             result = results[0]  # Get the first result
             logger.info(f"PPE inference completed")
         except Exception as e:
@@ -178,53 +183,10 @@ def run_ppe_inference(image_path, confidence, overlap):
             }
         
         # Convert YOLOv8 results to Roboflow API format
-        predictions = []
-        try:
-            # Extract detection boxes
-            if hasattr(result, 'boxes') and len(result.boxes) > 0:
-                boxes = result.boxes.cpu().numpy()
-                
-                for box in boxes:
-                    # Get box coordinates
-                    x1, y1, x2, y2 = box.xyxy[0]  # Get box in (top, left, bottom, right) format
-                    conf = box.conf[0]  # Confidence score
-                    cls_id = int(box.cls[0])  # Class ID
-
-                    # Map class ID to name
-                    if hasattr(result, 'names') and cls_id in result.names:
-                        class_name = result.names[cls_id]
-                    else:
-                        class_name = f"class_{cls_id}"
-                    
-                    # Apply the class mapping if available
-                    if class_name in PPE_CLASS_MAP:
-                        class_name = PPE_CLASS_MAP[class_name]
-                    
-                    # Calculate center point, width and height (Roboflow format)
-                    x = (x1 + x2) / 2
-                    y = (y1 + y2) / 2
-                    w = x2 - x1
-                    h = y2 - y1
-                    
-                    predictions.append({
-                        "x": float(x),
-                        "y": float(y),
-                        "width": float(w),
-                        "height": float(h),
-                        "confidence": float(conf),
-                        "class": class_name
-                    })
-                    
-                logger.info(f"Processed {len(predictions)} PPE detections")
-            else:
-                logger.info("No PPE detections found")
-                
-        except Exception as e:
-            logger.error(f"Error processing prediction results: {str(e)}")
-            # Continue with any predictions we were able to process
+        predictions = convert_yolo_result(result, columnar)
         
         return {
-            "predictions": predictions,
+            "columns" if columnar else "predictions": predictions,
             "image": {
                 "width": width,
                 "height": height
@@ -253,3 +215,166 @@ def run_ppe_inference(image_path, confidence, overlap):
             "error": str(e),
             "message": "Error occurred during PPE detection."
         }
+
+@cached_batch_detector('ppe', get_ppe_model_tag)
+def run_ppe_inference_batch(images, confidence, overlap, batch_size=None, columnar=False):
+    """
+    Run PPE detection on several images, passing them through the YOLOv8 model in
+    fixed-size batches instead of one predict() call per image.
+    
+    Args:
+        images: List of SharedImages, image paths, encoded image bytes and/or BGR numpy arrays
+        confidence: Confidence threshold (0-1)
+        overlap: Overlap threshold (0-1)
+        batch_size: Number of images per model call (defaults to PPE_BATCH_SIZE)
+        columnar: If True, detections are returned in the compact columnar form
+    
+    Returns:
+        List with one result per input image, in the same format as run_ppe_inference
+    """
+    batch_size = max(1, int(batch_size or PPE_BATCH_SIZE))
+    results = [None] * len(images)
+
+    # Decode any paths up front; an unreadable image only fails its own entry
+    decoded = []
+    for i, image in enumerate(images):
+        try:
+            array = as_shared_image(image).pixels
+            reason = None
+        except Exception as e:
+            array = None
+            reason = str(e)
+        if array is None:
+            logger.error(f"Could not read image {describe_image(image)}: {reason or 'not a decodable image'}")
+            results[i] = {
+                "predictions": [],
+                "image": {"width": 0, "height": 0},
+                "model": "ppe-detection-model",
+                "version": "error",
+                "error": f"Could not read image {describe_image(image)}",
+                "message": "Error occurred during PPE detection."
+            }
+        else:
+            decoded.append((i, array))
+
+    # With PPE_WORKER_PROCESSES every image goes to a worker process; the workers run in parallel
+    pool = get_ppe_pool()
+    if pool is not None and decoded and model_registry.resolve_path('ppe'):
+        logger.info(f"Running PPE inference on {len(decoded)} images in the worker pool")
+        # Entries the pool leaves as None without raising (a failed worker) get this message
+        error = "no result from the worker pool"
+        try:
+            outputs = pool.predict([array for _, array in decoded], confidence, overlap)
+        except Exception as e:
+            logger.error(f"Error during pooled inference: {str(e)}")
+            outputs = [None] * len(decoded)
+            error = str(e)
+        for (i, array), columns in zip(decoded, outputs):
+            if columns is None:
+                results[i] = {
+                    "predictions": [],
+                    "image": {"width": array.shape[1], "height": array.shape[0]},
+                    "model": "ppe-detection-model",
+                    "version": "error",
+                    "message": f"Error during inference: {error}"
+                }
+                continue
+            results[i] = {
+                "columns" if columnar else "predictions": columns if columnar else list(iter_predictions(columns)),
+                "image": {"width": array.shape[1], "height": array.shape[0]},
+                "model": "ppe-detection-model-yolov8",
+                "version": "1.0"
+            }
+        return results
+
+    # Check if model is loaded and attempt to reload if not
+    if decoded and (not model_loaded_properly or ppe_model is None):
+        logger.warning("PPE model not loaded properly, attempting to load now...")
+        if not load_ppe_model():
+            logger.error("Could not load PPE model. Please ensure 'ppe.pt' exists.")
+            for i, array in decoded:
+                results[i] = {
+                    "predictions": [],
+                    "image": {"width": array.shape[1], "height": array.shape[0]},
+                    "model": "ppe-detection-model",
+                    "version": "not-loaded",
+                    "message": "PPE model could not be loaded. Please ensure 'ppe.pt' exists in project directory."
+                }
+            return results
+
+    for start in range(0, len(decoded), batch_size):
+        chunk = decoded[start:start + batch_size]
+        logger.info(f"Running batched PPE inference on {len(chunk)} images")
+        try:
+            with ppe_predict_lock:
+                outputs = ppe_model.predict(
+                    source=[array for _, array in chunk],
+                    conf=confidence,
+                    iou=overlap,
+                    verbose=False
+                )
+        except Exception as e:
+            logger.error(f"Error during batched inference: {str(e)}")
+            for i, array in chunk:
+                results[i] = {
+                    "predictions": [],
+                    "image": {"width": array.shape[1], "height": array.shape[0]},
+                    "model": "ppe-detection-model",
+                    "version": "error",
+                    "message": f"Error during inference: {str(e)}"
+                }
+            continue
+
+        for (i, array), output in zip(chunk, outputs):
+            results[i] = {
+                "columns" if columnar else "predictions": convert_yolo_result(output, columnar),
+                "image": {
+                    "width": array.shape[1],
+                    "height": array.shape[0]
+                },
+                "model": "ppe-detection-model-yolov8",
+                "version": "1.0"
+            }
+
+    return results
+
+def _batch_throughput(model, frames, batch_size, confidence, overlap):
+    """Frames per second of predict() calls on batch_size frames at a time."""
+    start = time.perf_counter()
+    for first in range(0, len(frames), batch_size):
+        model.predict(source=frames[first:first + batch_size], conf=confidence, iou=overlap, verbose=False)
+    return len(frames) / (time.perf_counter() - start)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure PPE model throughput (frames/s) against batch size.")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 2, 4, 8, 16], help="Batch sizes to run")
+    parser.add_argument('--frames', type=int, default=64, help="Frames per run")
+    parser.add_argument('--images', nargs='*', default=[], help="Images to run (random 720p frames if omitted)")
+    parser.add_argument('--confidence', type=float, default=0.3)
+    parser.add_argument('--overlap', type=float, default=0.6)
+    args = parser.parse_args(argv)
+
+    images = [load_image(path) for path in args.images]
+    if any(image is None for image in images):
+        parser.error("Could not read all --images")
+    if not images:
+        rng = np.random.default_rng(0)
+        images = [rng.integers(0, 255, (720, 1280, 3), dtype=np.uint8) for _ in range(4)]
+    frames = [images[i % len(images)] for i in range(max(1, args.frames))]
+
+    # The model is called directly so the detection cache does not serve repeated frames
+    if not load_ppe_model():
+        parser.error("The PPE model could not be loaded")
+    logging.getLogger().setLevel(logging.WARNING)
+    ppe_model.predict(source=frames[:max(args.batch_sizes)], conf=args.confidence, iou=args.overlap, verbose=False)
+
+    baseline = None
+    for batch_size in args.batch_sizes:
+        throughput = _batch_throughput(ppe_model, frames, max(1, batch_size), args.confidence, args.overlap)
+        baseline = baseline or throughput
+        print(f"batch size {batch_size:3d}: {throughput:.2f} frames/s ({throughput / baseline:.2f}x batch size "
+              f"{args.batch_sizes[0]})")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
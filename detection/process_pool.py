@@ -0,0 +1,277 @@
+"""
+Process pool for CPU-bound local model inference.
+
+Each worker process loads the model once; images reach the workers through shared memory
+instead of being pickled, and only the small columnar detections are sent back.
+
+Benchmark threads against worker processes:
+    python -m detection.process_pool [--model ppe] [--workers 1 2 4] [--images a.jpg b.jpg]
+                                     [--requests 64] [--threads 1]
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import threading
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+from dotenv import load_dotenv
+from detection.model_registry import model_registry, model_tag
+
+# Load environment variables
+load_dotenv()
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Worker processes running the PPE model (0 runs it in the server process, the default)
+PPE_WORKER_PROCESSES = int(os.getenv("PPE_WORKER_PROCESSES", "0"))
+
+# Intra-op threads of each worker (torch / onnxruntime / OpenMP); workers x threads should not
+# exceed the number of cores
+PPE_WORKER_THREADS = int(os.getenv("PPE_WORKER_THREADS", "1"))
+
+# State of a worker process, set up once by _init_worker
+_worker_model = None
+_worker_class_map = None
+
+def _init_worker(name, threads, class_map):
+    """Initializer of a worker process: limit its threads and load the model."""
+    global _worker_model, _worker_class_map
+    threads = str(max(1, threads))
+    for variable in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "ONNX_INTRA_OP_THREADS"):
+        os.environ[variable] = threads
+    try:
+        import torch
+        torch.set_num_threads(int(threads))
+    except ImportError:
+        pass
+    import cv2
+    cv2.setNumThreads(int(threads))
+
+    entry = model_registry.get(name)
+    if entry is None:
+        raise RuntimeError(f"Worker could not load model '{name}'")
+    _worker_model = entry.model
+    _worker_class_map = class_map
+
+def _worker_predict(shm_name, shape, dtype, confidence, overlap):
+    """Run the worker's model on an image held in shared memory. Returns columnar detections."""
+    from detection.yolo_utils import yolo_result_to_columns
+    # Spawned workers share the parent's resource tracker, so attaching does not take
+    # ownership; the parent unlinks the block
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        image = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        results = _worker_model.predict(source=image, conf=confidence, iou=overlap, verbose=False)
+        columns = yolo_result_to_columns(results[0], _worker_class_map)
+        # Results keep a reference to the input; drop it so the block can be closed
+        del results, image
+        return columns
+    finally:
+        shm.close()
+
+def _worker_ready():
+    return os.getpid()
+
+class InferencePool:
+    """
+    A pool of worker processes, each holding its own copy of one local model.
+
+    predict() copies each image into a shared memory block, hands its name to a worker and
+    unlinks the block once the detections are back. Processes are started with the 'spawn'
+    method, so no torch or OpenMP state is inherited from the server process. If a worker
+    dies (e.g. it could not load the model), the call fails and the next one starts a new set
+    of workers.
+    """
+
+    def __init__(self, name='ppe', processes=PPE_WORKER_PROCESSES, threads=PPE_WORKER_THREADS, class_map=None):
+        """
+        Args:
+            name: Registry model name
+            processes: Number of worker processes
+            threads: Intra-op threads per worker
+            class_map: Optional dict applied to the model's class names
+        """
+        self.name = name
+        self.processes = max(1, processes)
+        self.threads = max(1, threads)
+        self.class_map = class_map
+        self._executor = None
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "images": 0, "total_s": 0.0}
+
+    @property
+    def tag(self):
+        """Identifies the weights the workers load, for detection cache keys."""
+        path = model_registry.resolve_path(self.name)
+        return model_tag(path, model_registry.runtime(self.name)) if path else None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(self.name, self.threads, self.class_map)
+                )
+            return self._executor
+
+    def _discard_executor(self, executor):
+        """Drop a broken executor so the next call creates a new one."""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def start(self):
+        """Start every worker and wait until each has loaded the model."""
+        start = time.perf_counter()
+        executor = self._get_executor()
+        try:
+            pids = {future.result() for future in [executor.submit(_worker_ready) for _ in range(self.processes)]}
+        except BrokenProcessPool:
+            self._discard_executor(executor)
+            raise
+        logger.info(f"Started {len(pids)} '{self.name}' worker processes in {time.perf_counter() - start:.2f}s")
+
+    def predict(self, images, confidence, overlap):
+        """
+        Run the model on a list of BGR arrays, spread over the workers.
+
+        Returns:
+            List with the columnar detections (yolo_utils.boxes_to_columns) of each image
+        """
+        executor = self._get_executor()
+        start = time.perf_counter()
+        blocks = []
+        try:
+            futures = []
+            for image in images:
+                image = np.ascontiguousarray(image)
+                shm = shared_memory.SharedMemory(create=True, size=max(1, image.nbytes))
+                blocks.append(shm)
+                np.ndarray(image.shape, dtype=image.dtype, buffer=shm.buf)[...] = image
+                futures.append(executor.submit(_worker_predict, shm.name, image.shape, image.dtype.str,
+                                               confidence, overlap))
+            results = [future.result() for future in futures]
+        except BrokenProcessPool:
+            logger.error(f"A '{self.name}' worker process died; the workers are restarted on the next call")
+            self._discard_executor(executor)
+            raise
+        finally:
+            for shm in blocks:
+                shm.close()
+                shm.unlink()
+        with self._lock:
+            self._stats["calls"] += 1
+            self._stats["images"] += len(images)
+            self._stats["total_s"] += time.perf_counter() - start
+        return results
+
+    def stats(self):
+        with self._lock:
+            return {
+                "model": self.name,
+                "processes": self.processes,
+                "threads_per_process": self.threads,
+                "started": self._executor is not None,
+                "calls": self._stats["calls"],
+                "images": self._stats["images"],
+                "avg_ms_per_image": round(1000 * self._stats["total_s"] / self._stats["images"], 1)
+                                    if self._stats["images"] else None
+            }
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+_ppe_pool = None
+_ppe_pool_lock = threading.Lock()
+
+def get_ppe_pool():
+    """The PPE worker pool, or None when PPE_WORKER_PROCESSES is 0."""
+    global _ppe_pool
+    if PPE_WORKER_PROCESSES <= 0:
+        return None
+    with _ppe_pool_lock:
+        if _ppe_pool is None:
+            from detection.ppe_detection import PPE_CLASS_MAP
+            _ppe_pool = InferencePool('ppe', PPE_WORKER_PROCESSES, PPE_WORKER_THREADS, PPE_CLASS_MAP)
+        return _ppe_pool
+
+def start_ppe_pool():
+    """Start the PPE workers at startup (when enabled and its weights exist)."""
+    pool = get_ppe_pool()
+    if pool is not None and model_registry.resolve_path('ppe'):
+        try:
+            pool.start()
+        except BrokenProcessPool as e:
+            logger.error(f"Could not start the PPE worker processes: {e}")
+
+def _thread_throughput(model, images, requests, workers, confidence, overlap):
+    """Images per second with requests served by threads sharing one in-process model."""
+    lock = threading.Lock()
+
+    def call(i):
+        with lock:
+            model.predict(source=images[i % len(images)], conf=confidence, iou=overlap, verbose=False)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        start = time.perf_counter()
+        list(executor.map(call, range(requests)))
+    return requests / (time.perf_counter() - start)
+
+def _pool_throughput(pool, images, requests, confidence, overlap):
+    """Images per second with concurrent requests served by a worker pool."""
+    pool.start()
+    with ThreadPoolExecutor(max_workers=pool.processes * 2) as executor:
+        start = time.perf_counter()
+        list(executor.map(lambda i: pool.predict([images[i % len(images)]], confidence, overlap), range(requests)))
+    return requests / (time.perf_counter() - start)
+
+def main(argv=None):
+    from utils.image_utils import load_image
+
+    parser = argparse.ArgumentParser(description="Compare threaded and multiprocess local model inference.")
+    parser.add_argument('--model', default='ppe', help="Registry model name")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help="Worker process counts to run")
+    parser.add_argument('--threads', type=int, default=PPE_WORKER_THREADS, help="Intra-op threads per worker")
+    parser.add_argument('--images', nargs='*', default=[], help="Images to run (random images if omitted)")
+    parser.add_argument('--requests', type=int, default=64, help="Single-image requests per run")
+    parser.add_argument('--confidence', type=float, default=0.3)
+    parser.add_argument('--overlap', type=float, default=0.6)
+    args = parser.parse_args(argv)
+
+    images = [load_image(path) for path in args.images]
+    if any(image is None for image in images):
+        parser.error("Could not read all --images")
+    if not images:
+        rng = np.random.default_rng(0)
+        images = [rng.integers(0, 255, (480, 640, 3), dtype=np.uint8) for _ in range(4)]
+
+    entry = model_registry.get(args.model)
+    if entry is None:
+        parser.error(f"Model '{args.model}' could not be loaded")
+    baseline = _thread_throughput(entry.model, images, args.requests, max(args.workers), args.confidence, args.overlap)
+    print(f"threads (shared model): {baseline:.2f} images/s")
+    for processes in args.workers:
+        pool = InferencePool(args.model, processes, args.threads)
+        try:
+            throughput = _pool_throughput(pool, images, args.requests, args.confidence, args.overlap)
+        finally:
+            pool.shutdown()
+        print(f"{processes} processes x {args.threads} threads: {throughput:.2f} images/s "
+              f"({throughput / baseline:.2f}x threads)")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+import os
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Connection pool size per host; should cover the detector thread pool
+ROBOFLOW_POOL_SIZE = int(os.getenv("ROBOFLOW_POOL_SIZE", "16"))
+
+# Request timeout in seconds (REQUEST_TIMEOUT is honoured for backward compatibility)
+ROBOFLOW_TIMEOUT = float(os.getenv("ROBOFLOW_TIMEOUT", os.getenv("REQUEST_TIMEOUT", "60")))
+
+# Retries on 429/5xx responses and connection errors, with exponential backoff
+ROBOFLOW_MAX_RETRIES = int(os.getenv("ROBOFLOW_MAX_RETRIES", "3"))
+ROBOFLOW_BACKOFF = float(os.getenv("ROBOFLOW_BACKOFF", "0.5"))
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Images are downscaled before upload so their longest side is at most this many pixels
+# (0 keeps the original); each model can override it, e.g. ANIMAL_UPLOAD_MAX_SIDE
+ROBOFLOW_UPLOAD_MAX_SIDE = int(os.getenv("ROBOFLOW_UPLOAD_MAX_SIDE", "0"))
+ROBOFLOW_UPLOAD_QUALITY = int(os.getenv("ROBOFLOW_UPLOAD_QUALITY", "90"))
+
+_session = None
+_fail_fast_session = None
+_session_lock = threading.Lock()
+
+def create_session(pool_size=ROBOFLOW_POOL_SIZE, max_retries=ROBOFLOW_MAX_RETRIES, backoff=ROBOFLOW_BACKOFF,
+                   fail_fast=False):
+    """
+    Create a requests session with a keep-alive connection pool and retry policy.
+    
+    Args:
+        pool_size: Maximum number of pooled connections per host
+        max_retries: Number of retries on 429/5xx responses and connection errors
+        backoff: Backoff factor in seconds (waits backoff, 2*backoff, 4*backoff, ...)
+        fail_fast: Do not retry connection errors and timeouts (only 429/5xx responses), so
+            a caller with a fallback sees them after a single attempt
+    
+    Returns:
+        A configured requests.Session
+    """
+    retry = Retry(
+        total=max_retries,
+        connect=0 if fail_fast else None,
+        read=0 if fail_fast else None,
+        backoff_factor=backoff,
+        status_forcelist=RETRY_STATUS_CODES,
+        # Inference calls are idempotent, so POST may be retried as well
+        allowed_methods=frozenset(['GET', 'POST']),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def get_session(fail_fast=False):
+    """
+    Return the process-wide pooled session shared by the Roboflow detectors.
+
+    Args:
+        fail_fast: Return the session that does not retry connection errors and timeouts
+    """
+    global _session, _fail_fast_session
+    with _session_lock:
+        if fail_fast:
+            if _fail_fast_session is None:
+                _fail_fast_session = create_session(fail_fast=True)
+            return _fail_fast_session
+        if _session is None:
+            _session = create_session()
+            logger.info(f"Created Roboflow HTTP session (pool size {ROBOFLOW_POOL_SIZE}, "
+                        f"{ROBOFLOW_MAX_RETRIES} retries, timeout {ROBOFLOW_TIMEOUT}s)")
+        return _session
+
+def post_image(endpoint, params, files, timeout=None, fail_fast=False):
+    """
+    POST an image to a Roboflow-style inference endpoint over the pooled session.
+    
+    Args:
+        endpoint: Model endpoint URL
+        params: Query parameters (api_key, confidence, overlap, ...)
+        files: requests-style files dict with the image
+        timeout: Timeout in seconds (defaults to ROBOFLOW_TIMEOUT)
+        fail_fast: Raise connection errors and timeouts after one attempt instead of
+            retrying them (e.g. when failing over to a local model)
+    
+    Returns:
+        The requests.Response, after any retries
+    """
+    return get_session(fail_fast).post(endpoint, params=params, files=files,
+                                       timeout=timeout if timeout is not None else ROBOFLOW_TIMEOUT)
+
+def upload_max_side(model_prefix):
+    """Configured upload max side for a model, e.g. ANIMAL_UPLOAD_MAX_SIDE, else ROBOFLOW_UPLOAD_MAX_SIDE."""
+    return int(os.getenv(f"{model_prefix}_UPLOAD_MAX_SIDE", str(ROBOFLOW_UPLOAD_MAX_SIDE)))
+
+def post_shared_image(endpoint, params, image, max_side=0, quality=ROBOFLOW_UPLOAD_QUALITY, timeout=None,
+                      fail_fast=False):
+    """
+    Upload a SharedImage to a Roboflow-style endpoint, downscaled to max_side, and return its
+    result in original image coordinates.
+    
+    Args:
+        endpoint: Model endpoint URL
+        params: Query parameters (api_key, confidence, overlap, ...)
+        image: SharedImage to upload
+        max_side: Maximum width/height of the uploaded image (0 sends the original)
+        quality: JPEG quality of a downscaled upload
+        timeout: Timeout in seconds (defaults to ROBOFLOW_TIMEOUT)
+        fail_fast: Do not retry connection errors and timeouts (see post_image)
+    
+    Returns:
+        The JSON result, with an "upload" entry reporting bytes_sent and original_bytes (None
+        for a decoded frame, which is not encoded just to report its size)
+    """
+    name, data, mime_type, scale = image.encode_for_upload(max_side, quality)
+    response = post_image(endpoint, params, {"file": (name, data, mime_type)}, timeout=timeout, fail_fast=fail_fast)
+    response.raise_for_status()
+    result = response.json()
+    if scale != 1.0:
+        rescale_result(result, 1.0 / scale, image.width, image.height)
+    result["upload"] = {
+        "bytes_sent": len(data),
+        "original_bytes": image.encoded_size,
+        "scale": round(scale, 4)
+    }
+    return result
+
+def rescale_result(result, factor, width, height):
+    """
+    Scale the boxes of a Roboflow-format result in place, e.g. from a downscaled upload back
+    to the original image, and set its image size to width x height.
+    """
+    for pred in result.get('predictions', []):
+        for field in ('x', 'y', 'width', 'height'):
+            if field in pred:
+                pred[field] = pred[field] * factor
+    result['image'] = {"width": width, "height": height}
+    return result
@@ -0,0 +1,189 @@
+"""
+Tiled (sliced) inference for high-resolution images.
+
+Benchmark against whole-image inference:
+    python -m detection.tiling --model ppe --images a.jpg b.jpg [--labels labels/] [--runs 3]
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import numpy as np
+from dotenv import load_dotenv
+from detection.postprocess import batched_nms, iou_matrix
+from detection.yolo_utils import build_class_table, boxes_to_columns
+
+# Load environment variables
+load_dotenv()
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Tile side in pixels and the fraction by which neighbouring tiles overlap
+TILE_SIZE = int(os.getenv("TILE_SIZE", "640"))
+TILE_OVERLAP = float(os.getenv("TILE_OVERLAP", "0.2"))
+
+# Also run the whole (downscaled) image, so objects larger than a tile are still found
+TILE_INCLUDE_FULL = os.getenv("TILE_INCLUDE_FULL", "true").lower() in ('1', 'true', 'yes', 'on')
+
+# Intersection-over-smaller threshold used to merge boxes across tile seams
+TILE_MERGE_THRESHOLD = float(os.getenv("TILE_MERGE_THRESHOLD", "0.6"))
+
+def tile_windows(width, height, tile_size=TILE_SIZE, overlap=TILE_OVERLAP):
+    """
+    Overlapping tile windows covering an image. The last row and column are aligned to the
+    image edge, so every tile is full-size unless the image is smaller than a tile.
+
+    Returns:
+        (N, 4) int array of x0, y0, x1, y1 windows
+    """
+    stride = max(1, int(tile_size * (1 - overlap)))
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size, stride))
+        return positions + [length - tile_size]
+
+    xs, ys = starts(width), starts(height)
+    return np.array([(x, y, min(x + tile_size, width), min(y + tile_size, height)) for y in ys for x in xs],
+                    dtype=np.int64)
+
+def predict_tiled(model, image, confidence, overlap, tile_size=TILE_SIZE, tile_overlap=TILE_OVERLAP,
+                  include_full=TILE_INCLUDE_FULL, merge_threshold=TILE_MERGE_THRESHOLD, lock=None):
+    """
+    Run a YOLO model on overlapping tiles of an image in one batched predict() call and
+    merge the detections in full-image coordinates.
+
+    Args:
+        model: ultralytics YOLO model (or a drop-in such as OnnxYoloModel)
+        image: BGR numpy array
+        confidence: Confidence threshold (0-1)
+        overlap: IoU threshold of the model's own NMS within each tile
+        tile_size: Tile side in pixels
+        tile_overlap: Fraction by which neighbouring tiles overlap
+        include_full: Also run the whole image
+        merge_threshold: Intersection-over-smaller above which same-class boxes from
+            different tiles are merged
+        lock: Optional lock held around predict()
+
+    Returns:
+        Tuple of (xyxy, confidence, class_id, names)
+    """
+    height, width = image.shape[:2]
+    windows = tile_windows(width, height, tile_size, tile_overlap)
+    sources = [image[y0:y1, x0:x1] for x0, y0, x1, y1 in windows]
+    offsets = [(x0, y0) for x0, y0, _, _ in windows]
+    if include_full and len(windows) > 1:
+        sources.append(image)
+        offsets.append((0, 0))
+
+    if lock is not None:
+        with lock:
+            results = model.predict(source=sources, conf=confidence, iou=overlap, verbose=False)
+    else:
+        results = model.predict(source=sources, conf=confidence, iou=overlap, verbose=False)
+
+    xyxy, conf, cls = [], [], []
+    names = {}
+    for result, (dx, dy) in zip(results, offsets):
+        names = getattr(result, 'names', None) or names
+        boxes = getattr(result, 'boxes', None)
+        if boxes is None or len(boxes) == 0:
+            continue
+        boxes = boxes.cpu().numpy()
+        xyxy.append(np.asarray(boxes.xyxy, dtype=np.float32) + np.array([dx, dy, dx, dy], dtype=np.float32))
+        conf.append(np.asarray(boxes.conf, dtype=np.float32))
+        cls.append(np.asarray(boxes.cls).astype(np.int64))
+    if not xyxy:
+        return np.empty((0, 4), dtype=np.float32), np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64), names
+
+    xyxy, conf, cls = np.concatenate(xyxy), np.concatenate(conf), np.concatenate(cls)
+    keep = batched_nms(xyxy, conf, cls, merge_threshold, metric='ios')
+    logger.debug(f"Tiled inference: {len(windows)} tiles, {len(conf)} raw boxes, {len(keep)} after merging")
+    return xyxy[keep], conf[keep], cls[keep], names
+
+def predict_tiled_columns(model, image, confidence, overlap, class_map=None, lock=None, **options):
+    """
+    Tiled inference returning the columnar prediction format of yolo_utils.boxes_to_columns.
+    """
+    xyxy, conf, cls, names = predict_tiled(model, image, confidence, overlap, lock=lock, **options)
+    return boxes_to_columns(xyxy, conf, cls, build_class_table(names, class_map))
+
+def _load_labels(label_path, width, height):
+    """Read a YOLO-format label file (class cx cy w h, normalized) into xyxy pixel boxes."""
+    if not os.path.exists(label_path):
+        return np.empty((0, 4)), np.empty(0, dtype=np.int64)
+    rows = np.loadtxt(label_path, ndmin=2)
+    if rows.size == 0:
+        return np.empty((0, 4)), np.empty(0, dtype=np.int64)
+    cx, cy, w, h = rows[:, 1] * width, rows[:, 2] * height, rows[:, 3] * width, rows[:, 4] * height
+    return np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1), rows[:, 0].astype(np.int64)
+
+def _recall(pred_xyxy, pred_cls, true_xyxy, true_cls, iou_threshold=0.5):
+    """Number of ground-truth boxes matched by a same-class prediction."""
+    if not len(true_xyxy) or not len(pred_xyxy):
+        return 0
+    iou = iou_matrix(true_xyxy, pred_xyxy) * (true_cls[:, None] == pred_cls[None, :])
+    return int((iou.max(axis=1) >= iou_threshold).sum())
+
+def main(argv=None):
+    from detection.model_registry import model_registry
+    from utils.image_utils import load_image
+
+    parser = argparse.ArgumentParser(description="Compare tiled and whole-image inference.")
+    parser.add_argument('--model', default='ppe', help="Registry model name")
+    parser.add_argument('--images', nargs='+', required=True, help="Images to run")
+    parser.add_argument('--labels', help="Directory of YOLO-format label files (<image stem>.txt) for recall")
+    parser.add_argument('--confidence', type=float, default=0.3)
+    parser.add_argument('--overlap', type=float, default=0.6)
+    parser.add_argument('--tile-size', type=int, default=TILE_SIZE)
+    parser.add_argument('--tile-overlap', type=float, default=TILE_OVERLAP)
+    parser.add_argument('--runs', type=int, default=3, help="Timed runs per image and mode")
+    args = parser.parse_args(argv)
+
+    entry = model_registry.get(args.model)
+    if entry is None:
+        parser.error(f"Model '{args.model}' could not be loaded")
+
+    totals = {"whole": {"found": 0, "matched": 0, "seconds": 0.0}, "tiled": {"found": 0, "matched": 0, "seconds": 0.0}}
+    ground_truth = 0
+    for path in args.images:
+        image = load_image(path)
+        if image is None:
+            parser.error(f"Could not read {path}")
+        modes = {
+            "whole": lambda: _whole(entry.model, image, args.confidence, args.overlap),
+            "tiled": lambda: predict_tiled(entry.model, image, args.confidence, args.overlap,
+                                           tile_size=args.tile_size, tile_overlap=args.tile_overlap)[:3]
+        }
+        if args.labels:
+            stem = os.path.splitext(os.path.basename(path))[0]
+            true_xyxy, true_cls = _load_labels(os.path.join(args.labels, f"{stem}.txt"), image.shape[1], image.shape[0])
+            ground_truth += len(true_xyxy)
+        for mode, run in modes.items():
+            run()
+            start = time.perf_counter()
+            for _ in range(args.runs):
+                xyxy, conf, cls = run()
+            totals[mode]["seconds"] += (time.perf_counter() - start) / args.runs
+            totals[mode]["found"] += len(conf)
+            if args.labels:
+                totals[mode]["matched"] += _recall(xyxy, cls, true_xyxy, true_cls)
+
+    for mode, total in totals.items():
+        line = f"{mode}: {total['found']} detections, {1000 * total['seconds'] / len(args.images):.1f} ms/image"
+        if args.labels:
+            line += f", recall {total['matched'] / max(ground_truth, 1):.3f} ({total['matched']}/{ground_truth})"
+        print(line)
+    return 0
+
+def _whole(model, image, confidence, overlap):
+    boxes = model.predict(source=image, conf=confidence, iou=overlap, verbose=False)[0].boxes.cpu().numpy()
+    return (np.asarray(boxes.xyxy, dtype=np.float32), np.asarray(boxes.conf, dtype=np.float32),
+            np.asarray(boxes.cls).astype(np.int64))
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,240 @@
+import os
+import logging
+import numpy as np
+from dotenv import load_dotenv
+from detection.postprocess import iou_matrix, center_to_xyxy
+
+# Load environment variables
+load_dotenv()
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Minimum IoU between a track's predicted box and a detection of the same class to match them
+TRACK_IOU_THRESHOLD = float(os.getenv("TRACK_IOU_THRESHOLD", "0.3"))
+
+# Seconds a track survives without a matching detection
+TRACK_MAX_AGE = float(os.getenv("TRACK_MAX_AGE", "1.0"))
+
+# Inferred frames in a row a track may miss before it can end; frames that were not inferred
+# (sampling, motion gate) never count against a track
+TRACK_MAX_MISSES = int(os.getenv("TRACK_MAX_MISSES", "1"))
+
+# Detections a track needs before it is reported (filters one-off false positives); a track
+# that matched on every inferred frame it was alive for is reported regardless, so sparse
+# sampling and the motion gate do not hide objects that were only inferred once or twice
+TRACK_MIN_HITS = int(os.getenv("TRACK_MIN_HITS", "2"))
+
+# Constant-velocity model over (cx, cy, w, h) and their velocities, one step per frame
+_F = np.eye(8)
+_F[:4, 4:] = np.eye(4)
+_H = np.eye(4, 8)
+
+# Noise is scaled by the box height, as in DeepSORT
+_STD_POSITION = 1.0 / 20
+_STD_VELOCITY = 1.0 / 160
+
+class Track:
+    """One tracked object: a Kalman filter over its box plus what it was seen as."""
+
+    def __init__(self, track_id, prediction, frame_index):
+        self.track_id = track_id
+        self.class_name = prediction.get('class')
+        self.prediction = dict(prediction)
+        box = np.array([prediction['x'], prediction['y'], prediction['width'], prediction['height']], dtype=np.float64)
+        self.mean = np.concatenate([box, np.zeros(4)])
+        h = max(box[3], 1.0)
+        std = np.array([2 * _STD_POSITION * h] * 4 + [10 * _STD_VELOCITY * h] * 4)
+        self.covariance = np.diag(std ** 2)
+        self.hits = 1
+        self.misses = 0
+        # Inferred frames the track was alive for, including the one that started it
+        self.inferences = 1
+        self.first_frame = frame_index
+        self.last_frame = frame_index
+        self.max_confidence = prediction.get('confidence', 0.0)
+
+    def predict(self):
+        """Advance the filter by one frame."""
+        h = max(self.mean[3], 1.0)
+        std = np.array([_STD_POSITION * h] * 4 + [_STD_VELOCITY * h] * 4)
+        self.mean = _F @ self.mean
+        self.covariance = _F @ self.covariance @ _F.T + np.diag(std ** 2)
+        # Keep the size positive if the velocity shrinks it past zero
+        self.mean[2:4] = np.maximum(self.mean[2:4], 1.0)
+
+    def update(self, prediction, frame_index):
+        """Correct the filter with a matched detection."""
+        h = max(self.mean[3], 1.0)
+        measurement_noise = np.diag((np.array([_STD_POSITION * h] * 4)) ** 2)
+        measurement = np.array([prediction['x'], prediction['y'], prediction['width'], prediction['height']])
+        innovation_cov = _H @ self.covariance @ _H.T + measurement_noise
+        gain = self.covariance @ _H.T @ np.linalg.inv(innovation_cov)
+        self.mean = self.mean + gain @ (measurement - _H @ self.mean)
+        self.covariance = (np.eye(8) - gain @ _H) @ self.covariance
+        self.prediction = dict(prediction)
+        self.hits += 1
+        self.misses = 0
+        self.last_frame = frame_index
+        self.max_confidence = max(self.max_confidence, prediction.get('confidence', 0.0))
+
+    def to_prediction(self):
+        """The track's current box in Roboflow format, tagged with its track id."""
+        pred = dict(self.prediction)
+        pred.update({
+            "x": float(self.mean[0]),
+            "y": float(self.mean[1]),
+            "width": float(self.mean[2]),
+            "height": float(self.mean[3]),
+            "track_id": self.track_id
+        })
+        return pred
+
+class IoUTracker:
+    """
+    Assign stable track ids to detections across video frames.
+
+    Every frame advances each track's Kalman filter. Detections of inferred frames are
+    matched to the predicted track boxes by IoU, then by center distance (same class only);
+    unmatched detections start new tracks. A track ends once it has missed more than
+    max_misses inferred frames in a row and has not been matched for max_age seconds, so
+    sparse sampling does not end tracks between inferences. Tracks that end before
+    reaching min_hits without having matched on every inferred frame they were alive for
+    are dropped. On frames that were not inferred the predicted boxes can
+    stand in for detections.
+
+    step() is stateful and must be called once per frame, in frame order.
+    """
+
+    def __init__(self, fps=30.0, iou_threshold=TRACK_IOU_THRESHOLD, max_age=TRACK_MAX_AGE, min_hits=TRACK_MIN_HITS,
+                 max_misses=TRACK_MAX_MISSES):
+        """
+        Args:
+            fps: Frame rate of the video, used for max_age and timestamps
+            iou_threshold: Minimum IoU to match a detection to a track
+            max_age: Seconds a track survives without a matching detection
+            min_hits: Detections needed before a track is reported, unless it matched on every
+                inferred frame it was alive for
+            max_misses: Inferred frames in a row a track may miss before it can end
+        """
+        self.fps = fps if fps and fps > 0 else 30.0
+        self.iou_threshold = iou_threshold
+        self.max_age_frames = max(1, int(round(max_age * self.fps)))
+        self.min_hits = min_hits
+        self.max_misses = max(0, max_misses)
+        self.frame_index = -1
+        self._next_id = 1
+        self._active = []
+        self._finished = []
+
+    def _confirmed(self, track):
+        """Whether a track is reported: it reached min_hits or never missed an inferred frame."""
+        return track.hits >= self.min_hits or track.hits == track.inferences
+
+    def _match(self, detections):
+        """
+        Greedy same-class matching, best IoU first. Pairs left over are then matched by
+        center distance (relative to the track's box diagonal), which keeps fast or small
+        objects on their track when frames between inferences are skipped.
+
+        Returns:
+            List of (track index, detection index)
+        """
+        if not self._active or not detections:
+            return []
+        track_state = np.array([t.mean[:4] for t in self._active])
+        det_state = np.array([[d[key] for key in ('x', 'y', 'width', 'height')] for d in detections], dtype=np.float64)
+        same_class = np.array([[t.class_name == d.get('class') for d in detections] for t in self._active])
+        iou = iou_matrix(center_to_xyxy(*track_state.T), center_to_xyxy(*det_state.T)) * same_class
+
+        distance = np.linalg.norm(track_state[:, None, :2] - det_state[None, :, :2], axis=2)
+        diagonal = np.maximum(np.linalg.norm(track_state[:, 2:4], axis=1), 1.0)[:, None]
+        closeness = np.where(same_class, 1.0 - distance / diagonal, 0.0)
+
+        pairs = []
+        used_tracks, used_dets = set(), set()
+        for score, threshold in ((iou, self.iou_threshold), (closeness, 1e-6)):
+            order = np.argsort(-score, axis=None)
+            for track_index, det_index in zip(*np.unravel_index(order, score.shape)):
+                if score[track_index, det_index] < threshold:
+                    break
+                if track_index in used_tracks or det_index in used_dets:
+                    continue
+                pairs.append((track_index, det_index))
+                used_tracks.add(track_index)
+                used_dets.add(det_index)
+        return pairs
+
+    def step(self, result=None):
+        """
+        Advance the tracker by one frame.
+
+        Args:
+            result: Detection result of the frame, or None if it was not inferred
+
+        Returns:
+            Detection result whose predictions carry a track_id: on inferred frames every
+            detection of the frame, otherwise the predicted boxes of the confirmed tracks
+        """
+        self.frame_index += 1
+        for track in self._active:
+            track.predict()
+
+        if result is not None:
+            detections = [p for p in result.get('predictions', []) if 'width' in p and 'height' in p]
+            pairs = self._match(detections)
+            matched_tracks = {track_index for track_index, _ in pairs}
+            matched_dets = set()
+            for track_index, det_index in pairs:
+                self._active[track_index].update(detections[det_index], self.frame_index)
+                matched_dets.add(det_index)
+            for track_index, track in enumerate(self._active):
+                track.inferences += 1
+                if track_index not in matched_tracks:
+                    track.misses += 1
+            for det_index, detection in enumerate(detections):
+                if det_index not in matched_dets:
+                    self._active.append(Track(self._next_id, detection, self.frame_index))
+                    self._next_id += 1
+
+        still_active = []
+        for track in self._active:
+            if track.misses <= self.max_misses or self.frame_index - track.last_frame <= self.max_age_frames:
+                still_active.append(track)
+            elif self._confirmed(track):
+                self._finished.append(track)
+        self._active = still_active
+
+        if result is not None:
+            # Inferred frame: every detection, as detected, with the id of its track
+            tracked = dict(result)
+            tracked['predictions'] = [dict(t.prediction, track_id=t.track_id)
+                                      for t in self._active if t.last_frame == self.frame_index]
+            return tracked
+        return {"predictions": [t.to_prediction() for t in self._active if self._confirmed(t)]}
+
+    def summary(self):
+        """
+        Per-clip track summary.
+
+        Returns:
+            Dict with unique_counts (confirmed tracks per class) and tracks, one entry per
+            confirmed track with its class and first/last seen timestamps in seconds
+        """
+        tracks = sorted((t for t in self._finished + self._active if self._confirmed(t)),
+                        key=lambda t: t.track_id)
+        unique_counts = {}
+        for track in tracks:
+            unique_counts[track.class_name] = unique_counts.get(track.class_name, 0) + 1
+        return {
+            "unique_counts": unique_counts,
+            "tracks": [{
+                "track_id": track.track_id,
+                "class": track.class_name,
+                "first_seen": round(track.first_frame / self.fps, 3),
+                "last_seen": round(track.last_frame / self.fps, 3),
+                "detections": track.hits,
+                "max_confidence": round(float(track.max_confidence), 3)
+            } for track in tracks]
+        }
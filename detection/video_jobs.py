@@ -0,0 +1,168 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from detection.video_processing import process_video
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Number of videos processed at the same time
+VIDEO_JOB_WORKERS = int(os.getenv("VIDEO_JOB_WORKERS", "2"))
+
+# Maximum number of videos waiting for a worker; further submissions are rejected
+VIDEO_JOB_QUEUE_LIMIT = int(os.getenv("VIDEO_JOB_QUEUE_LIMIT", "8"))
+
+# How long finished jobs are kept for status/result polling, in seconds
+VIDEO_JOB_RETENTION = float(os.getenv("VIDEO_JOB_RETENTION", "3600"))
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the job queue is at its depth limit."""
+
+class VideoJob:
+    """State and progress of one background video processing job."""
+
+    def __init__(self, video_path, output_folder, options, cleanup_input):
+        self.id = uuid.uuid4().hex
+        self.video_path = video_path
+        self.output_folder = output_folder
+        self.options = options
+        self.cleanup_input = cleanup_input
+        self.status = 'queued'
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.frames_done = 0
+        self.frames_total = 0
+        self.result_path = None
+        self.stats = {}
+        self.error = None
+
+    def update_progress(self, frames_done, frames_total):
+        """Progress callback passed to process_video."""
+        self.frames_done = frames_done
+        self.frames_total = max(frames_total, frames_done)
+
+    def to_dict(self):
+        """JSON-serializable status, including throughput and ETA while running."""
+        now = self.finished_at or time.time()
+        elapsed = now - self.started_at if self.started_at else 0.0
+        fps = self.frames_done / elapsed if elapsed > 0 else 0.0
+        remaining = max(self.frames_total - self.frames_done, 0)
+        info = {
+            "job_id": self.id,
+            "status": self.status,
+            "frames_done": self.frames_done,
+            "frames_total": self.frames_total,
+            "progress": round(self.frames_done / self.frames_total, 4) if self.frames_total else 0.0,
+            "fps": round(fps, 2),
+            "elapsed_seconds": round(elapsed, 1),
+            "eta_seconds": round(remaining / fps, 1) if self.status == 'running' and fps > 0 else None
+        }
+        if self.status == 'done':
+            info["stats"] = self.stats
+        if self.error:
+            info["error"] = self.error
+        return info
+
+class VideoJobManager:
+    """
+    Runs process_video in a bounded pool of background threads.
+    
+    At most max_workers videos are processed at once and at most queue_limit more may wait;
+    submit() raises QueueFullError beyond that instead of accepting unbounded work.
+    """
+
+    # Name of the kind of job, for messages and worker thread names
+    kind = "video"
+
+    def __init__(self, max_workers=VIDEO_JOB_WORKERS, queue_limit=VIDEO_JOB_QUEUE_LIMIT,
+                 retention=VIDEO_JOB_RETENTION):
+        self.max_workers = max(1, max_workers)
+        self.queue_limit = max(0, queue_limit)
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"{self.kind}-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _outstanding(self):
+        return sum(1 for job in self._jobs.values() if job.status in ('queued', 'running'))
+
+    def _prune(self):
+        """Forget finished jobs older than the retention period."""
+        cutoff = time.time() - self.retention
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished_at is not None and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def submit(self, video_path, output_folder, cleanup_input=False, **options):
+        """
+        Queue a video for processing.
+        
+        Args:
+            video_path: Path to the input video
+            output_folder: Folder where the processed video is written
+            cleanup_input: If True, the input video is deleted once the job finishes
+                (it is always deleted when processing fails)
+            **options: Keyword arguments passed on to process_video
+        
+        Returns:
+            The queued VideoJob
+        """
+        job = self._enqueue(VideoJob(video_path, output_folder, options, cleanup_input))
+        logger.info(f"Queued video job {job.id} for {video_path}")
+        return job
+
+    def _enqueue(self, job):
+        """
+        Register a job and hand it to a worker.
+
+        Raises:
+            QueueFullError: If the queue is at its depth limit
+        """
+        with self._lock:
+            self._prune()
+            if self._outstanding() >= self.max_workers + self.queue_limit:
+                raise QueueFullError(f"{self.kind.capitalize()} job queue is full, try again later")
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        """Return the job with the given id, or None."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        """Queue depth and worker counts."""
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {
+            "workers": self.max_workers,
+            "queue_limit": self.queue_limit,
+            "queued": statuses.count('queued'),
+            "running": statuses.count('running')
+        }
+
+    def _run(self, job):
+        job.status = 'running'
+        job.started_at = time.time()
+        try:
+            job.result_path = process_video(
+                job.video_path, job.output_folder,
+                progress_callback=job.update_progress, stats=job.stats, **job.options
+            )
+            if job.result_path is None:
+                raise RuntimeError("Video processing failed. Check server logs.")
+            job.status = 'done'
+        except Exception as e:
+            logger.error(f"Video job {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = 'failed'
+        finally:
+            job.finished_at = time.time()
+            if (job.cleanup_input or job.status == 'failed') and os.path.exists(job.video_path):
+                os.remove(job.video_path)
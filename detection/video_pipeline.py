@@ -0,0 +1,257 @@
+import os
+import queue
+import logging
+import threading
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Number of inference workers; each worker fans its frame out to the detector pool
+PIPELINE_WORKERS = int(os.getenv("VIDEO_PIPELINE_WORKERS", str(min(8, os.cpu_count() or 1))))
+
+# Capacity of each inter-stage queue (frames), which bounds memory and applies backpressure
+PIPELINE_QUEUE_SIZE = int(os.getenv("VIDEO_PIPELINE_QUEUE_SIZE", str(2 * PIPELINE_WORKERS)))
+
+# Frames decoded but not yet drawn, including those waiting to be put back in order; 0 means
+# two queues plus one batch per worker
+PIPELINE_MAX_IN_FLIGHT = int(os.getenv("VIDEO_PIPELINE_MAX_IN_FLIGHT", "0"))
+
+# Sentinel marking the end of a stage's stream
+_STOP = object()
+
+# How often blocked stages wake up to check whether the pipeline was aborted
+_POLL_INTERVAL = 0.1
+
+class VideoPipeline:
+    """
+    Staged streaming engine for video detection.
+    
+    Frames flow through four stages joined by bounded queues:
+        decode (1 thread) -> infer (N worker threads) -> draw (1 thread, in frame order)
+        -> encode (calling thread)
+    A full queue blocks the stage feeding it, so a slow stage throttles the decoder instead
+    of letting frames pile up in memory. Inference may finish out of order; the draw stage
+    re-sequences frames by index so the output video keeps the original order. The decoder
+    holds a slot for every frame until the draw stage takes it in order, so one slow frame
+    cannot make the reorder buffer grow without bound.
+    
+    The decoder may ask a sampler which frames to infer; frames that are skipped get their
+    detections from a carrier in the ordered draw stage. Each inference worker takes up to
+    batch_size frames that are already waiting, so batched models see several frames per call.
+    """
+
+    def __init__(self, infer_fn, draw_fn, num_workers=None, queue_size=None, sampler=None, carrier=None,
+                 batch_size=1, record_fn=None, max_in_flight=None):
+        """
+        Args:
+            infer_fn: Callable(list of frames) -> list of detection results in Roboflow API
+                format, one per frame
+            draw_fn: Callable(frame, detection_result) that draws on the frame in place, or None
+                to pass frames through undrawn
+            num_workers: Number of inference worker threads (defaults to PIPELINE_WORKERS)
+            queue_size: Capacity of each inter-stage queue (defaults to PIPELINE_QUEUE_SIZE)
+            sampler: Optional object with should_infer(index, frame), called in frame order
+                (e.g. a FrameSampler). Every frame is inferred if omitted.
+            carrier: Optional object with push(frame, result) and flush() that supplies
+                detections for frames that were not inferred (e.g. a DetectionCarrier).
+                Required when a sampler is given.
+            batch_size: Maximum number of frames passed to infer_fn at once
+            record_fn: Optional callable(detection_result) called once per frame, in frame
+                order, before it is drawn (e.g. DetectionExporter.write). An exception aborts
+                the pipeline and is raised from run().
+            max_in_flight: Maximum number of frames between the decoder and the ordered
+                draw stage (defaults to PIPELINE_MAX_IN_FLIGHT, or two queues plus one batch
+                per worker)
+        """
+        if sampler is not None and carrier is None:
+            raise ValueError("A carrier is required when frames are sampled")
+        self.infer_fn = infer_fn
+        self.draw_fn = draw_fn
+        self.record_fn = record_fn
+        self.sampler = sampler
+        self.carrier = carrier
+        self.num_workers = max(1, num_workers or PIPELINE_WORKERS)
+        self.batch_size = max(1, batch_size or 1)
+        self.queue_size = max(1, queue_size or PIPELINE_QUEUE_SIZE, self.batch_size)
+        self.max_in_flight = max(1, max_in_flight or PIPELINE_MAX_IN_FLIGHT
+                                 or 2 * self.queue_size + self.num_workers * self.batch_size)
+        self._in_flight = threading.Semaphore(self.max_in_flight)
+        self._abort = threading.Event()
+        self._error = None
+
+    def _put(self, q, item):
+        """Blocking put that gives up if the pipeline was aborted. Returns False on abort."""
+        while not self._abort.is_set():
+            try:
+                q.put(item, timeout=_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        """Blocking get that returns _STOP if the pipeline was aborted."""
+        while not self._abort.is_set():
+            try:
+                return q.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                continue
+        return _STOP
+
+    def _acquire_slot(self):
+        """Blocking acquire of an in-flight slot that gives up on abort. Returns False on abort."""
+        while not self._abort.is_set():
+            if self._in_flight.acquire(timeout=_POLL_INTERVAL):
+                return True
+        return False
+
+    def _decode(self, cap, infer_q):
+        """Decoder stage: read frames from the capture and tag them with their index."""
+        index = 0
+        try:
+            while cap.isOpened():
+                if not self._acquire_slot():
+                    return
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                infer = self.sampler is None or self.sampler.should_infer(index, frame)
+                if not self._put(infer_q, (index, frame, infer)):
+                    return
+                index += 1
+        except Exception as e:
+            logger.error(f"Error decoding frame {index}: {e}")
+        finally:
+            for _ in range(self.num_workers):
+                if not self._put(infer_q, _STOP):
+                    break
+
+    def _run_inference(self, frames):
+        """Run infer_fn on a list of frames, falling back to empty results on error."""
+        if not frames:
+            return []
+        try:
+            return self.infer_fn(frames)
+        except Exception as e:
+            logger.error(f"Error running inference on {len(frames)} frames: {e}")
+            return [{"predictions": []} for _ in frames]
+
+    def _infer(self, infer_q, result_q):
+        """Inference stage: run the detectors on batches of sampled frames."""
+        stopped = False
+        while not stopped:
+            item = self._get(infer_q)
+            if item is _STOP:
+                break
+            items = [item]
+            to_infer = 1 if item[2] else 0
+            # Take more frames that are already waiting, without blocking, to fill the batch
+            while to_infer < self.batch_size:
+                try:
+                    item = infer_q.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopped = True
+                    break
+                items.append(item)
+                to_infer += 1 if item[2] else 0
+
+            results = iter(self._run_inference([frame for _, frame, infer in items if infer]))
+            for index, frame, infer in items:
+                if not self._put(result_q, (index, frame, next(results) if infer else None)):
+                    return
+        self._put(result_q, _STOP)
+
+    def _emit(self, frames, encode_q):
+        """Draw (frame, result) pairs and hand them to the encoder. Returns False on abort."""
+        for frame, result in frames:
+            if self.record_fn is not None:
+                try:
+                    self.record_fn(result)
+                except Exception as e:
+                    logger.error(f"Could not record the detections of a frame: {e}")
+                    self._error = e
+                    self._abort.set()
+                    return False
+            if self.draw_fn is not None:
+                try:
+                    self.draw_fn(frame, result)
+                except Exception as e:
+                    logger.warning(f"Could not draw detections on a frame, writing original frame: {e}")
+            if not self._put(encode_q, frame):
+                return False
+        return True
+
+    def _draw(self, result_q, encode_q):
+        """Draw stage: restore frame order, fill in skipped frames and draw the detections."""
+        pending = {}
+        next_index = 0
+        stopped_workers = 0
+        try:
+            while stopped_workers < self.num_workers:
+                item = self._get(result_q)
+                if item is _STOP:
+                    if self._abort.is_set():
+                        return
+                    stopped_workers += 1
+                    continue
+                index, frame, result = item
+                pending[index] = (frame, result)
+                # Emit every frame that is now contiguous with what was already drawn
+                while next_index in pending:
+                    frame, result = pending.pop(next_index)
+                    next_index += 1
+                    self._in_flight.release()
+                    ready = self.carrier.push(frame, result) if self.carrier else [(frame, result)]
+                    if not self._emit(ready, encode_q):
+                        return
+            if self.carrier:
+                self._emit(self.carrier.flush(), encode_q)
+        finally:
+            self._put(encode_q, _STOP)
+
+    def run(self, cap, write_fn):
+        """
+        Stream every frame of an opened cv2.VideoCapture through the pipeline.
+        
+        Args:
+            cap: Opened cv2.VideoCapture
+            write_fn: Callable(frame) called for each processed frame, in order
+        
+        Returns:
+            Number of frames written
+        """
+        infer_q = queue.Queue(maxsize=self.queue_size)
+        result_q = queue.Queue(maxsize=self.queue_size)
+        encode_q = queue.Queue(maxsize=self.queue_size)
+
+        threads = [threading.Thread(target=self._decode, args=(cap, infer_q), name="video-decode", daemon=True)]
+        for i in range(self.num_workers):
+            threads.append(threading.Thread(target=self._infer, args=(infer_q, result_q),
+                                            name=f"video-infer-{i}", daemon=True))
+        threads.append(threading.Thread(target=self._draw, args=(result_q, encode_q), name="video-draw", daemon=True))
+        for thread in threads:
+            thread.start()
+
+        # Encoder stage runs on the calling thread
+        frame_count = 0
+        try:
+            while True:
+                frame = self._get(encode_q)
+                if frame is _STOP:
+                    break
+                write_fn(frame)
+                frame_count += 1
+                logger.info(f"Processed frame {frame_count}")
+        except Exception:
+            self._abort.set()
+            raise
+        finally:
+            for thread in threads:
+                thread.join()
+
+        if self._error is not None:
+            raise self._error
+        return frame_count
@@ -1,38 +1,181 @@
 import cv2
+import numpy as np
 import os
 import uuid
 import logging
-from detection.animal_detection import run_animal_inference
-from detection.ppe_detection import run_ppe_inference
-from detection.weapon_detection import run_weapon_inference
-from utils.detection_utils import combine_detection_results, draw_bounding_boxes
+from detection.orchestrator import run_detectors, run_detectors_batch
+from detection.ppe_detection import PPE_BATCH_SIZE
+from detection.video_pipeline import VideoPipeline
+from detection.frame_sampling import FrameSampler, DetectionCarrier
+from detection.tracking import IoUTracker
+from detection.detection_export import DetectionExporter, parse_export_formats
+from utils.detection_utils import combine_detection_results, draw_detections
+from utils.image_utils import as_shared_image
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def process_video_frame(frame, frame_path_for_inference, confidence=0.3, overlap=0.5):
+# Motion gate defaults: per-pixel intensity change that counts as motion, fraction of changed
+# pixels that makes a frame worth inferring, and the width frames are downscaled to first
+MOTION_THRESHOLD = int(os.getenv("MOTION_THRESHOLD", "25"))
+MOTION_MIN_AREA = float(os.getenv("MOTION_MIN_AREA", "0.002"))
+MOTION_DOWNSCALE_WIDTH = 160
+
+class MotionGate:
     """
-    Process a single video frame: run all three detections, combine results.
-    The frame itself is passed for drawing, while its path is used for inference APIs.
+    Cheap pre-filter that skips inference on frames where nothing moved.
+    
+    Wraps a frame sampler: a frame the sampler selects is only inferred if its downscaled,
+    blurred grayscale version differs enough from the last inferred frame. Comparing against
+    the last inferred frame (rather than the previous one) means slow changes still add up
+    and eventually trigger an inference. Skipped frames keep the previous detections.
+    """
+
+    def __init__(self, sampler, threshold=MOTION_THRESHOLD, min_area=MOTION_MIN_AREA,
+                 downscale_width=MOTION_DOWNSCALE_WIDTH, max_skip=None):
+        """
+        Args:
+            sampler: Object with should_infer(index, frame), e.g. a FrameSampler
+            threshold: Per-pixel intensity difference (0-255) counted as change
+            min_area: Fraction of changed pixels (0-1) above which the frame is inferred
+            downscale_width: Width frames are resized to before differencing
+            max_skip: Optional number of consecutive skipped frames after which a frame is
+                inferred anyway
+        """
+        if not 0 <= threshold <= 255:
+            raise ValueError("motion threshold must be between 0 and 255")
+        if not 0 <= min_area <= 1:
+            raise ValueError("motion min area must be between 0 and 1")
+        self.sampler = sampler
+        self.threshold = threshold
+        self.min_area = min_area
+        self.downscale_width = downscale_width
+        self.max_skip = max_skip
+        self.frames_inferred = 0
+        self.frames_skipped = 0
+        self._reference = None
+        self._skipped_in_a_row = 0
+
+    def _prepare(self, frame):
+        """Downscale, convert to grayscale and blur a frame for differencing."""
+        height, width = frame.shape[:2]
+        scale = self.downscale_width / float(width)
+        small = cv2.resize(frame, (self.downscale_width, max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def should_infer(self, index, frame):
+        """
+        Args:
+            index: Zero-based frame index
+            frame: Decoded BGR frame
+        
+        Returns:
+            True if the frame was selected by the sampler and shows significant change
+        """
+        if not self.sampler.should_infer(index, frame):
+            return False
+
+        current = self._prepare(frame)
+        if self._reference is not None and (self.max_skip is None or self._skipped_in_a_row < self.max_skip):
+            diff = cv2.absdiff(current, self._reference)
+            changed = np.count_nonzero(diff > self.threshold) / float(diff.size)
+            if changed < self.min_area:
+                self.frames_skipped += 1
+                self._skipped_in_a_row += 1
+                return False
+
+        self._reference = current
+        self._skipped_in_a_row = 0
+        self.frames_inferred += 1
+        return True
+
+def process_video_frame(frame, confidence=0.3, overlap=0.5):
+    """
+    Process a single video frame: run all three detections concurrently, combine results.
+    The frame is shared by every detector in memory, so it is hashed and JPEG-encoded once
+    and no temporary files are written.
     """
     try:
         # Run inferences
-        animal_result = run_animal_inference(frame_path_for_inference, confidence, overlap)
-        ppe_result = run_ppe_inference(frame_path_for_inference, confidence, overlap)
-        weapon_result = run_weapon_inference(frame_path_for_inference, confidence, overlap)
+        settings = {name: (confidence, overlap) for name in ('animal', 'ppe', 'weapon')}
+        results = run_detectors(as_shared_image(frame), settings)['results']
 
         # Combine results
-        combined_result = combine_detection_results(animal_result, ppe_result, weapon_result)
+        combined_result = combine_detection_results(results['animal'], results['ppe'], results['weapon'])
         return combined_result
     except Exception as e:
-        logger.error(f"Error processing frame {frame_path_for_inference}: {e}")
+        logger.error(f"Error processing frame: {e}")
         return {"predictions": []} # Return empty predictions on error
 
-def process_video(video_path, output_folder, confidence=0.3, overlap=0.5):
+def process_video_frames(frames, confidence=0.3, overlap=0.5, batch_size=None, models=None):
     """
-    Process a video: extract frames, run multi-model detection on each, and reassemble.
+    Process several video frames at once: PPE runs as one batched YOLOv8 pass while the
+    remote detectors are called concurrently for every frame.
+    
+    Args:
+        models: Detectors to run ('animal', 'ppe', 'weapon'); all three if omitted
+    
+    Returns:
+        List with one combined detection result per frame
     """
+    try:
+        settings = {name: (confidence, overlap) for name in models or ('animal', 'ppe', 'weapon')}
+        entries = run_detectors_batch([as_shared_image(frame) for frame in frames], settings, batch_size=batch_size)
+        return [
+            combine_detection_results(*(entry['results'].get(name, {"predictions": []})
+                                        for name in ('animal', 'ppe', 'weapon')))
+            for entry in entries
+        ]
+    except Exception as e:
+        logger.error(f"Error processing {len(frames)} frames: {e}")
+        return [{"predictions": []} for _ in frames] # Return empty predictions on error
+
+def process_video(video_path, output_folder, confidence=0.3, overlap=0.5, num_workers=None, batch_size=None,
+                  sampling='all', sample_every=1, target_fps=None, carry='hold',
+                  motion_gate=False, motion_threshold=MOTION_THRESHOLD, motion_min_area=MOTION_MIN_AREA,
+                  export=(), render=True, stats=None, progress_callback=None, models=None):
+    """
+    Process a video: decode frames, run multi-model detection on each, and reassemble.
+    Frames stay in memory from cv2.VideoCapture to cv2.VideoWriter and are streamed through
+    a VideoPipeline, so decoding, inference on several frames, drawing and encoding overlap.
+    
+    Args:
+        video_path: Path to the input video
+        output_folder: Folder where the processed video is written
+        confidence: Confidence threshold (0-1)
+        overlap: Overlap threshold (0-1)
+        num_workers: Number of concurrent inference workers (defaults to VIDEO_PIPELINE_WORKERS)
+        batch_size: Maximum number of frames per batched PPE model call (defaults to PPE_BATCH_SIZE)
+        sampling: Which frames to run the detectors on: 'all', 'nth', 'fps' or 'keyframes'
+        sample_every: Inference interval in frames for 'nth' sampling
+        target_fps: Inference frame rate for 'fps' sampling
+        carry: How frames that are not inferred get their boxes: 'hold' reuses the last
+            detections, 'interpolate' interpolates boxes between inferred frames, 'track'
+            uses the boxes predicted by the tracker
+        motion_gate: If True, frames without significant change since the last inferred
+            frame are not inferred and reuse the previous detections
+        motion_threshold: Per-pixel intensity difference (0-255) the motion gate counts as change
+        motion_min_area: Fraction of changed pixels (0-1) the motion gate needs to infer a frame
+        export: Sidecar formats the per-frame detections are streamed to while the video is
+            processed ('jsonl', 'npz', or a comma-separated string of them)
+        render: If False, no video is drawn or encoded; requires at least one export format
+        stats: Optional dict that is filled with frames_total, frames_inferred,
+            frames_skipped_motion, unique_counts (tracked objects per class), tracks
+            (first/last seen timestamps per track) and exports (path per format)
+        progress_callback: Optional callable(frames_done, frames_total) called after each
+            frame is written; frames_total is the container's (possibly approximate) frame count
+        models: Detectors to run on the frames ('animal', 'ppe', 'weapon'); all three if omitted
+    
+    Returns:
+        Path of the processed video (of the first export when render is False), or None if
+        the video could not be opened
+    """
+    export = parse_export_formats(export)
+    if not render and not export:
+        raise ValueError("Nothing to produce: enable rendering or choose an export format")
+
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
         logger.error(f"Error opening video file: {video_path}")
@@ -42,64 +185,70 @@ def process_video(video_path, output_folder, confidence=0.3, overlap=0.5):
     frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
     fps = cap.get(cv2.CAP_PROP_FPS)
 
-    # Define the codec and create VideoWriter object
-    output_filename = f"processed_{uuid.uuid4().hex}.mp4"
-    output_path = os.path.join(output_folder, output_filename)
-    # Ensure XVID is a safe bet, or use MP4V for .mp4
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v') 
-    out = cv2.VideoWriter(output_path, fourcc, fps, (frame_width, frame_height))
+    try:
+        sampler = FrameSampler(sampling, every_n=sample_every, target_fps=target_fps, video_fps=fps)
+        # Every frame goes through the tracker so detections get stable ids per object
+        tracker = IoUTracker(fps)
+        carrier = DetectionCarrier(carry, tracker=tracker)
+        gate = MotionGate(sampler, motion_threshold, motion_min_area) if motion_gate else None
+    except ValueError:
+        cap.release()
+        raise
 
-    temp_frame_folder = os.path.join(output_folder, "temp_frames")
-    os.makedirs(temp_frame_folder, exist_ok=True)
-    
-    frame_count = 0
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        frame_filename = f"frame_{frame_count:04d}.jpg"
-        temp_frame_path = os.path.join(temp_frame_folder, frame_filename)
-        
-        # Save frame temporarily to pass to inference functions
-        cv2.imwrite(temp_frame_path, frame)
+    output_stem = f"processed_{uuid.uuid4().hex}"
+    output_path = None
+    out = None
+    if render:
+        # Define the codec and create VideoWriter object
+        output_path = os.path.join(output_folder, f"{output_stem}.mp4")
+        # Ensure XVID is a safe bet, or use MP4V for .mp4
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v') 
+        out = cv2.VideoWriter(output_path, fourcc, fps, (frame_width, frame_height))
+    exporter = DetectionExporter(os.path.join(output_folder, output_stem), export, fps) if export else None
 
-        # Process the frame
-        detection_result = process_video_frame(frame, temp_frame_path, confidence, overlap)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    frames_written = 0
 
-        # Draw bounding boxes on the original frame (not the temp file)
-        # Create a unique path for the drawn frame to avoid conflicts if draw_bounding_boxes saves it
-        drawn_frame_output_path = os.path.join(temp_frame_folder, f"drawn_{frame_filename}")
-        draw_bounding_boxes(temp_frame_path, detection_result, drawn_frame_output_path, use_custom_colors=True)
-        
-        # Read the frame with drawn boxes to write to video
-        processed_frame_img = cv2.imread(drawn_frame_output_path)
-        if processed_frame_img is not None:
-            out.write(processed_frame_img)
-        else:
-            # If drawing failed, write original frame
+    def write_frame(frame):
+        nonlocal frames_written
+        if out is not None:
             out.write(frame)
-            logger.warning(f"Could not read drawn frame {drawn_frame_output_path}, writing original frame to video.")
-
-        # Clean up temporary frame files for this iteration
-        if os.path.exists(temp_frame_path):
-            os.remove(temp_frame_path)
-        if os.path.exists(drawn_frame_output_path):
-            os.remove(drawn_frame_output_path)
-            
-        frame_count += 1
-        logger.info(f"Processed frame {frame_count}")
-
-    cap.release()
-    out.release()
-    
-    # Clean up temp_frames folder
+        frames_written += 1
+        if progress_callback is not None:
+            progress_callback(frames_written, total_frames)
+
+    pipeline = VideoPipeline(
+        infer_fn=lambda frames: process_video_frames(frames, confidence, overlap, batch_size, models),
+        draw_fn=(lambda frame, result: draw_detections(frame, result, use_custom_colors=True)) if render else None,
+        num_workers=num_workers,
+        sampler=gate or sampler,
+        carrier=carrier,
+        batch_size=batch_size or PPE_BATCH_SIZE,
+        record_fn=exporter.write if exporter else None
+    )
     try:
-        for f in os.listdir(temp_frame_folder):
-            os.remove(os.path.join(temp_frame_folder, f))
-        os.rmdir(temp_frame_folder)
-    except Exception as e:
-        logger.error(f"Error cleaning up temp_frames folder: {e}")
+        frame_count = pipeline.run(cap, write_frame)
+    except Exception:
+        if exporter:
+            exporter.abort()
+        raise
+    finally:
+        cap.release()
+        if out is not None:
+            out.release()
+    exports = exporter.close() if exporter else {}
+
+    frames_inferred = gate.frames_inferred if gate else sampler.frames_inferred
+    frames_skipped_motion = gate.frames_skipped if gate else 0
+    if stats is not None:
+        stats['frames_total'] = frame_count
+        stats['frames_inferred'] = frames_inferred
+        stats['frames_skipped_motion'] = frames_skipped_motion
+        stats.update(tracker.summary())
+        stats['exports'] = exports
 
-    logger.info(f"Video processing complete. Output saved to: {output_path}")
+    if output_path is None:
+        output_path = exports[export[0]]
+    logger.info(f"Video processing complete. {frame_count} frames processed ({frames_inferred} inferred, "
+                f"{frames_skipped_motion} skipped without motion) to: {output_path}")
     return output_path
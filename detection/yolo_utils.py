@@ -0,0 +1,120 @@
+import logging
+import numpy as np
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Columns of the compact columnar prediction format, in Roboflow naming
+COLUMN_KEYS = ('x', 'y', 'width', 'height', 'confidence', 'class_id')
+
+# Class lookup tables, keyed by the model's names and the class mapping applied to them
+_class_table_cache = {}
+
+def build_class_table(names, class_map=None):
+    """
+    Build a class-id -> class-name lookup table for a YOLO model.
+    
+    Args:
+        names: The model's names dict ({class_id: name}) or list
+        class_map: Optional dict applied on top of the model names (e.g. PPE_CLASS_MAP)
+    
+    Returns:
+        Numpy object array indexed by class id. Ids missing from names map to "class_<id>".
+    """
+    if isinstance(names, (list, tuple)):
+        names = dict(enumerate(names))
+    names = names or {}
+    class_map = class_map or {}
+    key = (tuple(sorted(names.items())), tuple(sorted(class_map.items())))
+    table = _class_table_cache.get(key)
+    if table is None:
+        size = max(names.keys()) + 1 if names else 0
+        table = np.array([f"class_{i}" for i in range(size)], dtype=object)
+        for class_id, name in names.items():
+            table[class_id] = class_map.get(name, name)
+        _class_table_cache[key] = table
+    return table
+
+def boxes_to_columns(xyxy, conf, cls, class_table):
+    """
+    Convert YOLO box arrays into the compact columnar prediction format.
+    
+    Args:
+        xyxy: (N, 4) array of corner coordinates
+        conf: (N,) array of confidence scores
+        cls: (N,) array of class ids
+        class_table: Lookup table from build_class_table
+    
+    Returns:
+        Dict with float arrays x, y, width, height, confidence (center-based Roboflow
+        geometry), an int array class_id and the class_names lookup list
+    """
+    xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+    class_ids = np.asarray(cls).astype(np.int64).reshape(-1)
+    class_names = list(class_table)
+    if class_ids.size and class_ids.max() >= len(class_names):
+        class_names += [f"class_{i}" for i in range(len(class_names), int(class_ids.max()) + 1)]
+    return {
+        "x": (xyxy[:, 0] + xyxy[:, 2]) / 2,
+        "y": (xyxy[:, 1] + xyxy[:, 3]) / 2,
+        "width": xyxy[:, 2] - xyxy[:, 0],
+        "height": xyxy[:, 3] - xyxy[:, 1],
+        "confidence": np.asarray(conf, dtype=np.float32).reshape(-1),
+        "class_id": class_ids,
+        "class_names": class_names
+    }
+
+def iter_predictions(columns):
+    """
+    Lazily turn columnar predictions into Roboflow API format dicts.
+    
+    Args:
+        columns: Dict produced by boxes_to_columns
+    
+    Yields:
+        Prediction dicts (x, y, width, height, confidence, class)
+    """
+    class_names = columns["class_names"]
+    rows = zip(*(columns[key].tolist() for key in COLUMN_KEYS))
+    for x, y, w, h, conf, class_id in rows:
+        yield {
+            "x": x,
+            "y": y,
+            "width": w,
+            "height": h,
+            "confidence": conf,
+            "class": class_names[class_id]
+        }
+
+def yolo_result_to_columns(result, class_map=None):
+    """
+    Convert an ultralytics Results object into columnar predictions with whole-array
+    operations instead of a per-box loop.
+    
+    Args:
+        result: ultralytics Results object for one image
+        class_map: Optional dict applied to the model's class names
+    
+    Returns:
+        Dict in the format produced by boxes_to_columns
+    """
+    class_table = build_class_table(getattr(result, 'names', None), class_map)
+    boxes = getattr(result, 'boxes', None)
+    if boxes is None or len(boxes) == 0:
+        return boxes_to_columns(np.empty((0, 4)), np.empty(0), np.empty(0), class_table)
+    boxes = boxes.cpu().numpy()
+    return boxes_to_columns(boxes.xyxy, boxes.conf, boxes.cls, class_table)
+
+def yolo_result_to_predictions(result, class_map=None):
+    """
+    Convert an ultralytics Results object into a list of Roboflow API format predictions.
+    
+    Args:
+        result: ultralytics Results object for one image
+        class_map: Optional dict applied to the model's class names
+    
+    Returns:
+        List of prediction dicts (x, y, width, height, confidence, class)
+    """
+    return list(iter_predictions(yolo_result_to_columns(result, class_map)))
@@ -300,9 +300,60 @@ function runAnalysis() {
     }
 }
 
+// Draw the compact detections returned with render=false onto the uploaded image.
+// Resolves with a data URL of the annotated image.
+function renderDetections(file, detections) {
+    return new Promise((resolve, reject) => {
+        const url = URL.createObjectURL(file);
+        const img = new Image();
+        img.onload = () => {
+            const canvas = document.createElement('canvas');
+            canvas.width = img.naturalWidth;
+            canvas.height = img.naturalHeight;
+            const ctx = canvas.getContext('2d');
+            ctx.drawImage(img, 0, 0);
+            URL.revokeObjectURL(url);
+
+            // Boxes are in pixels of the image the server saw
+            const scale = detections.image[0] ? img.naturalWidth / detections.image[0] : 1;
+            const lineWidth = Math.max(2, Math.round(3 * scale));
+            const fontSize = Math.max(12, Math.round(18 * scale));
+            ctx.font = `bold ${fontSize}px sans-serif`;
+            ctx.textBaseline = 'top';
+
+            detections.boxes.forEach(([x1, y1, x2, y2, confidence, classIndex, colorIndex]) => {
+                const color = detections.colors[colorIndex];
+                const [left, top] = [x1 * scale, y1 * scale];
+                ctx.lineWidth = lineWidth;
+                ctx.strokeStyle = color;
+                ctx.strokeRect(left, top, (x2 - x1) * scale, (y2 - y1) * scale);
+
+                const label = `${detections.classes[classIndex].toUpperCase()}: ${confidence.toFixed(2)}`;
+                const padding = Math.round(fontSize / 4);
+                const labelWidth = ctx.measureText(label).width + 2 * padding;
+                const labelHeight = fontSize + 2 * padding;
+                const labelTop = top - labelHeight >= 0 ? top - labelHeight : top;
+                ctx.fillStyle = color;
+                ctx.fillRect(left, labelTop, labelWidth, labelHeight);
+                ctx.fillStyle = '#ffffff';
+                ctx.fillText(label, left + padding, labelTop + padding);
+            });
+            resolve(canvas.toDataURL('image/jpeg', 0.9));
+        };
+        img.onerror = () => {
+            URL.revokeObjectURL(url);
+            reject(new Error('Could not read the uploaded image'));
+        };
+        img.src = url;
+    });
+}
+
 function runImageAnalysis(endpoint) {
+    const file = imageInput.files[0];
     const formData = new FormData();
-    formData.append('image', imageInput.files[0]);
+    formData.append('image', file);
+    // The server only returns the boxes; they are drawn here
+    formData.append('render', 'false');
 
     showLoading(true, 'image');
     resultImageContainer.classList.add('hidden');
@@ -322,6 +373,12 @@ function runImageAnalysis(endpoint) {
             placeholderMessage.textContent = `Error: ${data.error}`;
             placeholderMessage.classList.remove('hidden');
             resultImageContainer.classList.add('hidden');
+        } else if (data.detections) {
+            return renderDetections(file, data.detections).then(src => {
+                detectionResult.src = src;
+                resultImageContainer.classList.remove('hidden');
+                placeholderMessage.classList.add('hidden');
+            });
         } else {
             detectionResult.src = data.detection_result + '?t=' + new Date().getTime(); // Cache buster
             resultImageContainer.classList.remove('hidden');
@@ -347,6 +404,7 @@ function runVideoAnalysis(endpoint) {
     resultVideoContainer.classList.add('hidden'); // Hide previous video result if any
     placeholderMessage.classList.add('hidden');
     resultLoadingOverlay.classList.remove('hidden'); // Show loading overlay for results area
+    setLoadingMessage('Uploading video...');
 
     fetch(endpoint, {
         method: 'POST',
@@ -354,30 +412,68 @@ function runVideoAnalysis(endpoint) {
     })
     .then(response => response.json())
     .then(data => {
-        showLoading(false, 'video');
-        resultLoadingOverlay.classList.add('hidden');
         if (data.error) {
-            alert(`Error: ${data.error}`);
-            placeholderMessage.textContent = `Error: ${data.error}`;
-            placeholderMessage.classList.remove('hidden');
-            resultVideoContainer.classList.add('hidden');
+            showVideoError(`Error: ${data.error}`);
         } else {
-            detectionResultVideo.src = data.detection_result_video + '?t=' + new Date().getTime(); // Cache buster
+            // The video is processed in the background; poll the job until it finishes
+            pollVideoJob(data.status_url);
+        }
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        showVideoError(`Request failed: ${error}`);
+    });
+}
+
+// Poll a background video job, showing its progress, until it is done or failed
+function pollVideoJob(statusUrl) {
+    fetch(statusUrl)
+    .then(response => response.json())
+    .then(job => {
+        if (job.status === 'done') {
+            showLoading(false, 'video');
+            setLoadingMessage('Processing...');
+            resultLoadingOverlay.classList.add('hidden');
+            detectionResultVideo.src = job.detection_result_video + '?t=' + new Date().getTime(); // Cache buster
             resultVideoContainer.classList.remove('hidden');
             placeholderMessage.classList.add('hidden');
+        } else if (job.status === 'failed' || job.error) {
+            showVideoError(`Error: ${job.error || 'Video processing failed.'}`);
+        } else {
+            if (job.status === 'queued') {
+                setLoadingMessage('Waiting in queue...');
+            } else {
+                const percent = Math.round((job.progress || 0) * 100);
+                const eta = job.eta_seconds !== null && job.eta_seconds !== undefined ? `, about ${Math.ceil(job.eta_seconds)}s left` : '';
+                setLoadingMessage(`Processing... ${percent}% (${job.frames_done}/${job.frames_total} frames${eta})`);
+            }
+            setTimeout(() => pollVideoJob(statusUrl), 1000);
         }
     })
     .catch(error => {
-        showLoading(false, 'video');
-        resultLoadingOverlay.classList.add('hidden');
-        alert(`Request failed: ${error}`);
         console.error('Error:', error);
-        placeholderMessage.textContent = `Request failed: ${error}`;
-        placeholderMessage.classList.remove('hidden');
-        resultVideoContainer.classList.add('hidden');
+        showVideoError(`Request failed: ${error}`);
     });
 }
 
+function showVideoError(message) {
+    showLoading(false, 'video');
+    setLoadingMessage('Processing...');
+    resultLoadingOverlay.classList.add('hidden');
+    alert(message);
+    placeholderMessage.textContent = message;
+    placeholderMessage.classList.remove('hidden');
+    resultVideoContainer.classList.add('hidden');
+}
+
+// Update the text shown in the results loading overlay
+function setLoadingMessage(message) {
+    const messageElement = resultLoadingOverlay.querySelector('p');
+    if (messageElement) {
+        messageElement.textContent = message;
+    }
+}
+
 // Show or hide loading indicators
 function showLoading(isLoading, type) {
     if (isLoading) {
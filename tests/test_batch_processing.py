@@ -0,0 +1,147 @@
+"""
+Tests of bulk image detection over directories and zip archives, with stub detectors.
+
+Run with: python -m pytest tests  (or python -m unittest discover tests)
+"""
+import io
+import os
+import time
+import shutil
+import zipfile
+import tempfile
+import unittest
+from unittest import mock
+import cv2
+import numpy as np
+import detection.batch_processing as batch_processing
+from detection.batch_processing import (iter_directory_images, iter_zip_images, count_zip_images,
+                                        count_directory_images, check_image_count, process_batch,
+                                        resolve_local_directory, write_manifest_csv)
+from detection.batch_jobs import BatchJobManager
+
+def jpeg(value):
+    return cv2.imencode('.jpg', np.full((24, 32, 3), value, dtype=np.uint8))[1].tobytes()
+
+def stub_detectors(images, settings, batch_size=None):
+    """Every readable image gets one 'bear' from the animal detector; PPE fails."""
+    return [{
+        "results": {
+            "animal": {"predictions": [{"x": 10, "y": 10, "width": 8, "height": 8, "confidence": 0.9,
+                                        "class": "bear"}]},
+            "ppe": {"predictions": [], "error": "model not loaded"},
+        },
+        "errors": {"ppe": "model not loaded"},
+        "timings": {}
+    } for _ in images]
+
+class BatchInputsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder, ignore_errors=True)
+
+    def write(self, relative, data):
+        path = os.path.join(self.folder, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    def test_directory_images_in_walk_order(self):
+        self.write('b.jpg', jpeg(1))
+        self.write('a/c.PNG', jpeg(2))
+        self.write('notes.txt', b'not an image')
+
+        # Files of a directory come before its subdirectories, each sorted by name
+        self.assertEqual([image.name for image in iter_directory_images(self.folder)], ['b.jpg', os.path.join('a', 'c.PNG')])
+        self.assertEqual(count_directory_images(self.folder), 2)
+
+    def test_zip_skips_metadata_and_oversized_members(self):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr('dcim/a.jpg', jpeg(1))
+            zf.writestr('__MACOSX/dcim/._a.jpg', b'resource fork')
+            zf.writestr('dcim/readme.txt', b'text')
+            zf.writestr('dcim/huge.jpg', b'\0' * 4096)
+        archive = buffer.getvalue()
+
+        self.assertEqual([image.name for image in iter_zip_images(archive, max_member_size=1024)], ['dcim/a.jpg'])
+        self.assertEqual(count_zip_images(archive, max_member_size=1024), 1)
+        self.assertEqual(count_zip_images(archive, max_member_size=None), 2)
+
+    def test_check_image_count(self):
+        check_image_count(3, max_images=3)
+        with self.assertRaises(ValueError):
+            check_image_count(4, max_images=3)
+
+    def test_local_directory_must_stay_inside_root(self):
+        os.makedirs(os.path.join(self.folder, 'card'))
+
+        self.assertEqual(resolve_local_directory('card', self.folder), os.path.realpath(os.path.join(self.folder, 'card')))
+        for directory in ('..', '../etc', 'missing'):
+            with self.assertRaises(ValueError):
+                resolve_local_directory(directory, self.folder)
+        with self.assertRaises(ValueError):
+            resolve_local_directory('card', None)
+
+class ProcessBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder, ignore_errors=True)
+        patcher = mock.patch.object(batch_processing, 'run_detectors_batch', side_effect=stub_detectors)
+        self.detectors = patcher.start()
+        self.addCleanup(patcher.stop)
+        with open(os.path.join(self.folder, 'bad.jpg'), 'wb') as f:
+            f.write(b'not an image')
+        for i in range(3):
+            with open(os.path.join(self.folder, f'img{i}.jpg'), 'wb') as f:
+                f.write(jpeg(40 * i))
+
+    def test_manifest_counts_and_chunks(self):
+        progress = []
+        manifest = process_batch(iter_directory_images(self.folder), chunk_size=2, progress_callback=progress.append)
+
+        self.assertEqual([entry['filename'] for entry in manifest['images']], ['bad.jpg', 'img0.jpg', 'img1.jpg', 'img2.jpg'])
+        self.assertEqual(manifest['images'][0]['error'], 'Could not read image')
+        self.assertEqual(manifest['images'][1]['class_counts'], {'bear': 1})
+        self.assertEqual(manifest['images'][1]['failed_detectors'], {'ppe': 'model not loaded'})
+        self.assertEqual(manifest['totals']['images'], 4)
+        self.assertEqual(manifest['totals']['failed'], 1)
+        self.assertEqual(manifest['totals']['class_counts'], {'bear': 3})
+        self.assertEqual(progress, [2, 4])
+        # Unreadable images are not sent to the detectors
+        self.assertEqual([len(call.args[0]) for call in self.detectors.call_args_list], [1, 2])
+
+    def test_max_images_stops_streamed_input(self):
+        with self.assertRaises(ValueError):
+            process_batch(iter_directory_images(self.folder), chunk_size=2, max_images=3)
+
+    def test_manifest_csv(self):
+        manifest = process_batch(iter_directory_images(self.folder))
+        buffer = io.StringIO()
+        write_manifest_csv(manifest, buffer)
+        rows = buffer.getvalue().splitlines()
+
+        self.assertEqual(rows[0], 'filename,width,height,detections,bear,failed_detectors,annotated,error')
+        self.assertEqual(rows[1], 'bad.jpg,,,0,0,,,Could not read image')
+        self.assertEqual(rows[2], 'img0.jpg,32,24,1,1,ppe,,')
+
+    def test_background_job_reports_progress_and_cleans_up(self):
+        manager = BatchJobManager(max_workers=1, queue_limit=0)
+        cleaned = []
+        job = manager.submit(lambda: iter_directory_images(self.folder), 4, self.folder,
+                             cleanup=[lambda: cleaned.append(True)], chunk_size=2)
+        # Cleanup runs last, once the job has finished
+        for _ in range(250):
+            if cleaned:
+                break
+            time.sleep(0.02)
+
+        info = job.to_dict()
+        self.assertEqual(info['status'], 'done')
+        self.assertEqual((info['images_done'], info['images_total'], info['progress']), (4, 4, 1.0))
+        self.assertEqual(info['totals']['class_counts'], {'bear': 3})
+        self.assertEqual(cleaned, [True])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+"""
+Tests of the headless runner (python -m detection) with stub detectors: outputs,
+checkpointing and resuming.
+
+Run with: python -m pytest tests  (or python -m unittest discover tests)
+"""
+import io
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+import cv2
+import numpy as np
+import detection.__main__ as cli
+from detection.__main__ import Checkpoint, iter_input_files
+
+def stub_run_detectors(image, settings):
+    return {
+        "results": {name: {"predictions": [{"x": 10, "y": 10, "width": 8, "height": 8, "confidence": 0.9,
+                                            "class": name}]} for name in settings},
+        "errors": {},
+        "timings": {}
+    }
+
+class CliTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder, ignore_errors=True)
+        self.output = os.path.join(self.folder, 'out')
+        patcher = mock.patch.object(cli, 'run_detectors', side_effect=stub_run_detectors)
+        self.detectors = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def image(self, relative, value):
+        path = os.path.join(self.folder, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        cv2.imwrite(path, np.full((24, 32, 3), value, dtype=np.uint8))
+        return path
+
+    def run_cli(self, *args):
+        with redirect_stdout(io.StringIO()):
+            return cli.main([*args, '--output', self.output, '--workers', '2'])
+
+    def records(self):
+        with open(os.path.join(self.output, 'checkpoint.jsonl'), encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_processes_and_records_every_file(self):
+        self.image('card/a.jpg', 10)
+        self.image('card/sub/b.jpg', 20)
+
+        self.assertEqual(self.run_cli(os.path.join(self.folder, 'card'), '--models', 'animal'), 0)
+
+        self.assertTrue(os.path.exists(os.path.join(self.output, 'a.jpg')))
+        self.assertTrue(os.path.exists(os.path.join(self.output, 'sub', 'b.jpg')))
+        records = self.records()
+        self.assertEqual(sorted(record['status'] for record in records), ['done', 'done'])
+        self.assertEqual(records[0]['result']['class_counts'], {'animal': 1})
+
+    def test_resume_skips_finished_content(self):
+        self.image('card/a.jpg', 10)
+        self.image('card/b.jpg', 20)
+        card = os.path.join(self.folder, 'card')
+        self.run_cli(card, '--no-annotate')
+        calls = self.detectors.call_count
+
+        # A renamed copy has the same content and is skipped as well
+        shutil.copy(os.path.join(card, 'a.jpg'), os.path.join(card, 'renamed.jpg'))
+        self.run_cli(card, '--no-annotate')
+
+        self.assertEqual(self.detectors.call_count, calls)
+
+    def test_other_options_process_files_again(self):
+        card = os.path.dirname(self.image('card/a.jpg', 10))
+        self.run_cli(card, '--no-annotate', '--models', 'animal')
+        self.run_cli(card, '--no-annotate', '--models', 'animal,weapon')
+
+        self.assertEqual(self.detectors.call_count, 2)
+
+    def test_no_resume_starts_over(self):
+        card = os.path.dirname(self.image('card/a.jpg', 10))
+        self.run_cli(card, '--no-annotate')
+        self.run_cli(card, '--no-annotate', '--no-resume')
+
+        self.assertEqual(self.detectors.call_count, 2)
+        self.assertEqual(len(self.records()), 1)
+
+    def test_same_names_under_several_inputs_do_not_collide(self):
+        self.image('card_a/DCIM/img1.jpg', 10)
+        self.image('card_b/DCIM/img1.jpg', 200)
+
+        self.run_cli(os.path.join(self.folder, 'card_a'), os.path.join(self.folder, 'card_b'))
+
+        self.assertTrue(os.path.exists(os.path.join(self.output, '1_card_a', 'DCIM', 'img1.jpg')))
+        self.assertTrue(os.path.exists(os.path.join(self.output, '2_card_b', 'DCIM', 'img1.jpg')))
+
+    def test_unreadable_image_fails_only_itself(self):
+        card = os.path.dirname(self.image('card/a.jpg', 10))
+        with open(os.path.join(card, 'broken.jpg'), 'wb') as f:
+            f.write(b'not an image')
+
+        self.assertEqual(self.run_cli(card, '--no-annotate'), 1)
+        statuses = {os.path.basename(record['path']): record['status'] for record in self.records()}
+        self.assertEqual(statuses, {'a.jpg': 'done', 'broken.jpg': 'failed'})
+
+    def test_rejects_unknown_modes(self):
+        with redirect_stdout(io.StringIO()), mock.patch('sys.stderr', io.StringIO()):
+            for args in (['--sampling', 'sometimes'], ['--carry', 'guess'], ['--models', 'dragon']):
+                with self.assertRaises(SystemExit):
+                    cli.main([self.folder, '--output', self.output, *args])
+
+class CheckpointTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder, ignore_errors=True)
+        self.path = os.path.join(self.folder, 'checkpoint.jsonl')
+
+    def test_cut_off_line_is_ignored(self):
+        checkpoint = Checkpoint(self.path, options={"models": ["ppe"]})
+        checkpoint.record({"hash": "aaa", "status": "done"})
+        checkpoint.record({"hash": "bbb", "status": "failed"})
+        checkpoint.close()
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write('{"hash": "ccc", "sta')
+
+        resumed = Checkpoint(self.path, options={"models": ["ppe"]})
+        self.addCleanup(resumed.close)
+
+        self.assertFalse(resumed.claim("aaa"))
+        self.assertTrue(resumed.claim("bbb"))
+        self.assertTrue(resumed.claim("ccc"))
+        # A claimed file is not handed out twice
+        self.assertFalse(resumed.claim("ccc"))
+
+    def test_iter_input_files_single_input_keeps_tree(self):
+        os.makedirs(os.path.join(self.folder, 'sub'))
+        open(os.path.join(self.folder, 'sub', 'a.jpg'), 'wb').close()
+        open(os.path.join(self.folder, 'notes.txt'), 'wb').close()
+
+        self.assertEqual([relative for _, relative in iter_input_files([self.folder])], [os.path.join('sub', 'a.jpg')])
+
+if __name__ == '__main__':
+    unittest.main()
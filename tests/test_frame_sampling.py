@@ -0,0 +1,94 @@
+"""
+Tests of frame sampling and of carrying detections to frames that were not inferred.
+
+Run with: python -m pytest tests  (or python -m unittest discover tests)
+"""
+import unittest
+import numpy as np
+from detection.frame_sampling import FrameSampler, DetectionCarrier, interpolate_predictions
+from detection.tracking import IoUTracker
+
+def frame(value=0):
+    return np.full((48, 64, 3), value, dtype=np.uint8)
+
+def result(x, confidence=0.8):
+    return {"predictions": [{"x": x, "y": 20.0, "width": 10.0, "height": 10.0, "confidence": confidence,
+                             "class": "bear"}]}
+
+def inferred(sampler, frames):
+    return [index for index, f in enumerate(frames) if sampler.should_infer(index, f)]
+
+class FrameSamplerTest(unittest.TestCase):
+
+    def test_nth(self):
+        sampler = FrameSampler('nth', every_n=3)
+
+        self.assertEqual(inferred(sampler, [frame()] * 10), [0, 3, 6, 9])
+        self.assertEqual(sampler.frames_inferred, 4)
+
+    def test_fps(self):
+        sampler = FrameSampler('fps', target_fps=10, video_fps=30)
+
+        self.assertEqual(inferred(sampler, [frame()] * 12), [0, 3, 6, 9])
+
+    def test_keyframes_on_scene_change_and_after_max_gap(self):
+        frames = [frame(20)] * 5 + [frame(230)] * 10
+        sampler = FrameSampler('keyframes', video_fps=30, max_gap=6)
+
+        self.assertEqual(inferred(sampler, frames), [0, 5, 11])
+
+    def test_rejects_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            FrameSampler('sometimes')
+
+class DetectionCarrierTest(unittest.TestCase):
+
+    def test_hold_reuses_last_detections(self):
+        carrier = DetectionCarrier('hold')
+        first = carrier.push(frame(), result(10.0))
+        held = carrier.push(frame(), None)
+
+        self.assertEqual(held[0][1], first[0][1])
+
+    def test_interpolate_fills_the_gap_in_order(self):
+        carrier = DetectionCarrier('interpolate')
+        frames = [frame(i) for i in range(4)]
+        ready = carrier.push(frames[0], result(10.0))
+        ready += carrier.push(frames[1], None)
+        ready += carrier.push(frames[2], None)
+        self.assertEqual(len(ready), 1)
+        ready += carrier.push(frames[3], result(13.0))
+
+        self.assertEqual([int(f[0, 0, 0]) for f, _ in ready], [0, 1, 2, 3])
+        self.assertEqual([r['predictions'][0]['x'] for _, r in ready], [10.0, 11.0, 12.0, 13.0])
+
+    def test_interpolate_buffer_is_bounded(self):
+        carrier = DetectionCarrier('interpolate', max_buffer=3)
+        carrier.push(frame(), result(10.0))
+        released = [len(carrier.push(frame(), None)) for _ in range(6)]
+
+        self.assertEqual(released, [0, 0, 3, 1, 1, 1])
+        self.assertEqual(carrier.flush(), [])
+
+    def test_track_mode_uses_predicted_boxes_with_ids(self):
+        carrier = DetectionCarrier('track', tracker=IoUTracker(fps=10, min_hits=1))
+        carrier.push(frame(), result(10.0))
+        carrier.push(frame(), result(12.0))
+        (_, predicted), = carrier.push(frame(), None)
+
+        self.assertEqual(len(predicted['predictions']), 1)
+        self.assertEqual(predicted['predictions'][0]['track_id'], 1)
+        self.assertGreater(predicted['predictions'][0]['x'], 12.0)
+
+    def test_track_mode_needs_a_tracker(self):
+        with self.assertRaises(ValueError):
+            DetectionCarrier('track')
+
+    def test_interpolate_holds_unmatched_boxes(self):
+        start = result(10.0)
+        end = {"predictions": [dict(result(10.0)['predictions'][0], **{"class": "deer"})]}
+
+        self.assertEqual(interpolate_predictions(start, end, 0.5), start)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+"""
+Tests of the local model registry with a stand-in for ultralytics.YOLO.
+
+Run with: python -m pytest tests  (or python -m unittest discover tests)
+"""
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+from detection.model_registry import ModelRegistry, parse_model_paths
+
+class StubYOLO:
+    """Records loads and predict() calls like a YOLO model would receive them."""
+    loaded = []
+
+    def __init__(self, path):
+        StubYOLO.loaded.append(path)
+        self.path = path
+        self.names = {0: 'helmet', 1: 'vest'}
+        self.predictions = 0
+
+    def predict(self, source, verbose=False):
+        self.predictions += 1
+        return []
+
+class ModelRegistryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder, ignore_errors=True)
+        StubYOLO.loaded = []
+        patcher = mock.patch.dict(sys.modules, {'ultralytics': SimpleNamespace(YOLO=StubYOLO)})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Per-model environment overrides would change what the registry resolves
+        env = mock.patch.dict(os.environ, {key: value for key, value in os.environ.items()
+                                           if not key.endswith(('_MODEL_PATH', '_RUNTIME'))}, clear=True)
+        env.start()
+        self.addCleanup(env.stop)
+
+    def weights(self, name):
+        path = os.path.join(self.folder, f"{name}.pt")
+        open(path, 'wb').close()
+        return path
+
+    def test_parse_model_paths(self):
+        self.assertEqual(parse_model_paths("ppe=/a/ppe.pt, animal = /b/x.pt,broken,=x"),
+                         {"ppe": "/a/ppe.pt", "animal": "/b/x.pt"})
+
+    def test_explicit_path_beats_search_dirs(self):
+        searched = self.weights('ppe')
+        explicit = os.path.join(self.folder, 'custom.pt')
+        open(explicit, 'wb').close()
+
+        self.assertEqual(ModelRegistry(paths={}, search_dirs=[self.folder]).resolve_path('ppe'), searched)
+        self.assertEqual(ModelRegistry(paths={'ppe': explicit}, search_dirs=[self.folder]).resolve_path('ppe'), explicit)
+        with mock.patch.dict(os.environ, {'PPE_MODEL_PATH': searched}):
+            self.assertEqual(ModelRegistry(paths={'ppe': explicit}).resolve_path('ppe'), searched)
+
+    def test_loads_once_with_warmup(self):
+        path = self.weights('ppe')
+        registry = ModelRegistry(paths={}, search_dirs=[self.folder], warmup=True, warmup_size=32)
+
+        threads = [threading.Thread(target=registry.get, args=('ppe',)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        entry = registry.get('ppe')
+
+        self.assertEqual(StubYOLO.loaded, [path])
+        self.assertEqual(entry.model.predictions, 1)
+        self.assertEqual(entry.class_names, {0: 'helmet', 1: 'vest'})
+        self.assertTrue(registry.stats()['ppe']['loaded'])
+
+    def test_missing_weights_are_reported(self):
+        registry = ModelRegistry(paths={}, search_dirs=[self.folder])
+
+        self.assertIsNone(registry.get('weapon'))
+        self.assertFalse(registry.stats()['weapon']['loaded'])
+        self.assertIn('No weights found', registry.stats()['weapon']['error'])
+
+    def test_missing_runtime_is_reported(self):
+        self.weights('ppe')
+        registry = ModelRegistry(paths={}, search_dirs=[self.folder])
+
+        with mock.patch.dict(sys.modules, {'ultralytics': None}):
+            self.assertIsNone(registry.get('ppe'))
+        self.assertEqual(registry.stats()['ppe']['error'], 'ultralytics is not installed')
+
+    def test_unload_makes_the_next_get_reload(self):
+        self.weights('animal')
+        registry = ModelRegistry(paths={}, search_dirs=[self.folder], warmup=False)
+        first = registry.get('animal')
+        registry.unload('animal')
+
+        self.assertIsNot(registry.get('animal'), first)
+        self.assertEqual(len(StubYOLO.loaded), 2)
+        self.assertIsNone(registry.get('animal').warmup_seconds)
+
+if __name__ == '__main__':
+    unittest.main()
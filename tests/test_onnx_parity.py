@@ -0,0 +1,47 @@
+"""
+Parity of the ONNX runtime with the PyTorch model (the automated form of
+python -m detection.onnx_export --verify).
+
+Skipped unless ultralytics, onnxruntime and the PPE weights are available. Set
+ONNX_PARITY_WEIGHTS to test other weights.
+"""
+import os
+import glob
+import importlib.util
+import unittest
+import numpy as np
+
+def _installed(module):
+    return importlib.util.find_spec(module) is not None
+
+def _weights():
+    path = os.getenv("ONNX_PARITY_WEIGHTS")
+    if path is None:
+        from detection.model_registry import model_registry
+        path = model_registry.resolve_path('ppe')
+    return path if path and os.path.exists(path) and path.endswith('.pt') else None
+
+@unittest.skipUnless(_installed('ultralytics') and _installed('onnxruntime'), "ultralytics and onnxruntime are required")
+class OnnxParityTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.weights = _weights()
+        if cls.weights is None:
+            raise unittest.SkipTest("No .pt weights found (set ONNX_PARITY_WEIGHTS or PPE_MODEL_PATH)")
+        from utils.image_utils import load_image
+        sample_dir = os.path.join(os.path.dirname(__file__), os.pardir, 'static', 'samples')
+        cls.images = [load_image(path) for path in sorted(glob.glob(os.path.join(sample_dir, '*.jpg')))]
+        cls.images.append(np.random.default_rng(0).integers(0, 255, (480, 640, 3), dtype=np.uint8))
+
+    def test_detections_match_torch(self):
+        from detection.onnx_export import export_onnx, verify, OnnxYoloModel
+        report = verify(self.weights, OnnxYoloModel(export_onnx(self.weights)), self.images, runs=1)
+
+        for entry in report["images"]:
+            with self.subTest(image=entry["image"]):
+                self.assertEqual(entry["onnx_detections"], entry["torch_detections"])
+                self.assertEqual(entry["matched"], entry["torch_detections"])
+
+if __name__ == '__main__':
+    unittest.main()
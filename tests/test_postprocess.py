@@ -0,0 +1,77 @@
+"""
+Tests of the NumPy NMS and cross-model fusion.
+
+Run with: python -m pytest tests  (or python -m unittest discover tests)
+"""
+import copy
+import unittest
+import numpy as np
+from detection.postprocess import nms, batched_nms, fuse_predictions, letterbox
+from utils.detection_utils import combine_detection_results
+
+def box(x, y, w, h, confidence, class_name):
+    return {"x": x, "y": y, "width": w, "height": h, "confidence": confidence, "class": class_name}
+
+class NmsTest(unittest.TestCase):
+
+    def test_suppresses_overlapping_lower_scores(self):
+        boxes = [[0, 0, 10, 10], [1, 1, 11, 11], [50, 50, 60, 60]]
+        keep = nms(boxes, np.array([0.9, 0.8, 0.7]), 0.5)
+
+        self.assertEqual(list(keep), [0, 2])
+
+    def test_batched_nms_keeps_classes_apart(self):
+        boxes = [[0, 0, 10, 10], [1, 1, 11, 11]]
+        keep = batched_nms(boxes, np.array([0.9, 0.8]), [0, 1], 0.5)
+
+        self.assertEqual(sorted(keep), [0, 1])
+
+    def test_batched_nms_keeps_classes_apart_on_very_wide_images(self):
+        # With a fixed class offset, class 0 near x=8000 would overlap class 1 near x=320
+        boxes = [[8000, 0, 8010, 10], [320, 0, 330, 10], [8001, 1, 8011, 11]]
+        keep = batched_nms(boxes, np.array([0.9, 0.8, 0.7]), [0, 1, 0], 0.5)
+
+        self.assertEqual(sorted(keep), [0, 1])
+
+    def test_letterbox_keeps_aspect_ratio(self):
+        image, ratio, (pad_x, pad_y) = letterbox(np.zeros((100, 200, 3), dtype=np.uint8), 640)
+
+        self.assertEqual(image.shape, (640, 640, 3))
+        self.assertAlmostEqual(ratio, 3.2)
+        self.assertEqual((pad_x, pad_y), (0.0, 160.0))
+
+class FusionTest(unittest.TestCase):
+
+    def test_removes_cross_model_duplicates_of_aliased_classes(self):
+        human = box(100, 100, 50, 100, 0.9, 'human')
+        person = box(102, 101, 50, 98, 0.7, 'person')
+        fused = fuse_predictions([human, person], ['animal', 'ppe'])
+
+        self.assertEqual(fused, [human])
+
+    def test_same_model_boxes_never_suppress_each_other(self):
+        predictions = [box(100, 100, 50, 50, 0.9, 'bear'), box(101, 100, 50, 50, 0.8, 'bear')]
+
+        self.assertEqual(len(fuse_predictions(predictions, ['animal', 'animal'])), 2)
+
+    def test_fuse_averages_boxes_without_modifying_inputs(self):
+        predictions = [box(100, 100, 40, 40, 0.75, 'human'), box(110, 100, 40, 40, 0.25, 'person')]
+        original = copy.deepcopy(predictions)
+        fused = fuse_predictions(predictions, ['animal', 'ppe'], iou_threshold=0.3, method='fuse')
+
+        self.assertEqual(predictions, original)
+        self.assertEqual(len(fused), 1)
+        self.assertAlmostEqual(fused[0]['x'], 102.5, places=3)
+        self.assertEqual(fused[0]['class'], 'human')
+
+    def test_combine_keeps_ppe_person_without_matching_human(self):
+        combined = combine_detection_results(
+            {"predictions": [box(100, 100, 50, 100, 0.9, 'human')]},
+            {"predictions": [box(101, 100, 50, 100, 0.8, 'person'), box(400, 100, 50, 100, 0.8, 'person')]},
+            {"predictions": []})
+
+        self.assertEqual([p['class'] for p in combined['predictions']], ['human', 'person'])
+        self.assertEqual(combined['predictions'][1]['x'], 400)
+
+if __name__ == '__main__':
+    unittest.main()
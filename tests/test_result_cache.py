@@ -0,0 +1,112 @@
+"""
+Tests of the two-tier detection result cache and the detector decorators.
+
+Run with: python -m pytest tests  (or python -m unittest discover tests)
+"""
+import os
+import time
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+import utils.result_cache as result_cache
+from utils.result_cache import ResultCache, cached_detector, cached_batch_detector
+
+def frame(value):
+    return np.full((8, 8, 3), value, dtype=np.uint8)
+
+class ResultCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.disk_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.disk_dir, ignore_errors=True)
+
+    def test_returns_copies(self):
+        cache = ResultCache(max_entries=4, ttl=60)
+        cache.put('a', {"predictions": [{"class": "bear"}]})
+        cache.get('a')['predictions'].clear()
+
+        self.assertEqual(cache.get('a'), {"predictions": [{"class": "bear"}]})
+
+    def test_evicts_least_recently_used(self):
+        cache = ResultCache(max_entries=2, ttl=60)
+        cache.put('a', {"n": 1})
+        cache.put('b', {"n": 2})
+        cache.get('a')
+        cache.put('c', {"n": 3})
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), {"n": 1})
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_expires_after_ttl(self):
+        cache = ResultCache(max_entries=4, ttl=60)
+        with mock.patch.object(result_cache.time, 'time', return_value=1000.0):
+            cache.put('a', {"n": 1})
+        with mock.patch.object(result_cache.time, 'time', return_value=1061.0):
+            self.assertIsNone(cache.get('a'))
+
+    def test_disk_hit_keeps_original_store_time(self):
+        ResultCache(max_entries=4, ttl=60, disk_dir=self.disk_dir).put('a', {"n": 1})
+        cache = ResultCache(max_entries=4, ttl=60, disk_dir=self.disk_dir)
+        stored_at = os.path.getmtime(cache._disk_path('a'))
+
+        with mock.patch.object(result_cache.time, 'time', return_value=stored_at + 50):
+            self.assertEqual(cache.get('a'), {"n": 1})
+        self.assertEqual(cache.stats()['disk_hits'], 1)
+        # Promoted to memory 50 s after it was stored, it still expires 60 s after storing
+        with mock.patch.object(result_cache.time, 'time', return_value=stored_at + 61):
+            self.assertIsNone(cache.get('a'))
+
+class CachedDetectorTest(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(result_cache, 'detection_cache', ResultCache(max_entries=16, ttl=60))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_caches_by_content_and_settings(self):
+        calls = []
+
+        @cached_detector('test', lambda: 'v1')
+        def detect(image, confidence, overlap, **kwargs):
+            calls.append(confidence)
+            return {"predictions": [{"class": "bear", "confidence": confidence}]}
+
+        detect(frame(1), 0.3, 0.5)
+        detect(frame(1), 0.3, 0.5)
+        detect(frame(1), 0.4, 0.5)
+        detect(frame(2), 0.3, 0.5)
+
+        self.assertEqual(calls, [0.3, 0.4, 0.3])
+
+    def test_does_not_cache_errors_or_failover(self):
+        calls = []
+
+        @cached_detector('test', lambda: 'v1')
+        def detect(image, confidence, overlap, **kwargs):
+            calls.append(1)
+            return {"predictions": [], "failover": True} if len(calls) == 1 else {"predictions": [], "error": "down"}
+
+        for _ in range(3):
+            detect(frame(1), 0.3, 0.5)
+
+        self.assertEqual(len(calls), 3)
+
+    def test_batch_detector_only_runs_misses(self):
+        seen = []
+
+        @cached_batch_detector('test', lambda: 'v1')
+        def detect(images, confidence, overlap, batch_size=None):
+            seen.append(len(images))
+            return [{"predictions": [{"value": int(image[0, 0, 0])}]} for image in images]
+
+        detect([frame(1), frame(2)], 0.3, 0.5)
+        results = detect([frame(2), frame(3), frame(1)], 0.3, 0.5)
+
+        self.assertEqual(seen, [2, 1])
+        self.assertEqual([r['predictions'][0]['value'] for r in results], [2, 3, 1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+"""
+Tests of the pooled Roboflow client against a local stand-in inference server.
+
+Run with: python -m pytest tests  (or python -m unittest discover tests)
+"""
+import json
+import time
+import threading
+import unittest
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+import detection.roboflow_client as roboflow_client
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Answers POSTs with the next scripted (status, delay) and records client connections."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        server = self.server
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with server.lock:
+            server.requests += 1
+            server.client_ports.add(self.client_address[1])
+            status, delay = server.script.pop(0) if server.script else (200, 0)
+        if delay:
+            time.sleep(delay)
+        body = json.dumps({"predictions": [], "image": {"width": 10, "height": 10}}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class RoboflowClientTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+        self.server.daemon_threads = True
+        self.server.lock = threading.Lock()
+        self.server.requests = 0
+        self.server.client_ports = set()
+        self.server.script = []
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.endpoint = f"http://127.0.0.1:{self.server.server_address[1]}/model/1"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def use_session(self, **kwargs):
+        """Make post_image use a fresh session created with the given create_session arguments."""
+        session = roboflow_client.create_session(**kwargs)
+        self.addCleanup(session.close)
+        patcher = mock.patch.object(roboflow_client, '_session', session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self):
+        return roboflow_client.post_image(self.endpoint, {"api_key": "test"}, {"file": ("a.jpg", b"jpeg", "image/jpeg")})
+
+    def test_retries_503_then_succeeds(self):
+        self.use_session(max_retries=3, backoff=0)
+        self.server.script = [(503, 0)]
+
+        response = self.post()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["predictions"], [])
+        self.assertEqual(self.server.requests, 2)
+
+    def test_gives_up_after_max_retries(self):
+        self.use_session(max_retries=2, backoff=0)
+        self.server.script = [(503, 0)] * 5
+
+        response = self.post()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.server.requests, 3)
+
+    def test_reuses_connection_across_calls(self):
+        self.use_session(max_retries=0)
+
+        for _ in range(5):
+            self.assertEqual(self.post().status_code, 200)
+
+        self.assertEqual(self.server.requests, 5)
+        self.assertEqual(len(self.server.client_ports), 1)
+
+    def test_roboflow_timeout_is_applied(self):
+        self.use_session(max_retries=0)
+        self.server.script = [(200, 2.0)]
+
+        start = time.perf_counter()
+        with mock.patch.object(roboflow_client, 'ROBOFLOW_TIMEOUT', 0.3):
+            with self.assertRaises(requests.exceptions.RequestException):
+                self.post()
+        self.assertLess(time.perf_counter() - start, 1.5)
+
+    def test_fail_fast_does_not_retry_timeouts(self):
+        self.use_session(max_retries=3, backoff=0, fail_fast=True)
+        self.server.script = [(200, 1.0)] * 4
+
+        with self.assertRaises(requests.exceptions.RequestException):
+            roboflow_client.post_image(self.endpoint, {}, {"file": ("a.jpg", b"jpeg", "image/jpeg")}, timeout=0.2)
+        self.assertEqual(self.server.requests, 1)
+
+    def test_fail_fast_post_uses_fail_fast_session(self):
+        # No session is patched in: post_image picks the session through get_session
+        patcher = mock.patch.object(roboflow_client, '_fail_fast_session', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(lambda: roboflow_client._fail_fast_session and roboflow_client._fail_fast_session.close())
+        self.server.script = [(200, 1.0)] * 4
+
+        with self.assertRaises(requests.exceptions.RequestException):
+            roboflow_client.post_image(self.endpoint, {}, {"file": ("a.jpg", b"jpeg", "image/jpeg")},
+                                       timeout=0.2, fail_fast=True)
+        self.assertEqual(self.server.requests, 1)
+        self.assertIsNotNone(roboflow_client._fail_fast_session)
+        self.assertIsNot(roboflow_client._fail_fast_session, roboflow_client._session)
+
+    def test_fail_fast_still_retries_503(self):
+        self.use_session(max_retries=3, backoff=0, fail_fast=True)
+        self.server.script = [(503, 0)]
+
+        self.assertEqual(self.post().status_code, 200)
+        self.assertEqual(self.server.requests, 2)
+
+    def test_explicit_timeout_overrides_setting(self):
+        self.use_session(max_retries=0)
+        self.server.script = [(200, 0.5)]
+
+        with mock.patch.object(roboflow_client, 'ROBOFLOW_TIMEOUT', 0.1):
+            response = roboflow_client.post_image(self.endpoint, {}, {"file": ("a.jpg", b"jpeg", "image/jpeg")},
+                                                  timeout=5)
+        self.assertEqual(response.status_code, 200)
+
+if __name__ == '__main__':
+    unittest.main()
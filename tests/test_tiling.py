@@ -0,0 +1,93 @@
+"""
+Tests of tiled inference with a stub model that finds white squares in whatever it is given.
+
+Run with: python -m pytest tests  (or python -m unittest discover tests)
+"""
+import unittest
+from types import SimpleNamespace
+import numpy as np
+from detection.tiling import tile_windows, predict_tiled, predict_tiled_columns
+
+class StubBoxes:
+
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        self.conf = np.asarray(conf, dtype=np.float32)
+        self.cls = np.asarray(cls, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.xyxy)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self
+
+class WhiteSquareModel:
+    """Detects the bounding box of the white pixels of each source as one 'target' (squares of 40 px)."""
+
+    def __init__(self):
+        self.batches = []
+
+    def predict(self, source, conf, iou, verbose=False):
+        self.batches.append(len(source))
+        results = []
+        for image in source:
+            ys, xs = np.nonzero(image[..., 0] == 255)
+            if len(xs):
+                # Like a real model, a square cut off by the tile edge is found less confidently
+                boxes = StubBoxes([[xs.min(), ys.min(), xs.max() + 1, ys.max() + 1]], [0.5 + len(xs) / 4000], [0])
+            else:
+                boxes = StubBoxes(np.empty((0, 4)), [], [])
+            results.append(SimpleNamespace(names={0: 'target'}, boxes=boxes))
+        return results
+
+def image_with_square(x0, y0, size=40, width=1500, height=1000):
+    image = np.zeros((height, width, 3), dtype=np.uint8)
+    image[y0:y0 + size, x0:x0 + size] = 255
+    return image
+
+class TileWindowsTest(unittest.TestCase):
+
+    def test_covers_the_image_with_full_size_tiles(self):
+        windows = tile_windows(1500, 1000, tile_size=640, overlap=0.2)
+
+        self.assertEqual(windows[:, 0].min(), 0)
+        self.assertEqual(windows[:, 2].max(), 1500)
+        self.assertEqual(windows[:, 3].max(), 1000)
+        self.assertTrue(((windows[:, 2] - windows[:, 0]) == 640).all())
+        self.assertTrue(((windows[:, 3] - windows[:, 1]) == 640).all())
+
+    def test_small_image_is_one_tile(self):
+        self.assertEqual(tile_windows(300, 200, tile_size=640).tolist(), [[0, 0, 300, 200]])
+
+class PredictTiledTest(unittest.TestCase):
+
+    def test_boxes_are_in_image_coordinates(self):
+        model = WhiteSquareModel()
+        xyxy, conf, cls, names = predict_tiled(model, image_with_square(1000, 600), 0.3, 0.5,
+                                               tile_size=640, tile_overlap=0.2, include_full=True)
+
+        self.assertEqual(xyxy.tolist(), [[1000, 600, 1040, 640]])
+        self.assertEqual(names, {0: 'target'})
+        # Every tile and the whole image go to the model in one call
+        self.assertEqual(model.batches, [len(tile_windows(1500, 1000, 640, 0.2)) + 1])
+
+    def test_object_cut_by_a_tile_seam_is_reported_once(self):
+        # 620-660 crosses the right edge of the first tile column (0-640)
+        xyxy, _, _, _ = predict_tiled(WhiteSquareModel(), image_with_square(620, 100), 0.3, 0.5,
+                                      tile_size=640, tile_overlap=0.2, include_full=False)
+
+        self.assertEqual(len(xyxy), 1)
+        self.assertEqual(xyxy[0].tolist(), [620, 100, 660, 140])
+
+    def test_columns_apply_the_class_map(self):
+        columns = predict_tiled_columns(WhiteSquareModel(), image_with_square(10, 10, width=300, height=200),
+                                        0.3, 0.5, class_map={'target': 'helmet'})
+
+        self.assertEqual(columns['class_names'], ['helmet'])
+        self.assertEqual(columns['x'].tolist(), [30.0])
+
+if __name__ == '__main__':
+    unittest.main()
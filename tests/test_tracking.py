@@ -0,0 +1,87 @@
+"""
+Tests of the IoU tracker, alone and through process_video with a stub detector.
+
+Run with: python -m pytest tests  (or python -m unittest discover tests)
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import cv2
+import numpy as np
+import detection.video_processing as video_processing
+from detection.tracking import IoUTracker
+
+def bear(x=100.0, y=80.0, confidence=0.9):
+    return {"x": x, "y": y, "width": 40.0, "height": 30.0, "confidence": confidence, "class": "bear"}
+
+def write_static_video(path, frames, fps):
+    """A clip whose frames never change, so the motion gate and keyframe sampler skip most of them."""
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (160, 120))
+    frame = np.full((120, 160, 3), 90, dtype=np.uint8)
+    for _ in range(frames):
+        out.write(frame)
+    out.release()
+
+class IoUTrackerTest(unittest.TestCase):
+
+    def test_keeps_id_across_skipped_frames(self):
+        tracker = IoUTracker(fps=10, min_hits=2)
+        first = tracker.step({"predictions": [bear()]})
+        for _ in range(4):
+            carried = tracker.step(None)
+        second = tracker.step({"predictions": [bear(x=104.0)]})
+
+        self.assertEqual(first['predictions'][0]['track_id'], second['predictions'][0]['track_id'])
+        self.assertEqual(carried['predictions'][0]['track_id'], first['predictions'][0]['track_id'])
+        self.assertEqual(tracker.summary()['unique_counts'], {"bear": 1})
+
+    def test_drops_one_off_detection(self):
+        tracker = IoUTracker(fps=10, min_hits=2, max_age=0.1, max_misses=0)
+        tracker.step({"predictions": [bear(), bear(x=20.0, y=20.0, confidence=0.4)]})
+        for _ in range(5):
+            tracker.step({"predictions": [bear()]})
+
+        self.assertEqual(tracker.summary()['unique_counts'], {"bear": 1})
+
+    def test_single_inference_counts_when_nothing_else_was_inferred(self):
+        tracker = IoUTracker(fps=10, min_hits=2)
+        tracker.step({"predictions": [bear()]})
+        for _ in range(30):
+            tracker.step(None)
+
+        self.assertEqual(tracker.summary()['unique_counts'], {"bear": 1})
+
+class SparseInferenceTrackingTest(unittest.TestCase):
+    """A bear detected on every inferred frame is counted however few frames are inferred."""
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder, ignore_errors=True)
+        self.video = os.path.join(self.folder, 'static.mp4')
+        write_static_video(self.video, frames=60, fps=10)
+        patcher = mock.patch.object(video_processing, 'process_video_frames',
+                                    side_effect=lambda frames, *args: [{"predictions": [bear()]} for _ in frames])
+        self.detector = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_video(self, **kwargs):
+        stats = {}
+        video_processing.process_video(self.video, self.folder, render=False, export='jsonl', stats=stats, **kwargs)
+        return stats
+
+    def test_keyframe_sampling(self):
+        stats = self.run_video(sampling='keyframes')
+
+        self.assertLess(stats['frames_inferred'], 10)
+        self.assertEqual(stats['unique_counts'], {"bear": 1})
+
+    def test_motion_gate(self):
+        stats = self.run_video(motion_gate=True)
+
+        self.assertLess(stats['frames_inferred'], 10)
+        self.assertEqual(stats['unique_counts'], {"bear": 1})
+
+if __name__ == '__main__':
+    unittest.main()
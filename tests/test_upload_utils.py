@@ -0,0 +1,70 @@
+"""
+Tests of receiving uploads in memory or spooled to disk.
+
+Run with: python -m pytest tests  (or python -m unittest discover tests)
+"""
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from werkzeug.datastructures import FileStorage
+from utils.upload_utils import receive_upload
+
+def file_storage(data, filename='a.jpg'):
+    return FileStorage(stream=io.BytesIO(data), filename=filename)
+
+class ReceiveUploadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder, ignore_errors=True)
+
+    def test_small_upload_stays_in_memory(self):
+        upload = receive_upload(file_storage(b'x' * 10), 'a.jpg', max_in_memory=10, spool_dir=self.folder)
+
+        self.assertEqual(upload.data, b'x' * 10)
+        self.assertIsNone(upload.path)
+        self.assertFalse(upload.temporary)
+        self.assertEqual(os.listdir(self.folder), [])
+
+    def test_large_upload_is_spooled_and_discarded(self):
+        upload = receive_upload(file_storage(b'x' * 11), 'a.jpg', max_in_memory=10, spool_dir=self.folder)
+
+        self.assertIsNone(upload.data)
+        self.assertTrue(upload.path.endswith('.jpg'))
+        self.assertEqual(upload.size, 11)
+        with open(upload.path, 'rb') as f:
+            self.assertEqual(f.read(), b'x' * 11)
+        upload.discard()
+        self.assertEqual(os.listdir(self.folder), [])
+
+    def test_zero_limit_always_spools(self):
+        upload = receive_upload(file_storage(b'abc'), 'clip.mp4', max_in_memory=0, spool_dir=self.folder)
+        self.addCleanup(upload.discard)
+
+        self.assertTrue(upload.temporary)
+        self.assertEqual(upload.source, upload.path)
+
+    def test_persist_moves_spooled_file(self):
+        upload = receive_upload(file_storage(b'abc'), 'a.jpg', max_in_memory=0, spool_dir=self.folder)
+        target_folder = os.path.join(self.folder, 'kept')
+        os.makedirs(target_folder)
+        spooled = upload.path
+
+        path = upload.persist(target_folder)
+
+        self.assertEqual(path, os.path.join(target_folder, 'a.jpg'))
+        self.assertFalse(os.path.exists(spooled))
+        upload.discard()
+        self.assertTrue(os.path.exists(path))
+
+    def test_image_is_shared_and_named_after_the_upload(self):
+        upload = receive_upload(file_storage(b'not an image'), 'a.jpg', max_in_memory=100)
+
+        self.assertIs(upload.image, upload.image)
+        self.assertEqual(upload.image.name, 'a.jpg')
+        self.assertEqual(upload.image.data, b'not an image')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+"""
+Tests of the staged video pipeline with stub inference, on frames from a fake capture.
+
+Run with: python -m pytest tests  (or python -m unittest discover tests)
+"""
+import time
+import random
+import threading
+import unittest
+import numpy as np
+from detection.video_pipeline import VideoPipeline
+
+class FakeCapture:
+    """Yields frames whose first pixel holds their index, like an opened cv2.VideoCapture."""
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.read_count = 0
+
+    def isOpened(self):
+        return True
+
+    def read(self):
+        if self.read_count >= self.frames:
+            return False, None
+        frame = np.zeros((4, 4, 3), dtype=np.uint16)
+        frame[0, 0, 0] = self.read_count
+        self.read_count += 1
+        return True, frame
+
+def frame_index(frame):
+    return int(frame[0, 0, 0])
+
+class VideoPipelineTest(unittest.TestCase):
+
+    def test_keeps_frame_order_with_out_of_order_inference(self):
+        rng = random.Random(0)
+
+        def infer(frames):
+            time.sleep(rng.random() * 0.01)
+            return [{"predictions": [{"index": frame_index(frame)}]} for frame in frames]
+
+        recorded = []
+        written = []
+        pipeline = VideoPipeline(infer, None, num_workers=4, queue_size=2, batch_size=3,
+                                 record_fn=lambda result: recorded.append(result['predictions'][0]['index']))
+        count = pipeline.run(FakeCapture(50), lambda frame: written.append(frame_index(frame)))
+
+        self.assertEqual(count, 50)
+        self.assertEqual(written, list(range(50)))
+        self.assertEqual(recorded, list(range(50)))
+
+    def test_caps_frames_waiting_behind_a_slow_frame(self):
+        release = threading.Event()
+        capture = FakeCapture(100)
+
+        def infer(frames):
+            # Frame 0 is held back, so every later frame has to wait for it in the draw stage
+            if any(frame_index(frame) == 0 for frame in frames):
+                release.wait(5)
+            return [{"predictions": []} for _ in frames]
+
+        pipeline = VideoPipeline(infer, None, num_workers=3, queue_size=2, max_in_flight=6)
+        runner = threading.Thread(target=pipeline.run, args=(capture, lambda frame: None))
+        runner.start()
+        time.sleep(0.5)
+        decoded_while_blocked = capture.read_count
+        release.set()
+        runner.join(10)
+
+        self.assertLessEqual(decoded_while_blocked, 6)
+        self.assertEqual(capture.read_count, 100)
+
+    def test_record_error_aborts_and_is_raised(self):
+        def record(result):
+            raise OSError("disk full")
+
+        pipeline = VideoPipeline(lambda frames: [{"predictions": []} for _ in frames], None,
+                                 num_workers=2, record_fn=record)
+        with self.assertRaises(OSError):
+            pipeline.run(FakeCapture(20), lambda frame: None)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+"""
+Tests of the vectorized YOLO box conversion, on stand-ins for ultralytics Results.
+
+Run with: python -m pytest tests  (or python -m unittest discover tests)
+"""
+import unittest
+from types import SimpleNamespace
+import numpy as np
+from detection.yolo_utils import build_class_table, boxes_to_columns, iter_predictions, yolo_result_to_predictions
+
+class StubBoxes:
+    """Minimal ultralytics Boxes: len(), cpu().numpy() and the xyxy/conf/cls arrays."""
+
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        self.conf = np.asarray(conf, dtype=np.float32)
+        self.cls = np.asarray(cls, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.xyxy)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self
+
+class YoloUtilsTest(unittest.TestCase):
+
+    def test_class_table_applies_mapping_and_fills_gaps(self):
+        table = build_class_table({0: 'helmet', 2: 'vest'}, {'vest': 'safety vest'})
+
+        self.assertEqual(list(table), ['helmet', 'class_1', 'safety vest'])
+
+    def test_columns_use_center_geometry(self):
+        columns = boxes_to_columns([[10, 20, 30, 60]], [0.5], [0], build_class_table(['helmet']))
+
+        self.assertEqual(columns['x'].tolist(), [20.0])
+        self.assertEqual(columns['y'].tolist(), [40.0])
+        self.assertEqual(columns['width'].tolist(), [20.0])
+        self.assertEqual(columns['height'].tolist(), [40.0])
+
+    def test_unknown_class_ids_get_placeholder_names(self):
+        columns = boxes_to_columns([[0, 0, 1, 1]], [0.9], [3], build_class_table(['helmet']))
+
+        self.assertEqual(next(iter_predictions(columns))['class'], 'class_3')
+
+    def test_result_to_predictions(self):
+        result = SimpleNamespace(names={0: 'helmet', 1: 'person'},
+                                 boxes=StubBoxes([[0, 0, 10, 10], [5, 5, 25, 45]], [0.9, 0.75], [1, 0]))
+        predictions = yolo_result_to_predictions(result, {'person': 'worker'})
+
+        self.assertEqual([p['class'] for p in predictions], ['worker', 'helmet'])
+        self.assertEqual([(p['x'], p['y'], p['width'], p['height']) for p in predictions],
+                         [(5.0, 5.0, 10.0, 10.0), (15.0, 25.0, 20.0, 40.0)])
+        self.assertAlmostEqual(predictions[0]['confidence'], 0.9, places=6)
+        self.assertIsInstance(predictions[0]['x'], float)
+
+    def test_result_without_boxes(self):
+        result = SimpleNamespace(names={0: 'helmet'}, boxes=None)
+
+        self.assertEqual(yolo_result_to_predictions(result), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,22 @@
+import os
 import cv2
 import numpy as np
 import logging
-import shutil
+from functools import lru_cache
+from detection.postprocess import fuse_predictions
+from utils.image_utils import (SharedImage, is_image_array, describe_image, load_image, save_image_source,
+                               encode_image, ENCODE_FORMATS)
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Cross-model deduplication in combine_detection_results: boxes of the same (aliased) class
+# from different models overlapping by more than this IoU are merged; FUSION_METHOD is 'nms'
+# (keep the most confident box) or 'fuse' (confidence-weighted average box)
+FUSION_IOU_THRESHOLD = float(os.getenv("FUSION_IOU_THRESHOLD", "0.5"))
+FUSION_METHOD = os.getenv("FUSION_METHOD", "nms").lower()
+
 # Color mapping for different classes
 COLOR_MAP = {
     # Animals
@@ -42,133 +52,325 @@ TYPE_COLOR_MAP = {
 # Default color for unknown classes
 DEFAULT_COLOR = (255, 255, 255)  # White
 
-def draw_bounding_boxes(image_path, detection_result, output_path, use_custom_colors=False):
+# Output format of annotated images ('jpg', 'png' or 'webp'; unset keeps the extension of the
+# output path) and the JPEG/WebP quality (1-100)
+RENDER_FORMAT = os.getenv("RENDER_FORMAT", "").lower().lstrip('.')
+RENDER_QUALITY = int(os.getenv("RENDER_QUALITY", "90"))
+
+# Number of distinct pre-rendered labels kept by label_sprite
+LABEL_CACHE_SIZE = int(os.getenv("LABEL_CACHE_SIZE", "4096"))
+
+# Box and label style
+_BOX_THICKNESS = 3
+_FONT = cv2.FONT_HERSHEY_SIMPLEX
+_FONT_SCALE = 0.7
+_FONT_THICKNESS = 2
+_LABEL_PADDING = 5
+
+def box_color(pred, use_custom_colors=False):
+    """BGR colour of a prediction's box."""
+    if use_custom_colors and 'color' in pred:
+        # Use the color specified in the prediction
+        return TYPE_COLOR_MAP.get(pred['color'], DEFAULT_COLOR)
+    # Use the default color mapping
+    return COLOR_MAP.get(str(pred.get('class', 'unknown')).lower(), DEFAULT_COLOR)
+
+def _label_text(pred):
+    class_name = pred.get('class', 'unknown')
+    confidence = pred.get('confidence', 0)
+    if 'track_id' in pred:
+        return f"{class_name.upper()} #{pred['track_id']}: {confidence:.2f}"
+    return f"{class_name.upper()}: {confidence:.2f}"
+
+@lru_cache(maxsize=LABEL_CACHE_SIZE)
+def label_sprite(text, color):
+    """
+    Pre-rendered label: white text on a filled background of the box colour.
+
+    Labels are cached per text and colour, i.e. per class, confidence bucket (two decimals),
+    track id and colour, so cv2.getTextSize and putText run once per distinct label.
+
+    Returns:
+        Tuple of (read-only BGR sprite, text width, text height)
+    """
+    (text_w, text_h), _ = cv2.getTextSize(text, _FONT, _FONT_SCALE, _FONT_THICKNESS)
+    sprite = np.empty((text_h + 2 * _LABEL_PADDING + 1, text_w + 2 * _LABEL_PADDING + 1, 3), dtype=np.uint8)
+    sprite[:] = color
+    cv2.putText(sprite, text, (_LABEL_PADDING, text_h + _LABEL_PADDING), _FONT, _FONT_SCALE,
+                (255, 255, 255), _FONT_THICKNESS)
+    sprite.setflags(write=False)
+    return sprite, text_w, text_h
+
+def _blit(image, sprite, left, top):
+    """Copy a sprite into image with its top-left corner at (left, top), clipped to the image."""
+    height, width = image.shape[:2]
+    x0, y0 = max(left, 0), max(top, 0)
+    x1, y1 = min(left + sprite.shape[1], width), min(top + sprite.shape[0], height)
+    if x0 < x1 and y0 < y1:
+        image[y0:y1, x0:x1] = sprite[y0 - top:y1 - top, x0 - left:x1 - left]
+
+def draw_detections(image, detection_result, use_custom_colors=False):
+    """
+    Draw bounding boxes in place on an already decoded image.
+    
+    Boxes of the same colour are drawn in one cv2.polylines call and labels are copied
+    from cached sprites (see label_sprite).
+    
+    Args:
+        image: BGR numpy array to draw on (modified in place)
+        detection_result: Detection results from the model in Roboflow API format
+        use_custom_colors: If True, use the color specified in each prediction's 'color' field
+    
+    Returns:
+        The same array, with the boxes drawn on it
+    """
+    predictions = detection_result.get('predictions', [])
+    logger.debug(f"Drawing {len(predictions)} bounding boxes")
+    if not predictions:
+        return image
+    height = image.shape[0]
+
+    # Corner coordinates of every box at once
+    geometry = np.array([[pred.get(key, 0) for key in ('x', 'y', 'width', 'height')] for pred in predictions],
+                        dtype=np.float64).reshape(-1, 4)
+    corners = np.empty_like(geometry)
+    corners[:, :2] = geometry[:, :2] - geometry[:, 2:] / 2
+    corners[:, 2:] = geometry[:, :2] + geometry[:, 2:] / 2
+    corners = corners.astype(np.int64)
+
+    colors = [box_color(pred, use_custom_colors) for pred in predictions]
+
+    # Boxes, one call per colour
+    outlines = {}
+    for (x1, y1, x2, y2), color in zip(corners, colors):
+        outlines.setdefault(color, []).append(np.array([[x1, y1], [x2, y1], [x2, y2], [x1, y2]], dtype=np.int32))
+    for color, polygons in outlines.items():
+        cv2.polylines(image, polygons, True, color, _BOX_THICKNESS)
+
+    # Labels above the box, or below it when the box is near the top of the image
+    for pred, (x1, y1, x2, y2), color in zip(predictions, corners, colors):
+        sprite, _, text_h = label_sprite(_label_text(pred), color)
+        text_y = max(y1 - _LABEL_PADDING, text_h + _LABEL_PADDING * 2)
+        if y1 < text_h + _LABEL_PADDING * 3:
+            text_y = min(y2 + text_h + _LABEL_PADDING * 2, height - 5)
+        _blit(image, sprite, int(x1) - _LABEL_PADDING, int(text_y) - text_h - _LABEL_PADDING * 2)
+    
+    return image
+
+def compact_detections(detection_result, width, height, use_custom_colors=False):
+    """
+    Detections in a compact JSON schema for clients that draw the boxes themselves.
+    
+    Args:
+        detection_result: Detection results in Roboflow API format
+        width: Width of the image the boxes refer to
+        height: Height of the image the boxes refer to
+        use_custom_colors: If True, use the color specified in each prediction's 'color' field
+    
+    Returns:
+        Dict with:
+            "image": [width, height]
+            "classes": class names (lower case), indexed by the boxes
+            "colors": box colours as "#rrggbb", indexed by the boxes
+            "boxes": one [x1, y1, x2, y2, confidence, class index, colour index] row per
+                detection, in pixels of the image
+    """
+    classes, colors, boxes = {}, {}, []
+    for pred in detection_result.get('predictions', []):
+        class_name = str(pred.get('class', 'unknown')).strip().lower()
+        blue, green, red = box_color(pred, use_custom_colors)
+        color = f"#{red:02x}{green:02x}{blue:02x}"
+        x, y, w, h = (float(pred.get(key, 0)) for key in ('x', 'y', 'width', 'height'))
+        boxes.append([round(x - w / 2, 1), round(y - h / 2, 1), round(x + w / 2, 1), round(y + h / 2, 1),
+                      round(float(pred.get('confidence', 0)), 3),
+                      classes.setdefault(class_name, len(classes)), colors.setdefault(color, len(colors))])
+    return {"image": [width, height], "classes": list(classes), "colors": list(colors), "boxes": boxes}
+
+def render_detections(image_source, detection_result, fmt=None, quality=None, use_custom_colors=False):
+    """
+    Draw detections on a copy of an image and encode it in memory.
+    
+    Args:
+        image_source: SharedImage, path to the image, encoded image bytes or a BGR numpy
+            array (not modified)
+        detection_result: Detection results in Roboflow API format
+        fmt: 'jpg', 'png' or 'webp' (defaults to RENDER_FORMAT, else JPEG)
+        quality: JPEG/WebP quality or PNG compression level (defaults to RENDER_QUALITY for
+            JPEG and WebP)
+        use_custom_colors: If True, use the color specified in each prediction's 'color' field
+    
+    Returns:
+        The encoded image as bytes
+    """
+    image = load_image(image_source)
+    if image is None:
+        raise ValueError(f"Could not read image {describe_image(image_source)}")
+    # Copy already decoded pixels so the caller's array is untouched
+    if is_image_array(image_source) or isinstance(image_source, SharedImage):
+        image = image.copy()
+    draw_detections(image, detection_result, use_custom_colors)
+    fmt = (fmt or RENDER_FORMAT or 'jpg').lower().lstrip('.')
+    if quality is None and fmt != 'png':
+        quality = RENDER_QUALITY
+    return encode_image(image, fmt, quality)
+
+def draw_bounding_boxes(image_path, detection_result, output_path, use_custom_colors=False, fmt=None, quality=None):
     """
     Draw bounding boxes on an image based on detection results with improved visibility.
     
     Args:
-        image_path: Path to the original image
+        image_path: SharedImage, path to the original image, encoded image bytes, or a BGR
+            numpy array (decoded pixels are not modified)
         detection_result: Detection results from the model in Roboflow API format
         output_path: Path to save the output image with bounding boxes
         use_custom_colors: If True, use the color specified in each prediction's 'color' field
+        fmt: 'jpg', 'png' or 'webp'; the extension of output_path is replaced to match.
+            Defaults to RENDER_FORMAT, else the format of output_path's extension
+        quality: JPEG/WebP quality or PNG compression level (defaults to RENDER_QUALITY)
+    
+    Returns:
+        The path the image was written to
     """
+    requested_path = output_path
+    stem, extension = os.path.splitext(output_path)
+    fmt = (fmt or RENDER_FORMAT or extension or 'jpg').lower().lstrip('.')
+    if fmt not in ENCODE_FORMATS:
+        fmt = 'jpg'
+    if extension.lower().lstrip('.') != fmt:
+        output_path = f"{stem}.{fmt}"
+    if quality is None and fmt != 'png':
+        quality = RENDER_QUALITY
     try:
-        # Read the image
-        image = cv2.imread(image_path)
-        if image is None:
-            raise ValueError(f"Could not read image at {image_path}")
-        
-        # Get image dimensions
-        height, width = image.shape[:2]
-        
-        # Check if detection_result has predictions
-        predictions = detection_result.get('predictions', [])
-        logger.info(f"Drawing {len(predictions)} bounding boxes")
-        
-        # Draw each bounding box
-        for pred in predictions:
-            # Extract coordinates
-            x = pred.get('x', 0)
-            y = pred.get('y', 0)
-            w = pred.get('width', 0)
-            h = pred.get('height', 0)
-            class_name = pred.get('class', 'unknown')
-            confidence = pred.get('confidence', 0)
-            
-            # Calculate coordinates for the rectangle
-            x1 = int(x - w/2)
-            y1 = int(y - h/2)
-            x2 = int(x + w/2)
-            y2 = int(y + h/2)
-            
-            # Get color based on settings and available info
-            if use_custom_colors and 'color' in pred:
-                # Use the color specified in the prediction
-                color_name = pred['color']
-                color = TYPE_COLOR_MAP.get(color_name, DEFAULT_COLOR)
-            else:
-                # Use the default color mapping
-                color = COLOR_MAP.get(class_name.lower(), DEFAULT_COLOR)
-            
-            # Draw thicker rectangle for better visibility
-            box_thickness = 3
-            cv2.rectangle(image, (x1, y1), (x2, y2), color, box_thickness)
-            
-            # Improve text visibility with larger font and better background
-            text = f"{class_name.upper()}: {confidence:.2f}"
-            
-            # Larger font size and thickness
-            font_size = 0.7
-            font_thickness = 2
-            
-            text_size = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, font_size, font_thickness)[0]
-            
-            # Create a better background for text visibility
-            padding = 5
-            
-            # Ensure the text background doesn't go outside the image bounds
-            text_y = max(y1 - padding, text_size[1] + padding * 2)
-            
-            # If the box is near the top of the image, put the label below the box
-            if y1 < text_size[1] + padding * 3:
-                text_y = min(y2 + text_size[1] + padding * 2, height - 5)
-            
-            # Draw background rectangle for text
-            cv2.rectangle(image, 
-                         (x1 - padding, text_y - text_size[1] - padding * 2), 
-                         (x1 + text_size[0] + padding, text_y), 
-                         color, -1)
-            
-            # Draw text with white color for better contrast
-            cv2.putText(image, 
-                       text, 
-                       (x1, text_y - padding), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 
-                       font_size, 
-                       (255, 255, 255), 
-                       font_thickness)
-        
-        # Save the image with high quality
-        cv2.imwrite(output_path, image, [cv2.IMWRITE_JPEG_QUALITY, 100])
-        logger.info(f"Saved output image to {output_path}")
+        data = render_detections(image_path, detection_result, fmt, quality, use_custom_colors)
+        with open(output_path, 'wb') as f:
+            f.write(data)
+        logger.debug(f"Saved output image to {output_path} ({len(data)} bytes)")
         
     except Exception as e:
         logger.error(f"Error drawing bounding boxes: {str(e)}")
-        # In case of error, try to save the original image as is
+        # In case of error, try to save the original image: re-encoded in the requested
+        # format, or else copied as is under the requested name so its extension still fits
         try:
-            shutil.copy(image_path, output_path)
-            logger.warning(f"Copied original image to {output_path} due to drawing error")
-        except:
-            logger.error(f"Failed to copy original image to {output_path}")
+            data = encode_image(load_image(image_path), fmt, quality)
+            with open(output_path, 'wb') as f:
+                f.write(data)
+            logger.warning(f"Saved original image to {output_path} due to drawing error")
+        except Exception:
+            try:
+                save_image_source(image_path, requested_path)
+                output_path = requested_path
+                logger.warning(f"Copied original image to {output_path} due to drawing error")
+            except Exception:
+                logger.error(f"Failed to copy original image to {requested_path}")
+    return output_path
 
-def combine_detection_results(animal_result, ppe_result, weapon_result):
+def combine_detection_results(animal_result, ppe_result, weapon_result,
+                              iou_threshold=FUSION_IOU_THRESHOLD, method=FUSION_METHOD):
     """
-    Combine results from multiple detection models into a single result.
+    Combine results from multiple detection models into a single result, without boxes
+    that several models found for the same object (e.g. PPE 'person' and animal 'human').
     
     Args:
         animal_result: Results from animal detection
         ppe_result: Results from PPE detection
         weapon_result: Results from weapon detection
+        iou_threshold: IoU above which same-class boxes from different models are duplicates
+        method: 'nms' keeps the most confident duplicate, 'fuse' averages their boxes
     
     Returns:
         A combined detection result dictionary with all predictions
     """
-    combined_result = {"predictions": []}
+    predictions = []
+    sources = []
     
     # Add animal/human detections (with class-specific colors)
     for pred in animal_result.get('predictions', []):
         pred['color'] = 'green' if pred.get('class') != 'human' else 'blue'
-        combined_result['predictions'].append(pred)
+        predictions.append(pred)
+        sources.append('animal')
         
     # Add weapon detections (with different color)
     for pred in weapon_result.get('predictions', []):
         pred['color'] = 'red'
-        combined_result['predictions'].append(pred)
+        predictions.append(pred)
+        sources.append('weapon')
         
     # Add PPE detections (with different color)
     if "error" not in ppe_result:
         for pred in ppe_result.get('predictions', []):
             pred['color'] = 'orange'
-            combined_result['predictions'].append(pred)
+            predictions.append(pred)
+            sources.append('ppe')
     
-    return combined_result
+    fused = fuse_predictions(predictions, sources, iou_threshold, method)
+    if len(fused) < len(predictions):
+        logger.debug(f"Removed {len(predictions) - len(fused)} duplicate detections across models")
+    return {"predictions": fused}
+
+def _reference_render(image, detection_result):
+    """The previous renderer (getTextSize, rectangles and putText per box, JPEG at quality 100), for benchmarks."""
+    image = image.copy()
+    height = image.shape[0]
+    for pred in detection_result.get('predictions', []):
+        x, y, w, h = (pred.get(key, 0) for key in ('x', 'y', 'width', 'height'))
+        x1, y1, x2, y2 = int(x - w / 2), int(y - h / 2), int(x + w / 2), int(y + h / 2)
+        color = COLOR_MAP.get(pred.get('class', 'unknown').lower(), DEFAULT_COLOR)
+        cv2.rectangle(image, (x1, y1), (x2, y2), color, _BOX_THICKNESS)
+        text = _label_text(pred)
+        text_size = cv2.getTextSize(text, _FONT, _FONT_SCALE, _FONT_THICKNESS)[0]
+        text_y = max(y1 - _LABEL_PADDING, text_size[1] + _LABEL_PADDING * 2)
+        if y1 < text_size[1] + _LABEL_PADDING * 3:
+            text_y = min(y2 + text_size[1] + _LABEL_PADDING * 2, height - 5)
+        cv2.rectangle(image, (x1 - _LABEL_PADDING, text_y - text_size[1] - _LABEL_PADDING * 2),
+                      (x1 + text_size[0] + _LABEL_PADDING, text_y), color, -1)
+        cv2.putText(image, text, (x1, text_y - _LABEL_PADDING), _FONT, _FONT_SCALE, (255, 255, 255), _FONT_THICKNESS)
+    return encode_image(image, 'jpg', 100)
+
+def main(argv=None):
+    import time
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark annotated-image rendering against the previous renderer.")
+    parser.add_argument('--images', nargs='*', default=[], help="Images to render (a random 1920x1080 image if omitted)")
+    parser.add_argument('--boxes', type=int, default=50, help="Random detections drawn per image")
+    parser.add_argument('--formats', nargs='+', default=['jpg', 'webp'], help="Formats of the new renderer")
+    parser.add_argument('--quality', type=int, default=RENDER_QUALITY, help="JPEG/WebP quality of the new renderer")
+    parser.add_argument('--runs', type=int, default=20, help="Timed runs per image and renderer")
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    images = [load_image(path) for path in args.images]
+    if any(image is None for image in images):
+        parser.error("Could not read all --images")
+    if not images:
+        images = [cv2.GaussianBlur(rng.integers(0, 255, (1080, 1920, 3), dtype=np.uint8), (31, 31), 0)]
+
+    classes = list(COLOR_MAP)
+    renderers = {"previous (jpg q100)": lambda image, result: _reference_render(image, result)}
+    for fmt in args.formats:
+        renderers[f"sprites ({fmt} q{args.quality})"] = (
+            lambda image, result, fmt=fmt: render_detections(image, result, fmt, args.quality))
+
+    totals = {name: [0.0, 0] for name in renderers}
+    for image in images:
+        height, width = image.shape[:2]
+        result = {"predictions": [{
+            "x": float(rng.uniform(0, width)), "y": float(rng.uniform(0, height)),
+            "width": float(rng.uniform(20, width / 4)), "height": float(rng.uniform(20, height / 4)),
+            "confidence": float(rng.uniform(0.3, 1.0)), "class": classes[i % len(classes)]
+        } for i in range(args.boxes)]}
+        for name, render in renderers.items():
+            data = render(image, result)
+            start = time.perf_counter()
+            for _ in range(args.runs):
+                render(image, result)
+            totals[name][0] += (time.perf_counter() - start) / args.runs
+            totals[name][1] += len(data)
+
+    for name, (seconds, size) in totals.items():
+        print(f"{name}: {1000 * seconds / len(images):.1f} ms/image, {size / len(images) / 1024:.0f} KiB/image")
+    return 0
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
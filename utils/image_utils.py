@@ -0,0 +1,322 @@
+import os
+import cv2
+import hashlib
+import logging
+import shutil
+import threading
+import numpy as np
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# JPEG quality used when an in-memory frame has to be sent to a remote model
+UPLOAD_JPEG_QUALITY = 95
+
+# Leading bytes of the image formats we accept, with their MIME type and file extension
+IMAGE_SIGNATURES = [
+    (b'\xff\xd8\xff', 'image/jpeg', '.jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png', '.png'),
+    (b'GIF87a', 'image/gif', '.gif'),
+    (b'GIF89a', 'image/gif', '.gif'),
+    (b'BM', 'image/bmp', '.bmp'),
+]
+
+def is_image_array(image):
+    """Return True if the image is an already decoded (BGR) numpy array."""
+    return isinstance(image, np.ndarray)
+
+def is_image_bytes(image):
+    """Return True if the image is an encoded image held in memory (e.g. an upload)."""
+    return isinstance(image, (bytes, bytearray, memoryview))
+
+class SharedImage:
+    """
+    One image shared by every detector and the drawing step of a request.
+    
+    Holds the original encoded bytes, the decoded BGR pixels and the dimensions. Whatever
+    is missing is produced lazily and at most once: a path is read once, the bytes are
+    decoded once, and a decoded frame is JPEG-encoded once if a remote model needs bytes.
+    Safe to use from the detector threads concurrently.
+    """
+
+    def __init__(self, data=None, pixels=None, path=None, name=None):
+        """
+        Args:
+            data: Encoded image bytes (e.g. an upload)
+            pixels: Decoded BGR numpy array (e.g. a video frame)
+            path: Path to an image file, read on first use
+            name: File name used when uploading the image
+        """
+        self._data = bytes(data) if data is not None else None
+        self._pixels = pixels
+        self.path = path
+        self.name = name or (os.path.basename(path) if path else None)
+        # Frames are hashed by their pixels so the hash does not depend on a JPEG encode
+        self._hash_pixels = self._data is None and path is None
+        self._content_hash = None
+        self._upload_encodings = {}
+        self._lock = threading.RLock()
+
+    @property
+    def data(self):
+        """The encoded image bytes."""
+        with self._lock:
+            if self._data is None:
+                if self.path is not None:
+                    with open(self.path, 'rb') as f:
+                        self._data = f.read()
+                elif self._pixels is not None:
+                    self._data = encode_frame_to_jpeg(self._pixels)
+            return self._data
+
+    @property
+    def pixels(self):
+        """The decoded BGR numpy array, or None if the image cannot be decoded."""
+        with self._lock:
+            if self._pixels is None:
+                self._pixels = decode_image_bytes(self.data)
+            return self._pixels
+
+    @property
+    def width(self):
+        """Width in pixels, or None if the image cannot be decoded."""
+        pixels = self.pixels
+        return pixels.shape[1] if pixels is not None else None
+
+    @property
+    def height(self):
+        """Height in pixels, or None if the image cannot be decoded."""
+        pixels = self.pixels
+        return pixels.shape[0] if pixels is not None else None
+
+    @property
+    def mime_type(self):
+        return guess_image_type(self.data)[0]
+
+    @property
+    def upload_name(self):
+        """File name sent along with the bytes to remote models."""
+        if self.name:
+            return self.name
+        if self._data is None and self.path is None:
+            # A decoded frame; do not encode it just to name it
+            return "upload.jpg"
+        return f"upload{guess_image_type(self.data)[1]}"
+
+    @property
+    def encoded_size(self):
+        """Size in bytes of the original encoded image, or None for a frame that was never encoded."""
+        with self._lock:
+            if self._data is not None:
+                return len(self._data)
+            if self.path is not None:
+                return os.path.getsize(self.path)
+            return None
+
+    def encode_for_upload(self, max_side=0, quality=UPLOAD_JPEG_QUALITY):
+        """
+        Bytes to send to a remote model, downscaled so the longest side is at most max_side.
+        
+        Images that already fit (or max_side <= 0) are sent as their original encoded bytes.
+        Each (max_side, quality) encoding is made once and shared by every caller.
+        
+        Args:
+            max_side: Maximum width/height in pixels of the uploaded image (0 disables resizing)
+            quality: JPEG quality (0-100) of the downscaled encode
+        
+        Returns:
+            Tuple of (file_name, data, mime_type, scale), where scale is the uploaded size
+            divided by the original size (1.0 when the original is sent)
+        """
+        if not max_side or max_side <= 0:
+            return self.upload_name, self.data, self.mime_type, 1.0
+        with self._lock:
+            key = (int(max_side), int(quality))
+            if key not in self._upload_encodings:
+                pixels = self.pixels
+                longest = max(pixels.shape[:2]) if pixels is not None else 0
+                if longest <= max_side:
+                    encoding = (self.upload_name, self.data, self.mime_type, 1.0)
+                else:
+                    scale = max_side / float(longest)
+                    size = (max(1, round(pixels.shape[1] * scale)), max(1, round(pixels.shape[0] * scale)))
+                    resized = cv2.resize(pixels, size, interpolation=cv2.INTER_AREA)
+                    name = os.path.splitext(self.upload_name)[0] + '.jpg'
+                    encoding = (name, encode_frame_to_jpeg(resized, quality), 'image/jpeg', scale)
+                self._upload_encodings[key] = encoding
+            return self._upload_encodings[key]
+
+    @property
+    def content_hash(self):
+        """Hash of the image content (the encoded bytes if we have them, else the pixels)."""
+        with self._lock:
+            if self._content_hash is None:
+                self._content_hash = content_hash(self._pixels if self._hash_pixels else self.data)
+            return self._content_hash
+
+def as_shared_image(image):
+    """
+    Wrap any supported image source in a SharedImage (returned unchanged if it already is one).
+    
+    Args:
+        image: SharedImage, path to the image file, encoded image bytes or a BGR numpy array
+    """
+    if isinstance(image, SharedImage):
+        return image
+    if is_image_array(image):
+        return SharedImage(pixels=image)
+    if is_image_bytes(image):
+        return SharedImage(data=image)
+    return SharedImage(path=image)
+
+def content_hash(image):
+    """
+    Hash the content of an image, independent of its file name.
+    
+    Args:
+        image: SharedImage, path to the image file, encoded image bytes or a numpy array
+    
+    Returns:
+        Hex digest string
+    """
+    if isinstance(image, SharedImage):
+        return image.content_hash
+    digest = hashlib.blake2b(digest_size=16)
+    if is_image_bytes(image):
+        digest.update(image)
+    elif is_image_array(image):
+        digest.update(f"{image.shape}{image.dtype}".encode())
+        digest.update(np.ascontiguousarray(image).data)
+    else:
+        with open(image, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+def describe_image(image):
+    """
+    Short human-readable description of an image source for log messages.
+    
+    Args:
+        image: SharedImage, path to the image file, encoded image bytes or a BGR numpy array
+    """
+    if is_image_array(image):
+        return f"<frame {image.shape[1]}x{image.shape[0]}>"
+    if is_image_bytes(image):
+        return f"<encoded image, {len(image)} bytes>"
+    if isinstance(image, SharedImage):
+        return image.path or image.name or "<shared image>"
+    return str(image)
+
+def guess_image_type(data):
+    """
+    Determine the MIME type and extension of encoded image bytes from their signature.
+    
+    Returns:
+        Tuple of (mime_type, extension), defaulting to JPEG
+    """
+    header = bytes(data[:12])
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'image/webp', '.webp'
+    for signature, mime_type, extension in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return mime_type, extension
+    return 'image/jpeg', '.jpg'
+
+def decode_image_bytes(data):
+    """
+    Decode encoded image bytes into a BGR numpy array.
+    
+    Returns:
+        The decoded array, or None if the bytes could not be decoded
+    """
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    image = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+    if image is not None:
+        return image
+    # Fall back to PIL for formats OpenCV cannot decode
+    try:
+        import io
+        from PIL import Image
+        img_array = np.array(Image.open(io.BytesIO(bytes(data))).convert('RGB'))
+        return np.ascontiguousarray(img_array[:, :, ::-1])
+    except Exception as e:
+        logger.error(f"Could not decode image bytes: {e}")
+        return None
+
+def load_image(image):
+    """
+    Return a BGR numpy array for any supported image source.
+    
+    Args:
+        image: SharedImage, path to the image file, encoded image bytes or a BGR numpy array
+    
+    Returns:
+        The decoded array (the same object for arrays), or None if it could not be read
+    """
+    if isinstance(image, SharedImage):
+        return image.pixels
+    if is_image_array(image):
+        return image
+    if is_image_bytes(image):
+        return decode_image_bytes(image)
+    return cv2.imread(image)
+
+def save_image_source(image, output_path):
+    """
+    Write an image source unchanged to output_path (copy a file, write bytes, encode an array).
+    """
+    if is_image_array(image):
+        cv2.imwrite(output_path, image)
+    elif isinstance(image, SharedImage) or is_image_bytes(image):
+        with open(output_path, 'wb') as f:
+            f.write(as_shared_image(image).data)
+    else:
+        shutil.copy(image, output_path)
+
+# cv2.imencode quality parameter of each output format (PNG takes a compression level 0-9)
+ENCODE_FORMATS = {
+    'jpg': cv2.IMWRITE_JPEG_QUALITY,
+    'jpeg': cv2.IMWRITE_JPEG_QUALITY,
+    'webp': cv2.IMWRITE_WEBP_QUALITY,
+    'png': cv2.IMWRITE_PNG_COMPRESSION
+}
+
+def encode_image(image, fmt='jpg', quality=None):
+    """
+    Encode a BGR array into an in-memory image buffer.
+
+    Args:
+        image: BGR numpy array
+        fmt: 'jpg', 'png' or 'webp'
+        quality: JPEG/WebP quality (1-100) or PNG compression level (0-9); None uses the
+            encoder's default
+
+    Returns:
+        The encoded image as bytes
+    """
+    fmt = fmt.lower().lstrip('.')
+    if fmt not in ENCODE_FORMATS:
+        raise ValueError(f"Unsupported image format '{fmt}', expected one of {', '.join(ENCODE_FORMATS)}")
+    params = [ENCODE_FORMATS[fmt], int(quality)] if quality is not None else []
+    ok, buffer = cv2.imencode(f'.{fmt}', image, params)
+    if not ok:
+        raise ValueError(f"Could not encode image to {fmt}")
+    return buffer.tobytes()
+
+def encode_frame_to_jpeg(frame, quality=UPLOAD_JPEG_QUALITY):
+    """
+    Encode a BGR frame into an in-memory JPEG buffer.
+    
+    Args:
+        frame: BGR numpy array
+        quality: JPEG quality (0-100)
+    
+    Returns:
+        The encoded JPEG as bytes
+    """
+    ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+    if not ok:
+        raise ValueError("Could not encode frame to JPEG")
+    return buffer.tobytes()
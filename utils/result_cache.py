@@ -0,0 +1,227 @@
+import os
+import copy
+import json
+import time
+import hashlib
+import logging
+import functools
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+from utils.image_utils import content_hash
+
+# Load environment variables
+load_dotenv()
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Cache configuration: in-memory entry bound (0 disables caching), entry lifetime in seconds
+# and an optional directory for the on-disk tier
+DETECTION_CACHE_SIZE = int(os.getenv("DETECTION_CACHE_SIZE", "512"))
+DETECTION_CACHE_TTL = float(os.getenv("DETECTION_CACHE_TTL", "3600"))
+DETECTION_CACHE_DIR = os.getenv("DETECTION_CACHE_DIR") or None
+
+class ResultCache:
+    """
+    Two-tier cache for detection results.
+    
+    The in-process tier is an LRU bounded by max_entries; the optional disk tier stores one
+    JSON file per key. Entries older than ttl seconds are treated as missing in both tiers.
+    Results are copied on the way in and out, so callers may mutate what they get back.
+    """
+
+    def __init__(self, max_entries=DETECTION_CACHE_SIZE, ttl=DETECTION_CACHE_TTL, disk_dir=DETECTION_CACHE_DIR):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def _disk_path(self, key):
+        name = hashlib.sha1(key.encode()).hexdigest()
+        return os.path.join(self.disk_dir, name[:2], f"{name}.json")
+
+    def _read_disk(self, key):
+        """Return (store time, value) of the disk entry for key, or None."""
+        path = self._disk_path(key)
+        try:
+            stored_at = os.path.getmtime(path)
+            if time.time() - stored_at > self.ttl:
+                os.remove(path)
+                return None
+            with open(path, 'r') as f:
+                return stored_at, json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Could not read cache entry {path}: {e}")
+            return None
+
+    def _write_disk(self, key, value):
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(value, f)
+            os.replace(tmp_path, path)
+        except (TypeError, ValueError):
+            # Not JSON serializable (e.g. columnar numpy output): keep it in memory only
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        except Exception as e:
+            logger.warning(f"Could not write cache entry {path}: {e}")
+
+    def get(self, key):
+        """Return a copy of the cached value for key, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if time.time() - stored_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return copy.deepcopy(value)
+                del self._entries[key]
+
+        if self.disk_dir:
+            entry = self._read_disk(key)
+            if entry is not None:
+                stored_at, value = entry
+                with self._lock:
+                    self.disk_hits += 1
+                # Promoted with its original store time, so it expires when the disk entry does
+                self._store(key, value, stored_at)
+                return copy.deepcopy(value)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _store(self, key, value, stored_at=None):
+        with self._lock:
+            self._entries[key] = (time.time() if stored_at is None else stored_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def put(self, key, value):
+        """Store a copy of value under key in both tiers."""
+        value = copy.deepcopy(value)
+        self._store(key, value)
+        if self.disk_dir:
+            self._write_disk(key, value)
+
+    def clear(self):
+        """Drop every in-memory entry (the disk tier is left alone)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Hit/miss/eviction counters and current size."""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "disk_dir": self.disk_dir,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+# Shared cache used by all detectors
+detection_cache = ResultCache()
+
+def _is_cacheable(result):
+    """
+    Only successful results are cached, never errors, 'model not loaded' placeholders or
+    results of a fallback backend used while the primary one was down.
+    """
+    return (isinstance(result, dict) and "error" not in result and not result.get("failover")
+            and result.get("version") not in ("error", "not-loaded"))
+
+def _cache_key(name, model_tag, image_hash, confidence, overlap, kwargs):
+    # Options left at None/False are the same as not passing them
+    extra = ",".join(f"{k}={kwargs[k]!r}" for k in sorted(kwargs) if kwargs[k] is not None and kwargs[k] is not False)
+    return f"{name}|{model_tag}|{image_hash}|{confidence}|{overlap}|{extra}"
+
+def cached_detector(name, model_tag):
+    """
+    Decorator that caches a detector function(image, confidence, overlap, **kwargs).
+    
+    Args:
+        name: Detector name used in the cache key
+        model_tag: Callable returning the model id/version string, evaluated per call so a
+            reloaded or reconfigured model gets fresh entries
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(image, confidence, overlap, **kwargs):
+            if not detection_cache.enabled:
+                return func(image, confidence, overlap, **kwargs)
+            try:
+                key = _cache_key(name, model_tag(), content_hash(image), confidence, overlap, kwargs)
+            except Exception as e:
+                logger.warning(f"Could not build cache key for {name} detection: {e}")
+                return func(image, confidence, overlap, **kwargs)
+
+            result = detection_cache.get(key)
+            if result is not None:
+                logger.debug(f"{name} detection cache hit")
+                return result
+            result = func(image, confidence, overlap, **kwargs)
+            if _is_cacheable(result):
+                detection_cache.put(key, result)
+            return result
+        wrapper.uncached = func
+        return wrapper
+    return decorator
+
+def cached_batch_detector(name, model_tag):
+    """
+    Decorator that caches a batch detector function(images, confidence, overlap, **kwargs)
+    per image: only the images that miss the cache are passed to the wrapped function.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(images, confidence, overlap, batch_size=None, **kwargs):
+            if not detection_cache.enabled:
+                return func(images, confidence, overlap, batch_size, **kwargs)
+            # The batch size does not change results, so it is not part of the key
+            tag = model_tag()
+            results = [None] * len(images)
+            keys = [None] * len(images)
+            for i, image in enumerate(images):
+                try:
+                    keys[i] = _cache_key(name, tag, content_hash(image), confidence, overlap, kwargs)
+                    results[i] = detection_cache.get(keys[i])
+                except Exception as e:
+                    logger.warning(f"Could not build cache key for {name} detection: {e}")
+
+            missing = [i for i, result in enumerate(results) if result is None]
+            if missing:
+                computed = func([images[i] for i in missing], confidence, overlap, batch_size, **kwargs)
+                for i, result in zip(missing, computed):
+                    results[i] = result
+                    if keys[i] is not None and _is_cacheable(result):
+                        detection_cache.put(keys[i], result)
+            return results
+        wrapper.uncached = func
+        return wrapper
+    return decorator
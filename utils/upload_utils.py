@@ -0,0 +1,114 @@
+import os
+import shutil
+import logging
+import tempfile
+from dotenv import load_dotenv
+from utils.image_utils import SharedImage
+
+# Load environment variables
+load_dotenv()
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Uploads up to this many bytes are kept in memory; larger ones are spooled to disk
+UPLOAD_MAX_IN_MEMORY = int(os.getenv("UPLOAD_MAX_IN_MEMORY", str(16 * 1024 * 1024)))
+
+# Directory for spooled uploads (defaults to the system temp directory)
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or None
+
+# Keep a copy of every upload in the upload folder (off by default)
+PERSIST_UPLOADS = os.getenv("PERSIST_UPLOADS", "false").lower() in ('1', 'true', 'yes', 'on')
+
+# Chunk size used when copying the request stream
+_CHUNK_SIZE = 1024 * 1024
+
+class ReceivedUpload:
+    """
+    An uploaded file, held either as an in-memory bytes buffer or as a spooled file.
+    
+    source is the bytes buffer when the upload fits in memory, otherwise the path of the
+    spooled file. For images, image wraps it in a SharedImage that the detectors and drawing
+    functions share, so the upload is decoded only once per request.
+    """
+
+    def __init__(self, filename, data=None, path=None, temporary=False):
+        self.filename = filename
+        self.data = data
+        self.path = path
+        self.temporary = temporary
+        self._image = None
+
+    @property
+    def image(self):
+        if self._image is None:
+            self._image = SharedImage(data=self.data, path=None if self.data is not None else self.path,
+                                      name=self.filename)
+        return self._image
+
+    @property
+    def source(self):
+        return self.data if self.data is not None else self.path
+
+    @property
+    def size(self):
+        return len(self.data) if self.data is not None else os.path.getsize(self.path)
+
+    def persist(self, folder):
+        """
+        Store a copy of the upload in folder under its filename.
+        
+        Returns:
+            Path of the stored copy
+        """
+        target = os.path.join(folder, self.filename)
+        if self.data is not None:
+            with open(target, 'wb') as f:
+                f.write(self.data)
+        elif self.temporary:
+            # The spooled file is not needed elsewhere, so move rather than copy it
+            shutil.move(self.path, target)
+            self.path = target
+            self.temporary = False
+        elif os.path.abspath(self.path) != os.path.abspath(target):
+            shutil.copy(self.path, target)
+        return target
+
+    def discard(self):
+        """Delete the spooled file, if this upload owns one."""
+        if self.temporary and self.path and os.path.exists(self.path):
+            os.remove(self.path)
+        self.temporary = False
+
+def receive_upload(file_storage, filename, max_in_memory=UPLOAD_MAX_IN_MEMORY, spool_dir=UPLOAD_SPOOL_DIR):
+    """
+    Read an uploaded file from the request stream without saving it to the upload folder.
+    
+    Args:
+        file_storage: werkzeug FileStorage from request.files
+        filename: Name used for the upload (e.g. a unique, sanitized filename)
+        max_in_memory: Uploads up to this size are returned as bytes; larger ones, or any
+            upload when this is 0, are spooled to a temporary file
+        spool_dir: Directory for spooled files (defaults to the system temp directory)
+    
+    Returns:
+        A ReceivedUpload
+    """
+    stream = file_storage.stream
+    data = stream.read(max_in_memory + 1) if max_in_memory > 0 else b''
+    if max_in_memory > 0 and len(data) <= max_in_memory:
+        return ReceivedUpload(filename, data=data)
+
+    # Too large for memory: spool what was read plus the rest of the stream to disk
+    suffix = os.path.splitext(filename)[1]
+    fd, path = tempfile.mkstemp(prefix="upload_", suffix=suffix, dir=spool_dir)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            shutil.copyfileobj(stream, f, _CHUNK_SIZE)
+    except Exception:
+        os.remove(path)
+        raise
+    logger.info(f"Spooled upload {filename} to {path}")
+    return ReceivedUpload(filename, path=path, temporary=True)